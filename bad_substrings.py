@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Aho-Corasick screening of names for embedded bad words.
+
+The automaton is compiled to a dense transition table over the name code
+alphabet (0 = end of name / padding, 1-26 = 'a'-'z') plus a per-state flag
+that is set when any pattern ends there (directly or through a suffix link).
+Only "any match" matters, so accepting states are made absorbing: once a
+name matches it stays matched. Scanning a batch is then one table gather
+per character position for all names at once and a single flag lookup at
+the end, linear in the name length and independent of the number of
+patterns.
+"""
+
+from collections import deque
+
+import numpy as np
+
+FORMAT_VERSION = 1
+N_SYMBOLS = 27  # 0 = end of name, 1-26 = letters
+
+
+class SubstringAutomaton:
+    """Multi-pattern matcher: transitions (states, N_SYMBOLS) int32 and accepting (states,) bool."""
+
+    def __init__(self, transitions, accepting):
+        self.transitions = transitions
+        self.accepting = accepting
+        self._flat = transitions.reshape(-1)
+
+    @property
+    def n_states(self):
+        return len(self.accepting)
+
+    @property
+    def nbytes(self):
+        return self.transitions.nbytes + self.accepting.nbytes
+
+    @classmethod
+    def build(cls, patterns):
+        """Compile patterns, each a sequence of letter codes (1-26)."""
+        goto = [{}]
+        accepting = [False]
+        for pattern in patterns:
+            state = 0
+            for symbol in pattern:
+                if symbol not in goto[state]:
+                    goto.append({})
+                    accepting.append(False)
+                    goto[state][symbol] = len(goto) - 1
+                state = goto[state][symbol]
+            if state:
+                accepting[state] = True
+
+        # Breadth-first, so every failure state is complete before the states that fall back to it.
+        # Symbol 0 (end of name) always returns to the root.
+        transitions = np.zeros((len(goto), N_SYMBOLS), dtype=np.int32)
+        fail = [0] * len(goto)
+        queue = deque()
+        for symbol, child in goto[0].items():
+            transitions[0, symbol] = child
+            queue.append(child)
+        while queue:
+            state = queue.popleft()
+            accepting[state] = accepting[state] or accepting[fail[state]]
+            for symbol in range(1, N_SYMBOLS):
+                child = goto[state].get(symbol)
+                if child is None:
+                    transitions[state, symbol] = transitions[fail[state], symbol]
+                else:
+                    fail[child] = transitions[fail[state], symbol]
+                    transitions[state, symbol] = child
+                    queue.append(child)
+        accepting = np.array(accepting, dtype=bool)
+        transitions[accepting] = np.flatnonzero(accepting)[:, None]
+        return cls(transitions, accepting)
+
+    def scan(self, codes):
+        """True for each row of an (N, length) code matrix that contains any pattern."""
+        codes = np.asarray(codes)
+        state = np.zeros(len(codes), dtype=np.int64)
+        for column in codes.T:
+            state = self._flat.take(state * N_SYMBOLS + column)
+        return self.accepting[state]
+
+    def to_arrays(self):
+        return {
+            'format_version': np.array(FORMAT_VERSION, dtype=np.int32),
+            'transitions': self.transitions,
+            'accepting': self.accepting,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Wrap arrays written by to_arrays (zero-copy)."""
+        version = int(arrays['format_version'])
+        if version != FORMAT_VERSION:
+            raise ValueError("Unsupported substring automaton format version {}".format(version))
+        return cls(arrays['transitions'], arrays['accepting'])
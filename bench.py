@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+"""
+Reproducible NameSmithy benchmarks: hot-path micro-benchmarks and an in-process API load test.
+
+Usage:
+    python bench.py [--quick] [--only micro|load] [-o results.json]
+                    [--baseline bench_baseline.json] [--threshold 0.25] [--save-baseline]
+                    [--score-batch-wait-ms MS] [--score-batch-max-rows N]
+
+Everything runs locally: the load test drives the Flask app through its test
+client from several threads at once (evaluate requests, and generate requests
+followed by status polling until each session completes). Inputs come from
+fixed seeds, the name pool and score cache are off, and the workload is a
+fixed number of calls, so runs on the same machine are comparable.
+
+Reports p50/p99 latency, throughput and peak RSS. With --baseline, each
+figure is compared against a stored run and the exit status is 1 if any
+got worse by more than the threshold (a fraction: 0.25 = 25%).
+--save-baseline writes this run as the new baseline instead.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Set before the server module is imported: a background pool refill or cached scores would make runs incomparable
+os.environ['NAMESMITHY_NAME_POOL_SIZE'] = '0'
+os.environ['NAMESMITHY_SCORE_CACHE_SIZE'] = '0'
+
+import numpy as np
+
+import log_setup
+import namesmithy
+
+SEED = 1234
+BASELINE_PATH = Path(__file__).absolute().parent / "bench_baseline.json"
+REGRESSION_THRESHOLD = 0.25
+WARMUP_CALLS = 3
+# Figures compared against the baseline, and whether more is better
+HIGHER_IS_BETTER = {'ops_per_second': True, 'requests_per_second': True, 'p50_ms': False, 'p99_ms': False,
+                    'seconds': False, 'peak_rss_mb': False}
+
+
+def log(message):
+    print(message, file=sys.stderr)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize(latencies, items, elapsed):
+    """p50/p99 latency in ms and throughput for a list of per-call seconds."""
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'calls': len(latencies),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 4),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 4),
+        'ops_per_second': round(items / elapsed, 1),
+    }
+
+
+def measure(func, inputs, items_per_call=1):
+    """Call func once per input, timing each call after a few untimed warm-up calls."""
+    for value in inputs[:WARMUP_CALLS]:
+        func(value)
+    latencies = []
+    start = time.perf_counter()
+    for value in inputs:
+        t = time.perf_counter()
+        func(value)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, items_per_call * len(inputs), time.perf_counter() - start)
+
+
+def sample_names(n, rng):
+    """Fixed mix of known names and generated (mostly unknown) ones, with genders."""
+    known = namesmithy.popular_names.sample('F', 0.0, 1.0, n // 2, rng)
+    generated = namesmithy.generate_names('M', n - len(known), rng)
+    names = known + generated
+    genders = ['F'] * len(known) + ['M'] * len(generated)
+    order = rng.permutation(len(names))
+    return [names[i] for i in order], [genders[i] for i in order]
+
+
+def micro_benchmarks(scale):
+    """Time the single-name and batch hot paths with fixed inputs."""
+    rng = np.random.default_rng(SEED)
+    names, genders = sample_names(int(2000 * scale), rng)
+    pairs = list(zip(names, genders))
+    batches = [(names[i:i + 256], genders[i:i + 256]) for i in range(0, len(names), 256)]
+    band_weights = namesmithy.engine_band_weights(namesmithy.default_engine(), 0.7, 1.0)
+    results = {}
+
+    log("⏱️  Loading known names from source")
+    t = time.perf_counter()
+    namesmithy.load_known_names_from_source()
+    results['known_names_load'] = {'seconds': round(time.perf_counter() - t, 3)}
+    if namesmithy.BUNDLE_PATH.exists():
+        t = time.perf_counter()
+        namesmithy.load_model_bundle(namesmithy.BUNDLE_PATH)
+        results['bundle_load'] = {'seconds': round(time.perf_counter() - t, 3)}
+
+    log("⏱️  Micro-benchmarks")
+    results['name_to_vec'] = measure(namesmithy.name_to_vec, names)
+    results['score_name_original'] = measure(lambda pair: namesmithy.score_name_original(*pair), pairs)
+    results['score_name_fallback'] = measure(lambda pair: namesmithy.score_name_fallback(*pair), pairs)
+    results['score_names_batch_256'] = measure(lambda batch: namesmithy.score_names_batch(*batch), batches, 256)
+    seeds = rng.integers(2 ** 31, size=len(names) // 4).tolist()
+    results['generate_name_rnn'] = measure(lambda seed: namesmithy.generate_name_rnn('F', seed), seeds)
+    generation_rng = np.random.default_rng(SEED)
+    for engine in namesmithy.available_engines():
+        weights = namesmithy.engine_band_weights(engine, 0.7, 1.0)
+        results['screen_candidates_{}'.format(engine)] = measure(
+            lambda _: namesmithy.screen_candidates(engine, 'F', 'random', weights, 0.7, 1.0, generation_rng, set(),
+                                                   namesmithy.YieldEstimator()),
+            range(max(int(40 * scale), 5)), namesmithy.GENERATION_BATCH_SIZE)
+    if namesmithy.ngram_model is not None:
+        bands = generation_rng.choice(len(band_weights), size=namesmithy.GENERATION_BATCH_SIZE, p=band_weights)
+        results['ngram_sample'] = measure(lambda _: namesmithy.ngram_model.sample('F', bands, generation_rng),
+                                          range(max(int(100 * scale), 5)), len(bands))
+    results['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    return results
+
+
+def load_test(scale, evaluate_threads, generate_threads):
+    """Drive /api/evaluate and the /api/generate + status flow concurrently through the test client."""
+    import server
+
+    rng = np.random.default_rng(SEED + 1)
+    names, genders = sample_names(int(4000 * scale), rng)
+    per_thread = max(len(names) // evaluate_threads, 1)
+    sessions_per_thread = max(int(10 * scale), 2)
+    latencies = {'evaluate': [], 'generate': [], 'generate_status': [], 'generate_session': []}
+    errors = {key: 0 for key in latencies}
+    lock = threading.Lock()
+
+    def record(kind, seconds, ok):
+        with lock:
+            latencies[kind].append(seconds)
+            errors[kind] += not ok
+
+    def evaluate_worker(offset):
+        client = server.app.test_client()
+        for name, gender in zip(names[offset:offset + per_thread], genders[offset:offset + per_thread]):
+            t = time.perf_counter()
+            response = client.post('/api/evaluate', json={'name': name, 'gender': gender})
+            record('evaluate', time.perf_counter() - t, response.status_code == 200)
+
+    def generate_worker(index):
+        client = server.app.test_client()
+        for i in range(sessions_per_thread):
+            request = {'count': 5, 'gender': 'FM'[(index + i) % 2], 'style': 'random', 'min_score': 60,
+                       'max_score': 100}
+            started = time.perf_counter()
+            response = client.post('/api/generate', json=request)
+            record('generate', time.perf_counter() - started, response.status_code == 200)
+            if response.status_code != 200:
+                continue
+            session_id = response.get_json()['session_id']
+            status = 'queued'
+            while status in ('queued', 'running'):
+                time.sleep(0.005)
+                t = time.perf_counter()
+                response = client.get('/api/generate/status/{}'.format(session_id))
+                record('generate_status', time.perf_counter() - t, response.status_code == 200)
+                status = response.get_json().get('status')
+            record('generate_session', time.perf_counter() - started, status == 'completed')
+
+    log("⏱️  Load test: {} evaluate and {} generate threads".format(evaluate_threads, generate_threads))
+    threads = ([threading.Thread(target=evaluate_worker, args=(i * per_thread,)) for i in range(evaluate_threads)]
+               + [threading.Thread(target=generate_worker, args=(i,)) for i in range(generate_threads)])
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    for kind, values in latencies.items():
+        if values:
+            summary = summarize(values, len(values), elapsed)
+            summary['requests_per_second'] = summary.pop('ops_per_second')
+            summary['errors'] = errors[kind]
+            results[kind] = summary
+    results['seconds'] = round(elapsed, 3)
+    results['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    return results
+
+
+def flatten(results, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}, numbers only."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(results, baseline, threshold):
+    """Figures that got worse than the baseline by more than threshold, as printable lines."""
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    for key, value in sorted(current.items()):
+        metric = key.rsplit('.', 1)[-1]
+        if metric not in HIGHER_IS_BETTER or key.startswith('meta.') or not previous.get(key):
+            continue
+        old = previous[key]
+        change = (value - old) / old
+        worse = -change if HIGHER_IS_BETTER[metric] else change
+        marker = '❌' if worse > threshold else '  '
+        log("{} {:<45} {:>12.4g} -> {:<12.4g} ({:+.1f}%)".format(marker, key, old, value, 100 * change))
+        if worse > threshold:
+            regressions.append(key)
+    return regressions
+
+
+def report(results):
+    for section in ('micro', 'load'):
+        for name, figures in results.get(section, {}).items():
+            if isinstance(figures, dict):
+                log("📊 {:<32} {}".format('{}.{}'.format(section, name), "  ".join(
+                    "{}={}".format(key, value) for key, value in figures.items())))
+            else:
+                log("📊 {:<32} {}".format('{}.{}'.format(section, name), figures))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NameSmithy benchmarks and load test")
+    parser.add_argument('--quick', action='store_true', help="a tenth of the workload, for a smoke run")
+    parser.add_argument('--only', choices=('micro', 'load'), help="run one part only")
+    parser.add_argument('--evaluate-threads', type=int, default=4)
+    parser.add_argument('--generate-threads', type=int, default=2)
+    parser.add_argument('-o', '--output', help="write the results as JSON")
+    parser.add_argument('--baseline', default=str(BASELINE_PATH), help="baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="fraction by which a figure may get worse before it counts as a regression")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    parser.add_argument('--score-batch-wait-ms', type=float, default=namesmithy.SCORE_BATCH_WAIT_MS,
+                        help="micro-batch concurrent model calls, waiting up to this long (0 = off)")
+    parser.add_argument('--score-batch-max-rows', type=int, default=namesmithy.SCORE_BATCH_MAX_ROWS)
+    args = parser.parse_args(argv)
+    scale = 0.1 if args.quick else 1.0
+
+    # Per-request logging would be part of what is measured; WARNING keeps it to problems
+    log_setup.configure_logging(level=os.environ.get('NAMESMITHY_LOG_LEVEL', 'WARNING'), stream=sys.stderr)
+    namesmithy.load_original_models()
+    namesmithy.configure_score_batching(args.score_batch_wait_ms, args.score_batch_max_rows)
+    results = {'meta': {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'gbr_loaded': namesmithy.gbr_model is not None,
+        'known_names': len(namesmithy.known_names),
+        'scale': scale,
+        'score_batch_wait_ms': args.score_batch_wait_ms,
+        'score_batch_max_rows': args.score_batch_max_rows,
+        'seed': SEED,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }}
+    if args.only in (None, 'micro'):
+        results['micro'] = micro_benchmarks(scale)
+    if args.only in (None, 'load'):
+        results['load'] = load_test(scale, args.evaluate_threads, args.generate_threads)
+    report(results)
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+    if args.save_baseline:
+        Path(args.baseline).write_text(text + '\n')
+        log("✅ Saved baseline to {}".format(args.baseline))
+        return 0
+    if not Path(args.baseline).exists():
+        log("⚠️  No baseline at {}; run with --save-baseline to create one".format(args.baseline))
+        return 0
+    baseline = json.loads(Path(args.baseline).read_text())
+    if baseline.get('meta', {}).get('scale') != scale:
+        log("⚠️  Baseline was recorded at scale {}; figures may not be comparable".format(
+            baseline.get('meta', {}).get('scale')))
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        log("❌ {} figure(s) regressed by more than {:.0%}".format(len(regressions), args.threshold))
+        return 1
+    log("✅ No regressions beyond {:.0%} against {}".format(args.threshold, args.baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
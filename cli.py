@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+"""
+Offline NameSmithy tools: bulk scoring, candidate pool generation and bundle building.
+
+Usage:
+    python cli.py score names.tsv [-o scored.tsv] [--format tsv|jsonl] [--workers N] [--gender F|M]
+    python cli.py generate --count 100000 [--gender F|M] [--style random|unique] [--engine ngram|heuristic]
+                           [--min-score 70] [--max-score 100] [--max-attempts N] [--workers N] [-o pool.tsv]
+                           [--prefix ka] [--suffix lyn] [--contains x] [--min-length 4] [--max-length 8]
+    python cli.py build-bundle [path]
+
+score reads one name per line, optionally followed by a tab and F/M, or JSONL
+objects with "name" and "gender" (.jsonl/.ndjson files). Use '-' for stdin or
+stdout. Both commands write TSV (with a header) or JSONL rows with the fields
+of score_name_original plus the gender. Progress and throughput go to stderr.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from contextlib import nullcontext
+
+import numpy as np
+
+import log_setup
+import namesmithy
+
+# Rows per scoring task: one model call each
+SCORE_CHUNK_ROWS = 4096
+RESULT_FIELDS = ('name', 'gender', 'score', 'raw_score', 'predicted_score', 'historical_score',
+                 'known_rank', 'score_source', 'appropriate', 'contains_bad_substring', 'quality_tier')
+
+
+def format_rows(results, genders, fmt):
+    """Render score dicts as TSV or JSONL text."""
+    lines = []
+    for result, gender in zip(results, genders):
+        row = dict(result, gender=gender)
+        if fmt == 'jsonl':
+            lines.append(json.dumps({field: row[field] for field in RESULT_FIELDS}))
+        else:
+            lines.append('\t'.join('' if row[field] is None else str(row[field]) for field in RESULT_FIELDS))
+    return ''.join(line + '\n' for line in lines)
+
+
+def read_rows(f, jsonl, default_gender):
+    """Yield (name, gender) from an input file one line at a time; None for unusable lines."""
+    for index, line in enumerate(f):
+        line = line.strip()
+        if not line:
+            continue
+        if jsonl:
+            try:
+                item = json.loads(line)
+                name, gender = str(item.get('name') or '').strip(), item.get('gender') or default_gender
+            except (ValueError, AttributeError):
+                yield None
+                continue
+        else:
+            fields = line.split('\t')
+            if index == 0 and fields[0].strip().lower() == 'name':
+                continue
+            name = fields[0].strip()
+            gender = fields[1].strip() if len(fields) > 1 and fields[1].strip() else default_gender
+        yield (name, gender) if name and gender in ('F', 'M') else None
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _score_chunk(task):
+    """Pool task: score one chunk of (name, gender) rows and return (text, rows scored, rows skipped)."""
+    rows, fmt = task
+    valid = [row for row in rows if row is not None]
+    names = [name for name, _ in valid]
+    genders = [gender for _, gender in valid]
+    return format_rows(namesmithy.score_names_batch(names, genders), genders, fmt), len(valid), len(rows) - len(valid)
+
+
+def make_pool(workers):
+    """A fork pool whose workers inherit the loaded models, or None to work in this process."""
+    if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context('fork').Pool(workers)
+
+
+def bounded_map(pool, func, tasks, workers):
+    """Ordered map over a task iterator with at most 2 tasks per worker in flight.
+
+    Pool.imap would read the whole input up front; this keeps memory flat.
+    """
+    if pool is None:
+        for task in tasks:
+            yield func(task)
+        return
+    in_flight = deque()
+    for task in tasks:
+        in_flight.append(pool.apply_async(func, (task,)))
+        if len(in_flight) >= 2 * workers:
+            yield in_flight.popleft().get()
+    while in_flight:
+        yield in_flight.popleft().get()
+
+
+def open_input(path):
+    return nullcontext(sys.stdin) if path == '-' else open(path, 'r', encoding='utf-8', errors='replace')
+
+
+def open_output(path, stdout):
+    return nullcontext(stdout) if path == '-' else open(path, 'w', encoding='utf-8')
+
+
+def log(message):
+    print(message, file=sys.stderr)
+
+
+def cmd_score(args):
+    jsonl_input = args.input.endswith(('.jsonl', '.ndjson'))
+    namesmithy.load_original_models()
+    pool = make_pool(args.workers)
+
+    start = time.time()
+    scored = skipped = 0
+    last_report = start
+    with open_input(args.input) as f, open_output(args.output, args.stdout) as out:
+        if args.format == 'tsv':
+            out.write('\t'.join(RESULT_FIELDS) + '\n')
+        tasks = ((chunk, args.format) for chunk in chunked(read_rows(f, jsonl_input, args.gender), SCORE_CHUNK_ROWS))
+        for text, n_scored, n_skipped in bounded_map(pool, _score_chunk, tasks, args.workers):
+            out.write(text)
+            scored += n_scored
+            skipped += n_skipped
+            if time.time() - last_report >= 5:
+                log("📊 {:,} names scored ({:,.0f}/s)".format(scored, scored / (time.time() - start)))
+                last_report = time.time()
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    elapsed = time.time() - start
+    log("✅ Scored {:,} names in {:.1f}s ({:,.0f} names/s, {} worker{}){}".format(
+        scored, elapsed, scored / max(elapsed, 1e-9), args.workers, 's' if args.workers != 1 else '',
+        ", skipped {:,} unusable lines".format(skipped) if skipped else ""))
+    return 0
+
+
+def cmd_generate(args):
+    namesmithy.load_original_models()
+    engine = args.engine or namesmithy.default_engine()
+    if engine not in namesmithy.available_engines():
+        log("❌ Unknown generator engine '{}' (available: {})".format(engine, ", ".join(namesmithy.available_engines())))
+        return 1
+    try:
+        constraints = namesmithy.NameConstraints.from_request(vars(args))
+    except ValueError as e:
+        log("❌ {}".format(e))
+        return 1
+    if constraints is not None and engine not in namesmithy.CONSTRAINED_ENGINES:
+        log("❌ Structural constraints need one of the engines: {}".format(", ".join(namesmithy.CONSTRAINED_ENGINES)))
+        return 1
+    min_threshold, max_threshold = args.min_score / 100.0, args.max_score / 100.0
+    band_weights = namesmithy.engine_band_weights(engine, min_threshold, max_threshold)
+    if constraints is None:
+        estimated_yield = namesmithy.yield_estimator.estimate(engine, args.gender, args.style, min_threshold, max_threshold)
+    else:
+        estimated_yield, name_limit = namesmithy.estimate_constrained_yield(
+            engine, args.gender, args.style, band_weights, min_threshold, max_threshold, constraints,
+            np.random.default_rng(args.seed))
+        if name_limit is not None and name_limit < args.count:
+            log("❌ The constraints leave about {:,} distinct names scoring {}-{}; {:,} requested".format(
+                name_limit, args.min_score, args.max_score, args.count))
+            return 1
+    log("🎯 Generating {:,} {} names ({} style, {} engine, scores {}-{}{}); expecting about {:,.0f} attempts".format(
+        args.count, args.gender, args.style, engine, args.min_score, args.max_score,
+        ", {}".format(constraints) if constraints is not None else "", args.count / estimated_yield))
+
+    namesmithy.GENERATION_PROCESSES = args.workers
+    batches_for = namesmithy.parallel_batches if args.workers > 1 else namesmithy.serial_batches
+    batches = batches_for(engine, args.gender, args.style, band_weights, min_threshold, max_threshold,
+                          np.random.default_rng(args.seed), constraints)
+
+    start = time.time()
+    last_report = start
+    found = attempts = 0
+    accepted_names = set()
+    with open_output(args.output, args.stdout) as out:
+        if args.format == 'tsv':
+            out.write('\t'.join(RESULT_FIELDS) + '\n')
+        for batch_attempts, accepted in batches:
+            results = []
+            for _, name, display, predicted, known_rank in accepted:
+                if name.lower() in accepted_names or found + len(results) >= args.count:
+                    continue
+                accepted_names.add(name.lower())
+                results.append(namesmithy.build_score_result(name, display, predicted, known_rank))
+            out.write(format_rows(results, [args.gender] * len(results), args.format))
+            found += len(results)
+            attempts += batch_attempts
+            if time.time() - last_report >= 5:
+                log("📊 {:,}/{:,} names after {:,} attempts ({:,.0f} attempts/s)".format(
+                    found, args.count, attempts, attempts / (time.time() - start)))
+                last_report = time.time()
+            if found >= args.count or (args.max_attempts and attempts >= args.max_attempts):
+                break
+        batches.close()
+
+    elapsed = time.time() - start
+    log("✅ Wrote {:,} names from {:,} attempts in {:.1f}s ({:,.0f} names/s, {:,.0f} attempts/s, {} worker{})".format(
+        found, attempts, elapsed, found / max(elapsed, 1e-9), attempts / max(elapsed, 1e-9),
+        args.workers, 's' if args.workers != 1 else ''))
+    return 0 if found >= args.count else 1
+
+
+def cmd_build_bundle(args):
+    namesmithy.build_model_bundle(args.path)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline NameSmithy scoring and generation")
+    commands = parser.add_subparsers(dest='command', required=True)
+    workers = os.cpu_count() or 1
+
+    score = commands.add_parser('score', help="score a file of names")
+    score.add_argument('input', help="names file (TSV name[<tab>gender] or .jsonl), '-' for stdin")
+    score.add_argument('-o', '--output', default='-', help="output file, '-' for stdout (default)")
+    score.add_argument('--format', choices=('tsv', 'jsonl'), default='tsv')
+    score.add_argument('--gender', choices=('F', 'M'), default='F', help="gender for rows without one")
+    score.add_argument('--workers', type=int, default=workers, help="scoring processes (default: all cores)")
+    score.set_defaults(func=cmd_score)
+
+    generate = commands.add_parser('generate', help="write a pool of pre-scored generated names")
+    generate.add_argument('--count', type=int, required=True)
+    generate.add_argument('--gender', choices=('F', 'M'), default='F')
+    generate.add_argument('--style', choices=('random', 'unique'), default='random')
+    generate.add_argument('--engine', help="generator engine (default: ngram when available)")
+    generate.add_argument('--min-score', type=float, default=70)
+    generate.add_argument('--max-score', type=float, default=100)
+    generate.add_argument('--max-attempts', type=int, default=0, help="stop after this many attempts (default: no limit)")
+    generate.add_argument('--seed', type=int, help="random seed")
+    generate.add_argument('--prefix', help="names start with these letters")
+    generate.add_argument('--suffix', help="names end with these letters")
+    generate.add_argument('--contains', help="names contain these letters in a row")
+    generate.add_argument('--min-length', type=int, help="shortest name length (letters)")
+    generate.add_argument('--max-length', type=int, help="longest name length (letters)")
+    generate.add_argument('-o', '--output', default='-', help="output file, '-' for stdout (default)")
+    generate.add_argument('--format', choices=('tsv', 'jsonl'), default='tsv')
+    generate.add_argument('--workers', type=int, default=workers, help="generation processes (default: all cores)")
+    generate.set_defaults(func=cmd_generate)
+
+    bundle = commands.add_parser('build-bundle', help="precompile the models into a memory-mapped bundle")
+    bundle.add_argument('path', nargs='?', default=namesmithy.BUNDLE_PATH)
+    bundle.set_defaults(func=cmd_build_bundle)
+
+    args = parser.parse_args(argv)
+    # Offline runs see each name once; a score cache would only cost memory and forked workers
+    # must not share its SQLite connection
+    namesmithy.SCORE_CACHE_SIZE = 0
+    # Logs go to stderr, keeping stdout clear for the output rows
+    log_setup.configure_logging(stream=sys.stderr)
+    args.stdout = sys.stdout
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
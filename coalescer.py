@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""
+Micro-batching: merge concurrent calls of a batch function into fewer, larger calls.
+
+Callers submit a request with its size in rows and wait on a Future. One
+dispatcher thread takes the oldest pending request and waits up to max_wait
+seconds from its arrival for others to queue up, going early once max_batch
+rows are pending. It then makes one call over the requests taken, in arrival
+order, and hands each caller its own result (or the call's exception).
+Requests are never split, so one larger than max_batch runs on its own.
+
+A caller's added latency is bounded: at most max_wait plus the batches queued
+ahead of it. Batches grow with concurrency. One caller at a time pays max_wait
+for nothing, which is why this is opt-in. Requests submitted after close()
+run on their own in the caller's thread, so swapping coalescers is safe while
+callers are in flight.
+"""
+
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import Future
+
+from metrics import REGISTRY
+
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+BATCH_ROWS = REGISTRY.histogram('namesmithy_coalesced_batch_rows', 'Rows per coalesced batch call', ('coalescer',),
+                                BATCH_BUCKETS)
+BATCH_REQUESTS = REGISTRY.histogram('namesmithy_coalesced_batch_requests', 'Requests merged into one batch call',
+                                    ('coalescer',), BATCH_BUCKETS)
+QUEUE_SECONDS = REGISTRY.histogram('namesmithy_coalesce_queue_seconds',
+                                   'Time a request waited for its batch call to start', ('coalescer',))
+
+# Dispatchers do not survive a fork; one hook resets every live coalescer in the child,
+# which starts its own dispatcher on first use
+_coalescers = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    for coalescer in list(_coalescers):
+        coalescer._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class BatchCoalescer:
+    """Runs function(requests) -> [result per request] on one dispatcher thread over merged requests."""
+
+    def __init__(self, function, max_batch, max_wait, name='batch'):
+        self.function = function
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self.closed = False
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self._reset()
+        _coalescers.add(self)
+
+    def _reset(self):
+        self.condition = threading.Condition()
+        self.pending = deque()  # (request, rows, enqueued at, future)
+        self.pending_rows = 0
+        self.thread = None
+
+    def submit(self, request, rows=1):
+        """Queue a request of `rows` rows; returns a Future for its result.
+
+        Once closed, the request is run at once in the calling thread instead.
+        """
+        future = Future()
+        with self.condition:
+            if not self.closed:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._dispatch, name='coalesce-' + self.name, daemon=True)
+                    self.thread.start()
+                self.pending.append((request, rows, time.perf_counter(), future))
+                self.pending_rows += rows
+                # The dispatcher only needs waking to start a batch window or to end one early
+                if len(self.pending) == 1 or self.pending_rows >= self.max_batch:
+                    self.condition.notify()
+                return future
+        try:
+            future.set_result(self.function([request])[0])
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+    def call(self, request, rows=1):
+        """submit() and wait for the result."""
+        return self.submit(request, rows).result()
+
+    def close(self):
+        """Stop batching; the dispatcher exits once the queued requests are done."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+    def _take_batch(self):
+        """Wait for a batch window to end and pop its requests, or return None once closed and empty."""
+        with self.condition:
+            while not self.pending:
+                if self.closed:
+                    return None
+                self.condition.wait()
+            deadline = self.pending[0][2] + self.max_wait
+            while self.pending_rows < self.max_batch and not self.closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch = [self.pending.popleft()]
+            rows = batch[0][1]
+            while self.pending and rows + self.pending[0][1] <= self.max_batch:
+                batch.append(self.pending.popleft())
+                rows += batch[-1][1]
+            self.pending_rows -= rows
+            return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            rows = 0
+            for _, n, enqueued, _ in batch:
+                QUEUE_SECONDS.observe(started - enqueued, self.name)
+                rows += n
+            BATCH_ROWS.observe(rows, self.name)
+            BATCH_REQUESTS.observe(len(batch), self.name)
+            self.batches += 1
+            self.requests += len(batch)
+            self.rows += rows
+            try:
+                results = self.function([request for request, _, _, _ in batch])
+            except BaseException as e:
+                for _, _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, _, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'queued_requests': len(self.pending),
+            'batches': self.batches,
+            'requests': self.requests,
+            'rows': self.rows,
+            'mean_requests_per_batch': self.requests / self.batches if self.batches else None,
+        }
@@ -145,6 +145,13 @@ function NameSmithy() {
             };
         }
         
+        // Type-ahead suggestions from the known names
+        if (evalNameInput) {
+            evalNameInput.oninput = function() {
+                self.suggestNames(evalNameInput.value);
+            };
+        }
+        
         console.log('✅ Event listeners set up');
     };
     
@@ -225,6 +232,45 @@ function NameSmithy() {
         xhr.send(requestData);
     };
     
+    this.suggestNames = function(prefix) {
+        var list = document.getElementById('eval-suggestions');
+        var genderSelect = document.getElementById('eval-gender');
+        if (!list || !genderSelect || self.demoMode) {
+            return;
+        }
+        
+        // Only the latest keystroke's answer matters
+        if (self.suggestXhr) {
+            self.suggestXhr.abort();
+        }
+        prefix = prefix.replace(/^\s+|\s+$/g, '');
+        if (!prefix) {
+            list.innerHTML = '';
+            return;
+        }
+        
+        var xhr = new XMLHttpRequest();
+        self.suggestXhr = xhr;
+        xhr.open('GET', self.apiEndpoint + '/suggest?prefix=' + encodeURIComponent(prefix) +
+                 '&gender=' + genderSelect.value, true);
+        xhr.onreadystatechange = function() {
+            if (xhr.readyState === 4 && xhr.status === 200) {
+                try {
+                    var suggestions = JSON.parse(xhr.responseText).suggestions || [];
+                    list.innerHTML = '';
+                    for (var i = 0; i < suggestions.length; i++) {
+                        var option = document.createElement('option');
+                        option.value = suggestions[i].name;
+                        list.appendChild(option);
+                    }
+                } catch (e) {
+                    console.warn('⚠️ Could not read suggestions: ' + e.message);
+                }
+            }
+        };
+        xhr.send();
+    };
+    
     this.evaluateNameDemo = function(name, gender) {
         console.log('🎭 Demo evaluation for: ' + name);
         
@@ -406,7 +452,7 @@ function NameSmithy() {
                         if (data.success && data.session_id) {
                             console.log('✅ Generation started, session:', data.session_id);
                             self.currentSessionId = data.session_id;
-                            self.startProgressPolling();
+                            self.startResultStream();
                         } else {
                             console.error('❌ Failed to start generation. Success:', data.success, 'SessionID:', data.session_id, 'Error:', data.error);
                             self.stopGeneration();
@@ -421,7 +467,11 @@ function NameSmithy() {
                 } else {
                     console.error('💥 HTTP error:', xhr.status);
                     self.stopGeneration();
-                    alert('Server error: ' + xhr.status);
+                    var message = 'Server error: ' + xhr.status;
+                    try {
+                        message = JSON.parse(xhr.responseText).error || message;
+                    } catch (e) {}
+                    alert(message);
                 }
             }
         };
@@ -556,6 +606,61 @@ function NameSmithy() {
         alert('Export not implemented yet');
     };
     
+    this.startResultStream = function() {
+        // Browsers without server-sent events fall back to polling the status endpoint
+        if (typeof EventSource === 'undefined') {
+            self.startProgressPolling();
+            return;
+        }
+        
+        var streamedResults = [];
+        var source = new EventSource(self.apiEndpoint + '/generate/stream/' + self.currentSessionId);
+        self.eventSource = source;
+        
+        source.addEventListener('name', function(e) {
+            // Names arrive one by one as they qualify; show each straight away
+            streamedResults.push(JSON.parse(e.data));
+            self.displayGeneratedNames(streamedResults);
+        });
+        source.addEventListener('progress', function(e) {
+            self.updateProgress(JSON.parse(e.data));
+        });
+        source.addEventListener('completed', function(e) {
+            source.close();
+            var status = JSON.parse(e.data);
+            console.log('🎉 Generation completed, results:', status.results);
+            self.updateProgress(status);
+            if (self.isGenerating) {
+                self.onGenerationComplete(status.results);
+            }
+        });
+        source.addEventListener('error', function(e) {
+            // Server-sent 'error' events carry data; connection errors do not
+            if (!e.data) {
+                return;
+            }
+            source.close();
+            var status = JSON.parse(e.data);
+            console.error('❌ Generation error:', status.error);
+            if (self.isGenerating) {
+                self.onGenerationError(status.error);
+            }
+        });
+        source.addEventListener('aborted', function(e) {
+            source.close();
+            console.log('🛑 Generation aborted');
+            if (self.isGenerating) {
+                self.onGenerationAborted(JSON.parse(e.data).results);
+            }
+        });
+        source.onerror = function() {
+            if (source.readyState === EventSource.CLOSED && self.isGenerating) {
+                console.error('💥 Result stream closed, falling back to polling');
+                self.startProgressPolling();
+            }
+        };
+    };
+    
     this.startProgressPolling = function() {
         self.progressInterval = setInterval(function() {
             if (!self.isGenerating || !self.currentSessionId) {
@@ -604,6 +709,9 @@ function NameSmithy() {
                              ', Found: ' + status.found + 
                              ', Attempts: ' + status.attempts + 
                              ' | Elapsed: ' + status.elapsed + 's';
+            if (status.status === 'running' && typeof status.eta === 'number') {
+                progressText += ', ETA: ~' + Math.ceil(status.eta) + 's';
+            }
             progressDetails.innerHTML = progressText;
         }
     };
@@ -613,6 +721,10 @@ function NameSmithy() {
         if (self.progressInterval) {
             clearInterval(self.progressInterval);
         }
+        if (self.eventSource) {
+            self.eventSource.close();
+            self.eventSource = null;
+        }
         
         var loadingDiv = document.getElementById('loading');
         var generateBtn = document.getElementById('generate-btn');
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+"""
+Leveled, non-blocking logging for NameSmithy.
+
+Modules log through the standard logging package with
+logging.getLogger(__name__). configure_logging() hands every record to a
+bounded in-memory queue drained by one background thread, which formats and
+writes it, so a slow stdout pipe or log collector never holds up a request or
+a generation worker. When the queue is full, records are dropped and counted
+rather than waited on.
+
+Levels come from NAMESMITHY_LOG_LEVEL (default INFO) and can be overridden
+per module with NAMESMITHY_LOG_LEVELS, e.g. "server=DEBUG,namesmithy=WARNING".
+NAMESMITHY_LOG_FORMAT=json writes one JSON object per record instead of text.
+
+High-frequency events go through an EventSampler, which logs only every nth
+event (all of them when its logger is at DEBUG) and decides before a log
+record is even built, so the skipped ones cost well under a microsecond.
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+QUEUE_SIZE = 10000
+TEXT_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+# For several processes writing to one stream (python server.py serve)
+PID_TEXT_FORMAT = '%(asctime)s %(levelname)-7s [%(process)d] %(name)s: %(message)s'
+# LogRecord attributes that are not extra fields, for the JSON format
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_handler = None
+_output = None
+
+
+class EventSampler:
+    """Logs the first and then every nth of a stream of events, or all of them when the logger is at DEBUG."""
+
+    def __init__(self, logger, every):
+        self.logger = logger
+        self.every = every
+        self.events = itertools.count()
+
+    def log(self, level, msg, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        # next() on itertools.count is atomic, so concurrent callers never share a slot
+        n = next(self.events)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.log(level, msg, *args)
+        elif n % self.every == 0:
+            self.logger.log(level, msg + ' [1 in %d]', *args, self.every)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: records that do not fit are counted and discarded.
+
+    Records are queued as they are, so formatting happens on the writer
+    thread rather than in the caller.
+    """
+
+    def __init__(self, records):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any extra fields."""
+
+    def __init__(self, show_pid=False):
+        super().__init__()
+        self.show_pid = show_pid
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + '.{:03d}'.format(
+                int(record.msecs)),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if self.show_pid:
+            entry['pid'] = record.process
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def parse_levels(text):
+    """'server=DEBUG,namesmithy=WARNING' -> {'server': 'DEBUG', 'namesmithy': 'WARNING'}."""
+    levels = {}
+    for item in (text or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level=None, module_levels=None, stream=None, fmt=None, background=True, show_pid=False):
+    """Route all logging through the background writer. Safe to call again to reconfigure.
+
+    Arguments left as None fall back to the NAMESMITHY_LOG_* environment
+    variables; stream defaults to stdout. background=False writes records
+    directly, for a process that must not run threads (a pre-fork master);
+    show_pid tags every record with the process ID.
+    """
+    global _listener, _handler, _output
+    level = (level or os.environ.get('NAMESMITHY_LOG_LEVEL') or 'INFO').upper()
+    module_levels = dict(parse_levels(os.environ.get('NAMESMITHY_LOG_LEVELS')), **(module_levels or {}))
+    fmt = fmt or os.environ.get('NAMESMITHY_LOG_FORMAT') or 'text'
+
+    shutdown_logging()
+    _output = logging.StreamHandler(stream or sys.stdout)
+    _output.setFormatter(JsonFormatter(show_pid) if fmt == 'json'
+                         else logging.Formatter(PID_TEXT_FORMAT if show_pid else TEXT_FORMAT))
+    _handler = DroppingQueueHandler(queue.Queue(QUEUE_SIZE))
+    if background:
+        _listener = QueueListener(_handler.queue, _output)
+        _listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler if background else _output)
+    root.setLevel(level)
+    for name, module_level in module_levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+
+def ensure_logging():
+    """configure_logging() from the environment unless the process has configured it already."""
+    if _handler is None:
+        configure_logging()
+
+
+def shutdown_logging():
+    """Write out queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _after_fork_in_child():
+    # The writer thread does not survive a fork; forked workers log synchronously instead
+    global _listener
+    if _handler is None:
+        return
+    _listener = None
+    root = logging.getLogger()
+    if _handler in root.handlers:
+        root.removeHandler(_handler)
+        root.addHandler(_output)
+
+
+def stats():
+    return {
+        'queued': _handler.queue.qsize() if _handler is not None else 0,
+        'dropped': _handler.dropped if _handler is not None else 0,
+        'writer_running': _listener is not None,
+    }
+
+
+atexit.register(shutdown_logging)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
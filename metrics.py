@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+"""
+Counters, latency histograms and a sampling profiler for NameSmithy, rendered as Prometheus text.
+
+Hot paths only ever touch their own thread's shard: a dict from
+(metric, label values) to a list of numbers that no other thread writes, so
+recording takes no lock. Rendering sums the shards of all threads; shards of
+threads that have exited are folded into a retired total so counters never
+go backwards. Work done in forked processes can be recorded into a private
+shard with capture() and merged back into the parent with merge().
+
+Gauges are callbacks evaluated at render time, for values that already live
+elsewhere (queue lengths, cache sizes).
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Seconds; tuned for per-batch stages and API calls from ~50us to several seconds
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILE_INTERVAL = 0.01
+# Frames kept per sampled stack, innermost first
+PROFILE_MAX_DEPTH = 64
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+                                           .replace('\n', '\\n')) for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count, optionally split by label values."""
+
+    kind = 'counter'
+
+    def __init__(self, registry, name, documentation, labels=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def inc(self, amount=1, *labels):
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        cell = shard.get(key)
+        if cell is None:
+            cell = shard[key] = [0]
+        cell[0] += amount
+
+    def samples(self, totals):
+        for (name, labels), cell in sorted(totals.items()):
+            if name == self.name:
+                yield self.name + '_total', labels, (), cell[0]
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets, optionally split by label values."""
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        cell = shard.get(key)
+        if cell is None:
+            # One count per bucket, one for +Inf, then the sum
+            cell = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the wall time of a with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self, totals):
+        for (name, labels), cell in sorted(totals.items()):
+            if name != self.name:
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), cell):
+                cumulative += count
+                yield self.name + '_bucket', labels, (('le', _format_value(bound)),), cumulative
+            yield self.name + '_sum', labels, (), cell[-1]
+            yield self.name + '_count', labels, (), cumulative
+
+
+class Gauge:
+    """Value read from a callback at render time: a number, or {label values tuple: number}."""
+
+    def __init__(self, name, documentation, callback, labels=(), kind='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def samples(self, totals):
+        value = self.callback()
+        if value is None:
+            return
+        items = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        for labels, number in items:
+            if number is not None:
+                yield self.name, labels, (), number
+
+
+class Registry:
+    """The set of metrics one process exposes, with a shard of values per recording thread."""
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.shards = []  # (thread, shard) for every thread that has recorded something
+        self.retired = {}  # totals from exited threads and merged captures
+        # A fork can happen while another thread holds the lock; the child gets a fresh one
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self.lock = threading.Lock()
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(self, name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labels, buckets))
+
+    def gauge(self, name, documentation, callback, labels=(), kind='gauge'):
+        return self._register(Gauge(name, documentation, callback, labels, kind))
+
+    def _register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def shard(self):
+        """This thread's shard, created on its first recording."""
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = {}
+            with self.lock:
+                # Threaded servers start a thread per request; fold exited ones here so memory
+                # follows the live threads rather than how often the metrics are scraped
+                self._retire_exited()
+                self.shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire_exited(self):
+        """Fold the shards of exited threads into retired. Call with the lock held."""
+        alive = []
+        for thread, shard in self.shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self._add(self.retired, shard)
+        self.shards = alive
+
+    @staticmethod
+    def _add(totals, shard):
+        for key, cell in list(shard.items()):
+            total = totals.get(key)
+            if total is None:
+                totals[key] = list(cell)
+            else:
+                for i, value in enumerate(cell):
+                    total[i] += value
+
+    @contextmanager
+    def capture(self):
+        """Record this thread's metrics into a fresh shard for the duration, and yield it.
+
+        Meant for pool tasks in forked processes, whose shards the parent
+        never sees: return the captured shard with the task's result and
+        merge() it on the other side.
+        """
+        previous = getattr(self.local, 'shard', None)
+        self.local.shard = captured = {}
+        try:
+            yield captured
+        finally:
+            self.local.shard = previous
+
+    def merge(self, shard):
+        """Add a shard recorded elsewhere (see capture) to this registry's totals."""
+        with self.lock:
+            self._add(self.retired, shard)
+
+    def totals(self):
+        """Summed values of every shard, keyed by (metric name, label values)."""
+        with self.lock:
+            self._retire_exited()
+            totals = {key: list(cell) for key, cell in self.retired.items()}
+            shards = [shard for _, shard in self.shards]
+        for shard in shards:
+            self._add(totals, shard)
+        return totals
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        totals = self.totals()
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = list(metric.samples(totals))
+            except Exception as e:
+                lines.append('# {} unavailable: {}'.format(metric.name, e))
+                continue
+            lines.append('# HELP {} {}'.format(metric.name, metric.documentation))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+            for name, labels, extra, value in samples:
+                lines.append('{}{} {}'.format(name, _format_labels(metric.labels, labels, extra), _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """Statistical profiler for selected threads: samples their stacks every interval seconds.
+
+    Threads opt in with watch(); stopped, it costs nothing. Running, a
+    background thread wakes once per interval and records each watched
+    thread's current stack, so the overhead grows with the sampling rate and
+    not with the work being profiled. Stacks are reported in the folded
+    format flame graph tools read ("outer;inner count").
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.watched = set()
+        self.stacks = _Tally()
+        self.n_samples = 0
+        self.started_at = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        # The sampling thread does not survive a fork, and its lock may have been held
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @contextmanager
+    def watch(self):
+        """Include the calling thread in samples for the duration of a with block."""
+        ident = threading.get_ident()
+        self.watched.add(ident)
+        try:
+            yield
+        finally:
+            self.watched.discard(ident)
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, interval=None):
+        with self.lock:
+            if interval:
+                self.interval = float(interval)
+            if self.running:
+                return
+            self.stop_event.clear()
+            self.started_at = time.time()
+            self.thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+            self.thread.start()
+        logger.info("🔧 Sampling profiler started (%.0f samples/s per generation thread)", 1.0 / self.interval)
+
+    def stop(self):
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.stop_event.set()
+            thread.join()
+            logger.info("🔧 Sampling profiler stopped after %s samples", self.n_samples)
+
+    def reset(self):
+        with self.lock:
+            self.stacks.clear()
+            self.n_samples = 0
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            sampled = []
+            for ident in list(self.watched):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name))
+                    frame = frame.f_back
+                if stack:
+                    sampled.append(';'.join(reversed(stack)))
+            del frames
+            with self.lock:
+                self.stacks.update(sampled)
+                self.n_samples += len(sampled)
+
+    def folded(self):
+        """Sampled stacks in folded format, most frequent first."""
+        with self.lock:
+            return ''.join('{} {}\n'.format(stack, count) for stack, count in self.stacks.most_common())
+
+    def stats(self):
+        with self.lock:
+            return {
+                'running': self.running,
+                'interval': self.interval,
+                'samples': self.n_samples,
+                'distinct_stacks': len(self.stacks),
+                'watched_threads': len(self.watched),
+                'started_at': self.started_at,
+            }
+
+
+REGISTRY = Registry()
+PROFILER = SamplingProfiler()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+Prefix suggestions over the known names from an array-backed trie.
+
+Nodes are numbered breadth first, and lexicographically within a depth, so a
+node's children are contiguous: first_child[node] .. + n_children[node],
+with their letter codes in symbol[] in ascending order. Every node also
+keeps its top-k completions, best historical score first, as a CSR slice
+top_rows[top_offsets[node]:top_offsets[node + 1]] of row numbers into the
+gender's name table. A suggestion query is a walk of len(prefix) nodes (a
+binary search among at most 26 children each) followed by one slice; nothing
+is sorted at query time.
+
+Codes use the server's name_to_vec alphabet: 1-26 are 'a'-'z' and 0 ends the
+name.
+"""
+
+import numpy as np
+
+FORMAT_VERSION = 1
+TOP_K = 10
+
+
+class NameTrie:
+    """Trie over one gender's (N, 15) name codes, ranking completions by score."""
+
+    ARRAY_NAMES = ('first_child', 'n_children', 'symbol', 'top_offsets', 'top_rows')
+
+    def __init__(self, first_child, n_children, symbol, top_offsets, top_rows):
+        self.first_child = first_child
+        self.n_children = n_children
+        self.symbol = symbol
+        self.top_offsets = top_offsets
+        self.top_rows = top_rows
+
+    @property
+    def n_nodes(self):
+        return len(self.symbol)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.ARRAY_NAMES)
+
+    @classmethod
+    def build(cls, codes, scores, top_k=TOP_K):
+        codes = np.asarray(codes, dtype=np.int64)
+        n, max_length = codes.shape
+        order = np.lexsort(codes.T[::-1])
+        ordered = codes[order]
+        lengths = np.where((ordered == 0).any(axis=1), (ordered == 0).argmax(axis=1), max_length)
+        # Leading codes each row shares with the row before it
+        same = np.zeros((n, max_length), dtype=bool)
+        same[1:] = ordered[1:] == ordered[:-1]
+        common = np.where(same.all(axis=1), max_length, (~same).argmax(axis=1))
+
+        # node_of[i, d]: node of row i's first d letters. Sorted rows sharing a prefix are
+        # adjacent, so a row starts a new node at depth d exactly when it shares fewer than
+        # d codes with the row before it.
+        node_of = np.full((n, max_length + 1), -1, dtype=np.int64)
+        node_of[:, 0] = 0
+        parents, symbols = [-1], [0]
+        for depth in range(1, max_length + 1):
+            rows = np.flatnonzero(lengths >= depth)
+            new = common[rows] < depth
+            ids = len(symbols) + np.cumsum(new) - 1
+            node_of[rows, depth] = np.maximum.accumulate(np.where(new, ids, -1))
+            parents.extend(node_of[rows[new], depth - 1].tolist())
+            symbols.extend(ordered[rows[new], depth - 1].tolist())
+        parents = np.array(parents, dtype=np.int64)
+        n_nodes = len(symbols)
+        first_child = np.searchsorted(parents[1:], np.arange(n_nodes)).astype(np.int32) + 1
+        n_children = np.bincount(parents[1:], minlength=n_nodes).astype(np.int32)
+
+        # Top-k per node: every (node on a name's path, name) pair, best score first within each node
+        pair_nodes = node_of[node_of >= 0]
+        pair_rows = np.broadcast_to(order[:, None], node_of.shape)[node_of >= 0]
+        ranked = np.lexsort((-np.asarray(scores, dtype=np.float64)[pair_rows], pair_nodes))
+        pair_nodes, pair_rows = pair_nodes[ranked], pair_rows[ranked]
+        starts = np.searchsorted(pair_nodes, np.arange(n_nodes))
+        keep = np.arange(len(pair_nodes)) - starts[pair_nodes] < top_k
+        top_offsets = np.searchsorted(pair_nodes[keep], np.arange(n_nodes + 1)).astype(np.int32)
+        return cls(first_child, n_children, np.array(symbols, dtype=np.uint8), top_offsets,
+                   pair_rows[keep].astype(np.int32))
+
+    def find(self, codes):
+        """Node reached by a sequence of letter codes, or None."""
+        node = 0
+        for code in codes:
+            start = self.first_child[node]
+            children = self.symbol[start:start + self.n_children[node]]
+            j = int(np.searchsorted(children, code))
+            if j == len(children) or children[j] != code:
+                return None
+            node = start + j
+        return node
+
+    def top(self, codes, k=TOP_K):
+        """Rows of the k best names starting with a code sequence, best first."""
+        node = self.find(codes)
+        if node is None:
+            return self.top_rows[:0]
+        return self.top_rows[self.top_offsets[node]:self.top_offsets[node + 1]][:k]
+
+
+class SuggestIndex:
+    """A NameTrie per gender over code and score tables shared with ScoreRangeIndex."""
+
+    def __init__(self, tries, codes_by_gender, scores_by_gender):
+        self.tries = tries
+        self.codes = codes_by_gender
+        self.scores = scores_by_gender
+
+    @classmethod
+    def build(cls, codes_by_gender, scores_by_gender, top_k=TOP_K):
+        return cls({g: NameTrie.build(codes_by_gender[g], scores_by_gender[g], top_k) for g in codes_by_gender},
+                   codes_by_gender, scores_by_gender)
+
+    def suggest(self, codes, gender, k=TOP_K):
+        """(code row, score) of the k best names starting with a code sequence."""
+        gender = 'M' if gender == 'M' else 'F'
+        return [(self.codes[gender][row], float(self.scores[gender][row]))
+                for row in self.tries[gender].top(codes, k)]
+
+    @property
+    def nbytes(self):
+        return sum(trie.nbytes for trie in self.tries.values())
+
+    def to_arrays(self):
+        arrays = {'format_version': np.array(FORMAT_VERSION, dtype=np.int32)}
+        for gender, trie in self.tries.items():
+            for name in NameTrie.ARRAY_NAMES:
+                arrays['{}_{}'.format(name, gender)] = getattr(trie, name)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, codes_by_gender, scores_by_gender):
+        """Wrap trie arrays written by to_arrays (zero-copy) around the name tables they index."""
+        version = int(arrays['format_version'])
+        if version != FORMAT_VERSION:
+            raise ValueError("Unsupported name trie format version {}".format(version))
+        tries = {g: NameTrie(*(arrays['{}_{}'.format(name, g)] for name in NameTrie.ARRAY_NAMES))
+                 for g in codes_by_gender}
+        return cls(tries, codes_by_gender, scores_by_gender)
@@ -0,0 +1,1230 @@
+#!/usr/bin/env python
+"""
+NameSmithy core: name encoding, the known-names index, scoring and generation.
+
+Nothing here depends on Flask. Models are module globals filled in by
+load_original_models(), which both the web server and the command-line
+tools call once at startup; forked worker processes inherit them.
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from bad_substrings import SubstringAutomaton
+from coalescer import BatchCoalescer
+from metrics import REGISTRY
+from model_bundle import Bundle, write_bundle
+from name_trie import SuggestIndex
+from ngram_generator import MAX_LENGTH, MIN_LENGTH, NgramGenerator
+from score_cache import ScoreCache, SqliteScoreStore
+from similar_names import SimilarNamesIndex
+from tree_ensemble import TreeEnsemble, compile_gbr, load_pickled_gbr
+
+logger = logging.getLogger(__name__)
+
+# Global variables for models
+gbr_model = None
+known_names = None  # KnownNamesIndex, built by load_original_models
+popular_names = None  # ScoreRangeIndex over known_names, for the 'popular' style
+similar_names = None  # SimilarNamesIndex over popular_names' tables, for nearest known names
+name_suggestions = None  # SuggestIndex (prefix tries) over popular_names' tables, for autocomplete
+yield_estimator = None  # YieldEstimator for generated candidates, per generator profile
+ngram_model = None  # NgramGenerator trained from the known names
+score_cache = None  # ScoreCache in front of model scoring, reset whenever the models change
+score_batcher = None  # BatchCoalescer merging concurrent model calls, when micro-batching is on
+bad_substrings = None  # SubstringAutomaton over bad words that no known name contains
+model_load_seconds = None  # wall time of the last load_original_models()
+
+# Time spent per call of each generation and scoring stage, from the request threads, workers and pool
+STAGE_SECONDS = REGISTRY.histogram('namesmithy_stage_seconds', 'Wall time of one call of a scoring or generation stage',
+                                   ('stage',))
+REGISTRY.gauge('namesmithy_model_load_seconds', 'Wall time of the last model load', lambda: model_load_seconds)
+
+# Score cache size (0 disables it) and optional SQLite file that keeps scores across restarts
+SCORE_CACHE_SIZE = int(os.environ.get('NAMESMITHY_SCORE_CACHE_SIZE', 100000))
+SCORE_CACHE_PATH = os.environ.get('NAMESMITHY_SCORE_CACHE_PATH')
+
+# Micro-batching of model calls from concurrent threads: the longest a call waits for others to
+# join it, in milliseconds (0 turns it off), and the most rows merged into one model call
+SCORE_BATCH_WAIT_MS = float(os.environ.get('NAMESMITHY_SCORE_BATCH_WAIT_MS', 0))
+SCORE_BATCH_MAX_ROWS = int(os.environ.get('NAMESMITHY_SCORE_BATCH_MAX_ROWS', 256))
+chars = sorted(list(set('abcdefghijklmnopqqrstuvwxyz ')))
+char_to_int = {c: i for i, c in enumerate(chars)}
+int_to_char = {i: c for i, c in enumerate(chars)}
+
+# Byte -> code lookup table matching char_to_int; anything outside a-z encodes as 0 (space)
+BYTE_TO_CODE = np.zeros(256, dtype=np.uint8)
+for _char, _code in char_to_int.items():
+    BYTE_TO_CODE[ord(_char)] = _code
+
+def name_to_vec(name, max_length=15):
+    """Convert name to vector (original logic); names longer than max_length are truncated."""
+    name = name.lower()[:max_length]
+    filler = max_length - len(name)
+    return [char_to_int.get(char, 0) for char in name + ' ' * filler]
+
+def encode_names(names, max_length=15):
+    """Encode names into a (N, max_length) uint8 code matrix, same codes as name_to_vec.
+
+    Non-ASCII characters become a single padding code, and names longer than
+    max_length are truncated, exactly as name_to_vec does.
+    """
+    raw = np.array([name.lower().encode('ascii', 'replace')[:max_length] for name in names],
+                   dtype='S{}'.format(max_length))
+    return BYTE_TO_CODE[raw.view(np.uint8).reshape(len(names), max_length)]
+
+def build_features(codes, gender='F'):
+    """Prepend the gender bit to a code matrix, giving the (N, 16) model feature matrix.
+
+    gender is either a single 'F'/'M' or a sequence with one entry per row.
+    """
+    features = np.empty((codes.shape[0], codes.shape[1] + 1), dtype=np.uint8)
+    if isinstance(gender, str):
+        features[:, 0] = 0 if gender == 'F' else 1
+    else:
+        features[:, 0] = [0 if g == 'F' else 1 for g in gender]
+    features[:, 1:] = codes
+    return features
+
+class BloomFilter:
+    """Bloom filter over packed (hi, lo) name keys: no false negatives, about 0.3% false positives.
+
+    A bit array of a power-of-two size probed at n_hashes positions derived
+    from one 64-bit mix of the key (double hashing). Answering "definitely
+    not a known name" costs a few vectorised gathers, so most generated
+    candidates never reach the exact binary search.
+    """
+
+    BITS_PER_KEY = 12
+    N_HASHES = 8
+
+    def __init__(self, bits, n_hashes=N_HASHES):
+        self.bits = bits
+        self.n_hashes = int(n_hashes)
+        self.mask = np.uint64(len(bits) * 8 - 1)
+
+    @classmethod
+    def build(cls, hi, lo, bits_per_key=BITS_PER_KEY, n_hashes=N_HASHES):
+        n_bits = 64
+        while n_bits < bits_per_key * len(hi):
+            n_bits *= 2
+        bloom = cls(np.zeros(n_bits // 8, dtype=np.uint8), n_hashes)
+        for position in bloom._positions(hi, lo):
+            np.bitwise_or.at(bloom.bits, position >> np.uint64(3),
+                             (np.uint8(1) << (position & np.uint64(7)).astype(np.uint8)))
+        return bloom
+
+    @staticmethod
+    def _mix(hi, lo):
+        """splitmix64 finaliser over the key; uint64 arithmetic wraps."""
+        z = np.asarray(hi, dtype=np.uint64) ^ (np.asarray(lo, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15))
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+    def _positions(self, hi, lo):
+        z = self._mix(hi, lo)
+        h1, h2 = z & np.uint64(0xFFFFFFFF), (z >> np.uint64(32)) | np.uint64(1)
+        for i in range(self.n_hashes):
+            yield (h1 + np.uint64(i) * h2) & self.mask
+
+    def contains(self, hi, lo):
+        """True where a key may be in the set, False where it certainly is not."""
+        found = np.ones(len(hi), dtype=bool)
+        for position in self._positions(hi, lo):
+            found &= (self.bits[position >> np.uint64(3)] >> (position & np.uint64(7)).astype(np.uint8)) & 1 == 1
+        return found
+
+    def to_arrays(self):
+        return {'filter_bits': self.bits, 'filter_hashes': np.array(self.n_hashes, dtype=np.int32)}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['filter_bits'], int(arrays['filter_hashes']))
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+class KnownNamesIndex:
+    """Historical scores for (gender, name) pairs, stored as sorted packed integer keys.
+
+    Name codes fit in 5 bits, so the gender bit plus the first 12 codes pack
+    into one uint64 and the last 3 codes into a uint16. Keys are sorted by
+    (hi, lo) and looked up by binary search on hi; only names sharing their
+    first 12 letters need a short linear step on lo. Bad words are
+    gender-independent, so they live once in their own table and take
+    precedence over names, as they did when they overwrote both gender
+    entries of the old dict.
+
+    A BloomFilter over both tables (bad words entered under both genders)
+    screens lookups first; only the rows it passes are binary-searched.
+    """
+
+    HI_CODES = 12
+    SHIFTS = np.arange(5 * (HI_CODES - 1), -1, -5, dtype=np.uint64)
+
+    def __init__(self, name_features=None, name_scores=None, bad_codes=None, bad_scores=None):
+        if name_features is None:
+            name_features = np.zeros((0, 16), dtype=np.uint8)
+        if bad_codes is None:
+            bad_codes = np.zeros((0, 15), dtype=np.uint8)
+        self.name_hi, self.name_lo, self.name_scores = self._sorted_table(
+            *self._pack(name_features[:, 1:], name_features[:, 0]), name_scores)
+        self.bad_hi, self.bad_lo, self.bad_scores = self._sorted_table(
+            *self._pack(bad_codes), bad_scores)
+        self.filter = self._build_filter()
+
+    def _build_filter(self):
+        gender_bit = np.uint64(1) << np.uint64(60)
+        return BloomFilter.build(np.concatenate([self.name_hi, self.bad_hi, self.bad_hi | gender_bit]),
+                                 np.concatenate([self.name_lo, self.bad_lo, self.bad_lo]))
+
+    @classmethod
+    def _pack(cls, codes, gender_bits=None):
+        """Pack a (N, 15) code matrix (and optional gender bits) into (hi, lo) integer keys."""
+        codes = np.asarray(codes, dtype=np.uint64)
+        hi = np.bitwise_or.reduce(codes[:, :cls.HI_CODES] << cls.SHIFTS, axis=1)
+        if gender_bits is not None:
+            hi |= np.asarray(gender_bits, dtype=np.uint64) << np.uint64(60)
+        lo = np.zeros(len(codes), dtype=np.uint16)
+        for code in codes[:, cls.HI_CODES:].T.astype(np.uint16):
+            lo = (lo << np.uint16(5)) | code
+        return hi.astype(np.uint64), lo
+
+    @staticmethod
+    def _sorted_table(hi, lo, scores):
+        """Sort keys for binary search; the last score wins for duplicate keys."""
+        scores = np.asarray(scores if scores is not None else [], dtype=np.float64)
+        order = np.lexsort((np.arange(len(hi)), lo, hi))
+        hi, lo, scores = hi[order], lo[order], scores[order]
+        last = np.ones(len(hi), dtype=bool)
+        last[:-1] = (hi[1:] != hi[:-1]) | (lo[1:] != lo[:-1])
+        return hi[last], lo[last], scores[last]
+
+    @staticmethod
+    def _search(table_hi, table_lo, table_scores, hi, lo):
+        """Find (hi, lo) keys in a sorted table; NaN where absent."""
+        found = np.full(len(hi), np.nan)
+        pending = np.arange(len(hi))
+        pos = np.searchsorted(table_hi, hi)
+        # Step past entries that share hi but sort below the wanted lo (rare)
+        while len(pending):
+            at = pos[pending]
+            valid = at < len(table_hi)
+            pending, at = pending[valid], at[valid]
+            same_hi = table_hi[at] == hi[pending]
+            pending, at = pending[same_hi], at[same_hi]
+            hit = table_lo[at] == lo[pending]
+            found[pending[hit]] = table_scores[at[hit]]
+            behind = table_lo[at] < lo[pending]
+            pending = pending[behind]
+            pos[pending] += 1
+        return found
+
+    def lookup(self, features):
+        """Bulk lookup of (N, 16) feature rows; returns scores with NaN for unknown names."""
+        hi, lo = self._pack(features[:, 1:])
+        gender_hi = hi | (features[:, 0].astype(np.uint64) << np.uint64(60))
+        found = np.full(len(features), np.nan)
+        maybe = np.flatnonzero(self.filter.contains(gender_hi, lo))
+        if len(maybe):
+            scores = self._search(self.name_hi, self.name_lo, self.name_scores, gender_hi[maybe], lo[maybe])
+            bad = self._search(self.bad_hi, self.bad_lo, self.bad_scores, hi[maybe], lo[maybe])
+            found[maybe] = np.where(np.isnan(bad), scores, bad)
+        return found
+
+    def get(self, name, gender='F', default=None):
+        """Historical score for a single name, or default if unknown."""
+        score = self.lookup(build_features(encode_names([name]), gender))[0]
+        return default if np.isnan(score) else float(score)
+
+    def name_entries(self):
+        """Unpack the name table into (codes, gender_bits, scores), skipping names that are bad words."""
+        codes = np.empty((len(self.name_hi), 15), dtype=np.uint8)
+        codes[:, :self.HI_CODES] = (self.name_hi[:, None] >> self.SHIFTS) & np.uint64(31)
+        for j in range(15 - self.HI_CODES):
+            codes[:, self.HI_CODES + j] = (self.name_lo >> np.uint16(5 * (14 - self.HI_CODES - j))) & np.uint16(31)
+        gender_bits = (self.name_hi >> np.uint64(60)).astype(np.uint8)
+        name_only_hi = self.name_hi & np.uint64((1 << 60) - 1)
+        clean = np.isnan(self._search(self.bad_hi, self.bad_lo, self.bad_scores, name_only_hi, self.name_lo))
+        return codes[clean], gender_bits[clean], self.name_scores[clean]
+
+    def bad_entries(self):
+        """Unpack the bad word table into a (N, 15) code matrix."""
+        codes = np.empty((len(self.bad_hi), 15), dtype=np.uint8)
+        codes[:, :self.HI_CODES] = (self.bad_hi[:, None] >> self.SHIFTS) & np.uint64(31)
+        for j in range(15 - self.HI_CODES):
+            codes[:, self.HI_CODES + j] = (self.bad_lo >> np.uint16(5 * (14 - self.HI_CODES - j))) & np.uint16(31)
+        return codes
+
+    ARRAY_NAMES = ('name_hi', 'name_lo', 'name_scores', 'bad_hi', 'bad_lo', 'bad_scores')
+
+    def to_arrays(self):
+        """Return the sorted index tables and the filter as a dict of plain arrays."""
+        arrays = {name: getattr(self, name) for name in self.ARRAY_NAMES}
+        arrays.update(self.filter.to_arrays())
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Wrap already-sorted tables (e.g. memory-mapped bundle views) without copying."""
+        index = cls.__new__(cls)
+        for name in cls.ARRAY_NAMES:
+            setattr(index, name, arrays[name])
+        # Bundles written before the filter existed rebuild it in memory
+        index.filter = BloomFilter.from_arrays(arrays) if 'filter_bits' in arrays else index._build_filter()
+        return index
+
+    def __contains__(self, name_and_gender):
+        name, gender = name_and_gender
+        return self.get(name, gender) is not None
+
+    def __len__(self):
+        return len(self.name_hi) + len(self.bad_hi)
+
+    @property
+    def nbytes(self):
+        """Memory held by the index arrays."""
+        return sum(a.nbytes for a in (self.name_hi, self.name_lo, self.name_scores,
+                                      self.bad_hi, self.bad_lo, self.bad_scores)) + self.filter.nbytes
+
+class ScoreRangeIndex:
+    """Known names per gender sorted by historical score, for sampling straight from a score window.
+
+    Backs the 'popular' style: a score window is two binary searches, so the
+    number of qualifying names is known before any work starts and sampling
+    never has to hit the database by chance.
+    """
+
+    def __init__(self, codes_by_gender, scores_by_gender):
+        self.codes = codes_by_gender
+        self.scores = scores_by_gender
+
+    @classmethod
+    def from_known_names(cls, index):
+        """Build the per-gender score-sorted tables from a KnownNamesIndex."""
+        codes, gender_bits, scores = index.name_entries()
+        codes_by_gender, scores_by_gender = {}, {}
+        for gender, bit in (('F', 0), ('M', 1)):
+            mine = gender_bits == bit
+            order = np.argsort(scores[mine], kind='stable')
+            codes_by_gender[gender] = codes[mine][order]
+            scores_by_gender[gender] = scores[mine][order]
+        return cls(codes_by_gender, scores_by_gender)
+
+    def to_arrays(self):
+        arrays = {}
+        for gender in ('F', 'M'):
+            arrays['codes_' + gender] = self.codes[gender]
+            arrays['scores_' + gender] = self.scores[gender]
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls({g: arrays['codes_' + g] for g in ('F', 'M')},
+                   {g: arrays['scores_' + g] for g in ('F', 'M')})
+
+    def window(self, gender, min_score, max_score):
+        """Slice bounds of names whose score lies in [min_score, max_score] (0-1 scale)."""
+        scores = self.scores['M' if gender == 'M' else 'F']
+        return (int(np.searchsorted(scores, min_score, side='left')),
+                int(np.searchsorted(scores, max_score, side='right')))
+
+    def count(self, gender, min_score, max_score):
+        """Number of known names scoring in [min_score, max_score]."""
+        lo, hi = self.window(gender, min_score, max_score)
+        return max(0, hi - lo)
+
+    def sample(self, gender, min_score, max_score, n, rng=None, weighted=False):
+        """Sample up to n distinct names from the score window, optionally weighted by score."""
+        if rng is None:
+            rng = np.random.default_rng()
+        gender = 'M' if gender == 'M' else 'F'
+        lo, hi = self.window(gender, min_score, max_score)
+        size = max(0, hi - lo)
+        n = min(n, size)
+        if n == 0:
+            return []
+        p = None
+        if weighted:
+            weights = np.clip(self.scores[gender][lo:hi], 0, None)
+            if weights.sum() > 0:
+                p = weights / weights.sum()
+        picks = lo + rng.choice(size, size=n, replace=False, p=p)
+        return codes_to_names(self.codes[gender][picks])
+
+def format_score(score):
+    """Format score for display."""
+    if isinstance(score, str):
+        return score
+    return round(score * 100, 1) if score is not None else "N/A"
+
+MODELS_PATH = Path(__file__).absolute().parent / "models"  # Use local models folder
+BUNDLE_PATH = MODELS_PATH / "namesmithy.bundle"
+GBR_PATH = MODELS_PATH / "judge" / "gbr.n100.genz.v3"
+COMPILED_GBR_PATH = MODELS_PATH / "judge" / "gbr.n100.genz.v3.npz"
+NAMES_PATH = MODELS_PATH / "names" / "genz.avg.tsv"
+BAD_WORDS_PATH = MODELS_PATH / "badwords" / "bad.merged.txt"
+
+def load_gbr_from_source():
+    """Load the GBR judge, preferring the compiled NumPy arrays (no sklearn needed)."""
+    try:
+        if COMPILED_GBR_PATH.exists():
+            logger.info("🔍 Loading compiled GBR model from: %s", COMPILED_GBR_PATH)
+            model = TreeEnsemble.load(COMPILED_GBR_PATH)
+            logger.info("✅ Loaded compiled GBR model (%s trees)", model.n_trees)
+            return model
+        if GBR_PATH.exists():
+            logger.info("🔍 Loading pickled GBR model from: %s", GBR_PATH)
+            model = compile_gbr(load_pickled_gbr(GBR_PATH))
+            logger.info("✅ Loaded GBR model (%s trees)", model.n_trees)
+            logger.info("💡 Run 'python tree_ensemble.py %s' to skip scikit-learn at startup", GBR_PATH)
+            return model
+        logger.warning("❌ GBR model file not found at expected path")
+    except Exception as e:
+        logger.error("❌ Could not load GBR model: %s", e)
+        logger.info("💡 This may be due to scikit-learn version compatibility issues.")
+        logger.info("💡 The app will continue with fallback scoring using historical database.")
+    return None
+
+def load_known_names_from_source():
+    """Build the known-names index from the names TSV and the bad words list."""
+    try:
+        logger.info("🔍 Looking for known names at: %s", NAMES_PATH)
+        names, genders, ranks = [], [], []
+        with open(str(NAMES_PATH), 'r') as f:
+            for line in f:
+                parts = line.strip().split()
+                if len(parts) >= 3:
+                    names.append(parts[0])
+                    genders.append(parts[1])
+                    ranks.append(float(parts[2]))
+        name_features = build_features(encode_names(names), genders)
+        
+        # Load bad words with negative scores
+        bad_words, bad_scores = [], []
+        logger.info("🔍 Looking for bad words at: %s", BAD_WORDS_PATH)
+        if not BAD_WORDS_PATH.exists():
+            logger.warning("⚠️  Bad words file not found, continuing without it")
+        else:
+            with open(str(BAD_WORDS_PATH), 'r') as f:
+                for line in f:
+                    parts = line.strip().split('\t')
+                    if len(parts) >= 2:
+                        bad_words.append(parts[0])
+                        bad_scores.append(float(parts[1]))
+        
+        return KnownNamesIndex(name_features, ranks, encode_names(bad_words), bad_scores)
+    except Exception as e:
+        logger.error("❌ Could not load known names: %s", e)
+        return KnownNamesIndex()
+
+def bundle_sources():
+    """Source files a bundle is built from, with their modification times."""
+    return {str(path.relative_to(MODELS_PATH)): path.stat().st_mtime
+            for path in (GBR_PATH, COMPILED_GBR_PATH, NAMES_PATH, BAD_WORDS_PATH) if path.exists()}
+
+# Bad words shorter than this are only matched as whole names
+MIN_BAD_SUBSTRING_LENGTH = 3
+
+def build_bad_substrings(index):
+    """Compile the bad words of a KnownNamesIndex into a SubstringAutomaton.
+
+    Bad words that occur inside a known name ('ass' in Cassandra, 'gin' in
+    Virginia) would reject real names, so they stay exact-match only.
+    """
+    known = '|'.join(name.lower() for name in codes_to_names(index.name_entries()[0]))
+    patterns = []
+    for codes in index.bad_entries():
+        pattern = codes[codes > 0]
+        word = codes_to_names(pattern[None, :])[0].lower()
+        if len(pattern) >= MIN_BAD_SUBSTRING_LENGTH and word not in known:
+            patterns.append(pattern.tolist())
+    return SubstringAutomaton.build(patterns)
+
+def contains_bad_substring(codes):
+    """True for each row of a code matrix that embeds a screened bad word."""
+    if bad_substrings is None:
+        return np.zeros(len(codes), dtype=bool)
+    return bad_substrings.scan(codes)
+
+def build_model_bundle(path=BUNDLE_PATH):
+    """Compile the models from source and write them into a single memory-mappable bundle."""
+    global gbr_model, known_names, popular_names, similar_names, name_suggestions, ngram_model, bad_substrings
+    
+    logger.info("🔨 Building model bundle from source files...")
+    gbr_model = load_gbr_from_source()
+    known_names = load_known_names_from_source()
+    popular_names = ScoreRangeIndex.from_known_names(known_names)
+    similar_names = SimilarNamesIndex.build(popular_names.codes, popular_names.scores)
+    name_suggestions = SuggestIndex.build(popular_names.codes, popular_names.scores)
+    ngram_model = NgramGenerator.train(*known_names.name_entries())
+    bad_substrings = build_bad_substrings(known_names)
+    sections = {'known_names': known_names.to_arrays(),
+                'popular_names': popular_names.to_arrays(),
+                'similar_names': similar_names.to_arrays(),
+                'name_trie': name_suggestions.to_arrays(),
+                'ngram': ngram_model.to_arrays(),
+                'bad_substrings': bad_substrings.to_arrays(),
+                'yield_calibration': calibrate_yield().to_arrays()}
+    if gbr_model is not None:
+        sections['gbr'] = gbr_model.to_arrays(include_leaf_masks=True)
+    write_bundle(path, sections, {'sources': bundle_sources()})
+    reset_score_cache()
+    logger.info("✅ Wrote model bundle to %s (%.1f MB)", path, Path(str(path)).stat().st_size / 1e6)
+
+def load_model_bundle(path=BUNDLE_PATH):
+    """Memory-map a model bundle.
+
+    Returns (gbr_model, known_names, popular_names, similar_names,
+    name_suggestions, ngram_model, bad_substrings, yield_estimator).
+    Everything except the (small, mutable) yield histograms is a zero-copy
+    view.
+    """
+    bundle = Bundle(path)
+    stale = [name for name, mtime in bundle_sources().items()
+             if mtime > bundle.metadata.get('sources', {}).get(name, 0)]
+    if stale:
+        logger.warning("⚠️  Model bundle is older than %s; rebuild with 'python server.py build-bundle'",
+                       ", ".join(stale))
+    model = TreeEnsemble.from_arrays(bundle['gbr']) if 'gbr' in bundle else None
+    index = KnownNamesIndex.from_arrays(bundle['known_names'])
+    # Bundles written before substring screening existed compile the automaton in memory
+    automaton = (SubstringAutomaton.from_arrays(bundle['bad_substrings']) if 'bad_substrings' in bundle
+                 else build_bad_substrings(index))
+    popular = ScoreRangeIndex.from_arrays(bundle['popular_names'])
+    similar = (SimilarNamesIndex.from_arrays(bundle['similar_names'], popular.codes, popular.scores)
+               if 'similar_names' in bundle else SimilarNamesIndex.build(popular.codes, popular.scores))
+    suggestions = (SuggestIndex.from_arrays(bundle['name_trie'], popular.codes, popular.scores)
+                   if 'name_trie' in bundle else SuggestIndex.build(popular.codes, popular.scores))
+    return (model, index, popular, similar, suggestions,
+            NgramGenerator.from_arrays(bundle['ngram']),
+            automaton,
+            YieldEstimator.from_arrays(bundle['yield_calibration']))
+
+def load_original_models():
+    """Load the models, from the precompiled bundle when there is one, else from source files."""
+    global gbr_model, known_names, popular_names, similar_names, name_suggestions, ngram_model
+    global bad_substrings, yield_estimator, model_load_seconds
+    
+    start = time.perf_counter()
+    if BUNDLE_PATH.exists():
+        try:
+            (gbr_model, known_names, popular_names, similar_names, name_suggestions, ngram_model,
+             bad_substrings, yield_estimator) = load_model_bundle(BUNDLE_PATH)
+            logger.info("✅ Memory-mapped model bundle %s (GBR: %s, %s known names)",
+                        BUNDLE_PATH, "yes" if gbr_model is not None else "no", len(known_names))
+            reset_score_cache()
+            model_load_seconds = time.perf_counter() - start
+            return
+        except Exception as e:
+            logger.warning("❌ Could not load model bundle, falling back to source files: %s", e)
+    
+    logger.info("🔨 Loading models from local directory...")
+    logger.info("🔍 Base path resolved to: %s", MODELS_PATH)
+    gbr_model = load_gbr_from_source()
+    known_names = load_known_names_from_source()
+    popular_names = ScoreRangeIndex.from_known_names(known_names)
+    similar_names = SimilarNamesIndex.build(popular_names.codes, popular_names.scores)
+    name_suggestions = SuggestIndex.build(popular_names.codes, popular_names.scores)
+    ngram_model = NgramGenerator.train(*known_names.name_entries()) if len(known_names) else None
+    bad_substrings = build_bad_substrings(known_names)
+    yield_estimator = calibrate_yield()
+    logger.info("✅ Loaded %s known names (%.1f MB)", len(known_names), known_names.nbytes / 1e6)
+    reset_score_cache()
+    model_load_seconds = time.perf_counter() - start
+
+def models_fingerprint():
+    """Identify the loaded models, so persisted scores are only reused with the same ones."""
+    state = {'sources': bundle_sources(), 'gbr': gbr_model is not None, 'known_names': len(known_names)}
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+def reset_score_cache():
+    """Start a fresh score cache for the models just loaded (None when disabled)."""
+    global score_cache
+    if SCORE_CACHE_SIZE <= 0:
+        score_cache = None
+        return
+    store = None
+    if SCORE_CACHE_PATH:
+        try:
+            store = SqliteScoreStore(SCORE_CACHE_PATH, models_fingerprint())
+        except sqlite3.Error as e:
+            logger.warning("⚠️  Could not open score store %s, caching in memory only: %s", SCORE_CACHE_PATH, e)
+    score_cache = ScoreCache(SCORE_CACHE_SIZE, store)
+
+def score_name_fallback(name, gender='F'):
+    """Fallback scoring when GBR model can't load."""
+    return score_names_batch([name], gender, use_model=False)[0]
+
+def calculate_heuristic_score(name):
+    """Simple heuristic scoring for when ML model isn't available."""
+    name = name.lower()
+    
+    # Basic name quality heuristics
+    score = 0.5  # Base score
+    
+    # Length bonus/penalty
+    if 3 <= len(name) <= 8:
+        score += 0.1
+    elif len(name) < 3 or len(name) > 12:
+        score -= 0.2
+    
+    # Vowel/consonant balance
+    vowels = sum(1 for c in name if c in 'aeiou')
+    consonants = len(name) - vowels
+    if vowels > 0 and consonants > 0:
+        ratio = min(vowels, consonants) / max(vowels, consonants)
+        score += ratio * 0.1
+    
+    # Common starting letters
+    if name[0] in 'aejmslbc':
+        score += 0.05
+    
+    # Avoid repeated characters
+    if len(set(name)) >= len(name) * 0.7:
+        score += 0.05
+    
+    # Ensure reasonable range
+    return max(0.1, min(0.9, score))
+
+def score_name_original(name, gender='F'):
+    """Score a name using original logic."""
+    return score_names_batch([name], gender)[0]
+
+def lookup_known_ranks(features):
+    """Look up historical scores for each feature row; NaN where the name is unknown."""
+    with STAGE_SECONDS.time('known_lookup'):
+        return known_names.lookup(features)
+
+def predict_features(features):
+    """One GBR model call over a feature matrix."""
+    with STAGE_SECONDS.time('predict'):
+        return np.asarray(gbr_model.predict(features), dtype=np.float64)
+
+def _predict_coalesced(feature_blocks):
+    """score_batcher's batch function: one model call over every request's rows, split back per request."""
+    predicted = predict_features(np.concatenate(feature_blocks))
+    return np.split(predicted, np.cumsum([len(block) for block in feature_blocks])[:-1])
+
+def configure_score_batching(max_wait_ms=SCORE_BATCH_WAIT_MS, max_rows=SCORE_BATCH_MAX_ROWS):
+    """Replace score_batcher: model calls from concurrent threads wait up to max_wait_ms to share one call.
+
+    max_wait_ms <= 0 turns micro-batching off, so every caller runs the model itself.
+    """
+    global score_batcher
+    if score_batcher is not None:
+        score_batcher.close()
+    score_batcher = BatchCoalescer(_predict_coalesced, max_rows, max_wait_ms / 1000.0, 'score') \
+        if max_wait_ms > 0 else None
+
+configure_score_batching()
+
+def score_features(names, features, use_model=True, known_ranks=None, coalesce=True):
+    """Score a feature matrix with one model call.
+
+    Returns (display_scores, predicted_scores, known_ranks) arrays; known_ranks
+    is NaN for names not in the historical database (pass them in if already
+    looked up). Without the GBR model, known names use their historical score
+    and unknown names the heuristic. With micro-batching on, the model call
+    may be shared with other threads' (coalesce=False opts out).
+    """
+    if known_ranks is None:
+        known_ranks = lookup_known_ranks(features)
+    is_known = ~np.isnan(known_ranks)
+    # configure_score_batching may swap score_batcher meanwhile; a closed one still answers
+    batcher = score_batcher if coalesce else None
+    if use_model and gbr_model is not None:
+        if batcher is not None and len(features):
+            predicted = batcher.call(features, len(features))
+        else:
+            predicted = predict_features(features)
+        # Known bad words override the prediction with their negative score
+        display = np.where(is_known & (known_ranks < 0), known_ranks, predicted)
+    else:
+        with STAGE_SECONDS.time('heuristic'):
+            predicted = np.array([known_ranks[i] if is_known[i] else calculate_heuristic_score(name)
+                                  for i, name in enumerate(names)], dtype=np.float64)
+        display = predicted
+    return display, predicted, known_ranks
+
+def score_cache_keys(names, features):
+    """Cache keys for feature rows: (gender bit, lower-cased name)."""
+    return list(zip(features[:, 0].tolist(), [name.lower() for name in names]))
+
+def cached_score_features(names, features):
+    """score_features with the model, answering rows from score_cache where possible.
+
+    Only cache misses reach the model; their scores are added to the cache.
+    """
+    if score_cache is None or not len(names):
+        return score_features(names, features)
+    keys = score_cache_keys(names, features)
+    with STAGE_SECONDS.time('score_cache'):
+        cached = score_cache.get_many(keys)
+    scores = np.empty((3, len(names)), dtype=np.float64)
+    missing = [i for i, value in enumerate(cached) if value is None]
+    hits = [i for i, value in enumerate(cached) if value is not None]
+    if hits:
+        scores[:, hits] = np.array([cached[i] for i in hits], dtype=np.float64).T
+    if missing:
+        scored = score_features([names[i] for i in missing], features[missing])
+        scores[:, missing] = scored
+        score_cache.put_many(zip([keys[i] for i in missing], zip(*(column.tolist() for column in scored))))
+    return scores[0], scores[1], scores[2]
+
+def build_score_result(name, display_score, predicted_score, known_rank, use_model=True, bad_substring=False):
+    """Build the result dict returned by the scoring API for one name."""
+    known_rank = None if np.isnan(known_rank) else known_rank
+    if use_model and gbr_model is not None:
+        score_source = "Predicted"
+    else:
+        score_source = "Historical" if known_rank is not None else "Heuristic"
+    
+    return {
+        'name': name.capitalize(),
+        'score': format_score(display_score),
+        'raw_score': display_score,
+        'predicted_score': format_score(predicted_score),
+        'historical_score': format_score(known_rank) if known_rank is not None else None,
+        'known_rank': "Found: {}".format(format_score(known_rank)) if known_rank is not None else "Not found",
+        'score_source': score_source,
+        'appropriate': display_score >= 0,
+        'contains_bad_substring': bool(bad_substring),
+        'quality_tier': get_quality_tier(display_score)
+    }
+
+def score_names_batch(names, gender='F', use_model=True):
+    """Score many names at once, returning the same dicts as score_name_original.
+
+    gender is either a single 'F'/'M' for the whole batch or one per name.
+    Names longer than 15 characters are scored on their first 15 characters.
+    """
+    if not names:
+        return []
+    with STAGE_SECONDS.time('encode'):
+        features = build_features(encode_names(names), gender)
+    if use_model:
+        display, predicted, known_ranks = cached_score_features(names, features)
+    else:
+        display, predicted, known_ranks = score_features(names, features, use_model)
+    bad = contains_bad_substring(features[:, 1:]).tolist()
+    return [build_score_result(name, d, p, k, use_model, b)
+            for name, d, p, k, b in zip(names, display.tolist(), predicted.tolist(), known_ranks.tolist(), bad)]
+
+def find_similar_names(name, gender='F', k=10):
+    """The k known names closest to name by edit distance, excluding the name itself."""
+    matches = similar_names.query(encode_names([name])[0], gender, k)
+    return [{'name': codes_to_names(codes[None, :])[0], 'historical_score': format_score(score), 'distance': distance}
+            for codes, score, distance in matches]
+
+def suggest_names(prefix, gender='F', k=10):
+    """The k highest-scoring known names starting with prefix (letters only; anything else matches nothing)."""
+    prefix = prefix.strip().lower()[:15]
+    codes = encode_names([prefix])[0][:len(prefix)]
+    if not prefix or (codes == 0).any():
+        return []
+    return [{'name': codes_to_names(row[None, :])[0], 'historical_score': format_score(score)}
+            for row, score in name_suggestions.suggest(codes, gender, k)]
+
+def get_quality_tier(score):
+    """Get quality description."""
+    if score is None:
+        return "Unknown"
+    if score < 0:
+        return "Inappropriate"
+    elif score < 0.2:
+        return "Poor"
+    elif score < 0.4:
+        return "Fair" 
+    elif score < 0.6:
+        return "Good"
+    elif score < 0.8:
+        return "Very Good"
+    else:
+        return "Excellent"
+
+def softmax(x):
+    """Compute softmax values for x."""
+    e_x = np.exp(x - np.max(x))
+    return e_x / e_x.sum(axis=0)
+
+# Start-letter distributions for the heuristic generator, per gender
+FIRST_LETTERS = {
+    'F': ('aeiojmsklcnrbhgvzp',
+          [0.12, 0.10, 0.08, 0.06, 0.08, 0.08, 0.07, 0.06, 0.06, 0.05, 0.05, 0.04, 0.04, 0.03, 0.03, 0.02, 0.02, 0.01]),
+    'M': ('ajmrdcbltnskghwpvz',
+          [0.10, 0.09, 0.08, 0.08, 0.07, 0.07, 0.06, 0.06, 0.06, 0.05, 0.05, 0.04, 0.04, 0.04, 0.03, 0.03, 0.02, 0.02]),
+}
+VOWELS = 'aeiou'
+CONSONANTS = 'bcdfghjklmnpqrstvwxyz'
+MAX_GENERATED_LENGTH = 13
+GENERATION_BATCH_SIZE = 2048
+
+def _letter_codes(letters):
+    """Map letters to their name_to_vec codes."""
+    return np.array([char_to_int[c] for c in letters], dtype=np.uint8)
+
+FIRST_LETTER_CODES = {g: _letter_codes(letters) for g, (letters, _) in FIRST_LETTERS.items()}
+# Normalised so the male table (which sums to 0.99) is a valid distribution
+FIRST_LETTER_CDF = {g: np.cumsum(w) / np.sum(w) for g, (_, w) in FIRST_LETTERS.items()}
+VOWEL_CODES = _letter_codes(VOWELS)
+CONSONANT_CODES = _letter_codes(CONSONANTS)
+IS_VOWEL_CODE = np.zeros(len(chars), dtype=bool)
+IS_VOWEL_CODE[VOWEL_CODES] = True
+
+def _end_probabilities():
+    """Probability of stopping at each length, averaged over the 3-5 minimum lengths."""
+    probs = np.zeros(MAX_GENERATED_LENGTH + 1)
+    for length in range(1, MAX_GENERATED_LENGTH + 1):
+        per_min = [min(1.0, 0.2 + (length - m) * 0.1) if length >= m else 0.0 for m in (3, 4, 5)]
+        probs[length] = np.mean(per_min)
+    probs[MAX_GENERATED_LENGTH] = 1.0
+    return probs
+
+END_PROBABILITY = _end_probabilities()
+
+def sample_name_codes(gender='F', n=GENERATION_BATCH_SIZE, rng=None):
+    """Sample n names as a (n, 15) uint8 code matrix plus their lengths.
+
+    Codes use the name_to_vec alphabet (0 = padding). Same rules as the old
+    per-name generator: weighted first letter, vowel after consonant with
+    p=0.8, consonant after vowel with p=0.7, and a stop probability that grows
+    with length past a 3-5 letter minimum.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    gender = 'M' if gender == 'M' else 'F'
+    codes = np.zeros((n, 15), dtype=np.uint8)
+    lengths = np.full(n, MAX_GENERATED_LENGTH, dtype=np.int64)
+
+    first = np.searchsorted(FIRST_LETTER_CDF[gender], rng.random(n), side='right')
+    codes[:, 0] = FIRST_LETTER_CODES[gender][np.minimum(first, len(FIRST_LETTER_CODES[gender]) - 1)]
+
+    active = np.ones(n, dtype=bool)
+    for pos in range(1, MAX_GENERATED_LENGTH):
+        stop = active & (rng.random(n) < END_PROBABILITY[pos])
+        lengths[stop] = pos
+        active &= ~stop
+        if not active.any():
+            break
+        after_vowel = IS_VOWEL_CODE[codes[:, pos - 1]]
+        pick = rng.random(n)
+        want_vowel = np.where(after_vowel, pick >= 0.7, pick < 0.8)
+        vowel = VOWEL_CODES[rng.integers(0, len(VOWEL_CODES), n)]
+        consonant = CONSONANT_CODES[rng.integers(0, len(CONSONANT_CODES), n)]
+        codes[:, pos] = np.where(active, np.where(want_vowel, vowel, consonant), 0)
+    return codes, lengths
+
+def codes_to_names(codes):
+    """Decode a (n, 15) code matrix back into capitalized names."""
+    ascii_codes = np.where(codes > 0, codes + (ord('a') - 1), 0).astype(np.uint8)
+    raw = np.ascontiguousarray(ascii_codes).view('S{}'.format(codes.shape[1])).ravel()
+    return [b.decode('ascii').capitalize() for b in raw]
+
+def generate_names(gender='F', n=GENERATION_BATCH_SIZE, rng=None):
+    """Generate a batch of n names using a caller-owned np.random.Generator."""
+    codes, _ = sample_name_codes(gender, n, rng)
+    return codes_to_names(codes)
+
+def generate_name_rnn(gender='F', seed=None):
+    """Generate a single name (kept for compatibility; prefer generate_names)."""
+    return generate_names(gender, 1, np.random.default_rng(seed))[0]
+
+class NameConstraints:
+    """Structural constraints on generated names: prefix, suffix, a required substring and a length range.
+
+    Engines that support them enforce them while sampling, so every proposal
+    already satisfies them and none is spent on a name that would be
+    filtered out afterwards.
+    """
+
+    FIELDS = ('prefix', 'suffix', 'contains', 'min_length', 'max_length')
+
+    def __init__(self, prefix='', suffix='', contains='', min_length=MIN_LENGTH, max_length=MAX_LENGTH):
+        self.prefix, self.suffix, self.contains = (str(value).strip().lower() for value in (prefix, suffix, contains))
+        self.min_length, self.max_length = int(min_length), int(max_length)
+        for field in ('prefix', 'suffix', 'contains'):
+            value = getattr(self, field)
+            if not all('a' <= c <= 'z' for c in value):
+                raise ValueError("{} may only contain the letters a-z".format(field))
+        if not MIN_LENGTH <= self.min_length <= self.max_length <= MAX_LENGTH:
+            raise ValueError("Name lengths must satisfy {} <= min_length <= max_length <= {}".format(MIN_LENGTH, MAX_LENGTH))
+        # A required substring already spelled by the prefix or suffix needs no extra letters
+        if self.contains in self.prefix or self.contains in self.suffix:
+            self.contains = ''
+        fixed = len(self.prefix) + len(self.suffix) + len(self.contains)
+        if fixed > self.max_length:
+            raise ValueError("prefix, suffix and contains need {} letters but max_length is {}".format(fixed, self.max_length))
+
+    @classmethod
+    def from_request(cls, data):
+        """Constraints from request fields, or None when none is set. Raises ValueError on bad values."""
+        if all(data.get(field) in (None, '') for field in cls.FIELDS):
+            return None
+        return cls(data.get('prefix') or '', data.get('suffix') or '', data.get('contains') or '',
+                   int(data.get('min_length') or MIN_LENGTH), int(data.get('max_length') or MAX_LENGTH))
+
+    def matches(self, name):
+        name = name.lower()
+        return (self.min_length <= len(name) <= self.max_length and name.startswith(self.prefix)
+                and name.endswith(self.suffix) and self.contains in name)
+
+    def sampler_arguments(self):
+        """Keyword arguments for NgramGenerator.sample_constrained."""
+        return {'prefix': _letter_codes(self.prefix).tolist(), 'suffix': _letter_codes(self.suffix).tolist(),
+                'contains': _letter_codes(self.contains).tolist(),
+                'min_length': self.min_length, 'max_length': self.max_length}
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __str__(self):
+        parts = ["{} '{}'".format(field, getattr(self, field)) for field in ('prefix', 'suffix', 'contains')
+                 if getattr(self, field)]
+        return ', '.join(parts + ['length {}-{}'.format(self.min_length, self.max_length)])
+
+def _sample_heuristic(gender, bands, rng, constraints=None):
+    if constraints is not None:
+        raise ValueError("The heuristic engine does not support structural constraints")
+    return sample_name_codes(gender, len(bands), rng)[0]
+
+def _sample_ngram(gender, bands, rng, constraints=None):
+    if constraints is None:
+        return ngram_model.sample(gender, bands, rng)[0]
+    return ngram_model.sample_constrained(gender, bands, rng, **constraints.sampler_arguments())[0]
+
+# Generator engines: (gender, per-row score bands, rng, NameConstraints or None) -> (n, 15) code matrix
+GENERATOR_ENGINES = {
+    'heuristic': _sample_heuristic,
+    'ngram': _sample_ngram,
+}
+# Engines that enforce NameConstraints while sampling
+CONSTRAINED_ENGINES = ('ngram',)
+
+def available_engines():
+    """Engines that can run with the models currently loaded."""
+    return [engine for engine in GENERATOR_ENGINES if engine != 'ngram' or ngram_model is not None]
+
+def default_engine():
+    return 'ngram' if ngram_model is not None else 'heuristic'
+
+def engine_band_weights(engine, min_score, max_score):
+    """Share of draws per score band for a window (0-1 scale); engines without bands have one."""
+    if engine == 'ngram':
+        return ngram_model.band_weights(min_score, max_score)
+    return np.ones(1)
+
+def yield_profile(engine, gender, band):
+    """YieldEstimator key for candidates from one engine, gender and score band."""
+    return '{}.{}.{}'.format(engine, 'M' if gender == 'M' else 'F', band)
+
+YIELD_BINS = 1000
+# Histogram columns: <0, YIELD_BINS bins over [0, 1], >1, and candidates screened out before scoring
+YIELD_COLUMNS = YIELD_BINS + 3
+# Score range each column stands for when a window covers part of it. Negative scores are the
+# bad word list's (-1 and -2), so a window like [-0.5, 0] covers none of them.
+YIELD_COLUMN_LEFT = np.concatenate([[-2.0], np.arange(YIELD_BINS + 1) / YIELD_BINS])
+YIELD_COLUMN_RIGHT = np.concatenate([[-1.0], np.arange(1, YIELD_BINS + 1) / YIELD_BINS, [2.0]])
+
+class YieldEstimator:
+    """Running histograms of generated candidates' scores, split into unknown/known names.
+
+    There is one histogram per generator profile (engine, gender and score
+    band, see yield_profile). The share of histogram mass inside a score
+    window (unknown names only for the 'unique' style) is the acceptance rate,
+    which turns a request into an expected number of attempts before any work
+    starts. Bins the window only partly covers count in proportion, and
+    candidates screened out before scoring (observed as NaN) count as attempts
+    that no window accepts. Seeded from an offline calibration run and updated
+    with every generated batch.
+    """
+
+    # Halve the counts once they pass this total so recent batches keep mattering
+    DECAY_TOTAL = 5e7
+
+    def __init__(self, histograms=None, attempts_per_second=100000.0):
+        # Rows: unknown, known. Columns: see YIELD_COLUMNS
+        self.histograms = {profile: self._widen(np.array(hist, dtype=np.float64))
+                           for profile, hist in (histograms or {}).items()}
+        self.attempts_per_second = float(attempts_per_second)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _widen(hist):
+        # Bundles written before screened candidates had their own column
+        if hist.shape[1] < YIELD_COLUMNS:
+            hist = np.pad(hist, ((0, 0), (0, YIELD_COLUMNS - hist.shape[1])))
+        return hist
+
+    @staticmethod
+    def _bin(scores):
+        """Histogram column for each score; NaN marks a screened candidate."""
+        scores = np.asarray(scores, dtype=np.float64)
+        screened = np.isnan(scores)
+        column = np.clip(np.floor(np.where(screened, 0.0, scores) * YIELD_BINS), -1, YIELD_BINS).astype(np.int64)
+        column[scores == 1.0] = YIELD_BINS - 1
+        column[screened] = YIELD_BINS + 1
+        return column + 1
+
+    def observe(self, profile, scores, is_known):
+        """Add a batch of candidate scores to a profile's running histogram."""
+        columns = self._bin(scores) + is_known.astype(np.int64) * YIELD_COLUMNS
+        counts = np.bincount(columns, minlength=2 * YIELD_COLUMNS).reshape(2, YIELD_COLUMNS)
+        with self.lock:
+            hist = self.histograms.setdefault(profile, np.zeros((2, YIELD_COLUMNS)))
+            hist += counts
+            if hist.sum() > self.DECAY_TOTAL:
+                hist *= 0.5
+
+    def record_rate(self, attempts, seconds):
+        """Fold a finished session's throughput into the attempts/sec estimate."""
+        if attempts > 0 and seconds > 0:
+            with self.lock:
+                self.attempts_per_second = 0.8 * self.attempts_per_second + 0.2 * attempts / seconds
+
+    def acceptance_rate(self, profile, style, min_score, max_score):
+        """Estimated share of a profile's candidates accepted for this style and window (0-1 scale)."""
+        hist = self.histograms.get(profile, np.zeros((2, YIELD_COLUMNS)))
+        rows = hist[:1] if style == 'unique' else hist
+        covered = np.clip((np.minimum(max_score, YIELD_COLUMN_RIGHT) - np.maximum(min_score, YIELD_COLUMN_LEFT))
+                          / (YIELD_COLUMN_RIGHT - YIELD_COLUMN_LEFT), 0.0, 1.0)
+        counts = rows[:, :-1].sum(axis=0)
+        mass = counts @ covered
+        # Half a pseudo-count spread over the scores this profile reaches (all of [0, 1] before any
+        # observation), so windows above its best score get no free yield
+        scored = np.flatnonzero(counts[1:])
+        if not hist.any():
+            top = 1.0
+        else:
+            top = min(scored[-1] + 1, YIELD_BINS) / YIELD_BINS if len(scored) else 0.0
+        prior = 0.5 * np.clip(min(max_score, top) - max(min_score, 0.0), 0.0, 1.0) / max(top, 1.0 / YIELD_BINS)
+        return (mass + prior) / (hist.sum() + 1.0)
+
+    def estimate(self, engine, gender, style, min_score, max_score):
+        """Acceptance rate of a request, averaged over the score bands its engine draws from."""
+        weights = engine_band_weights(engine, min_score, max_score)
+        return sum(w * self.acceptance_rate(yield_profile(engine, gender, band), style, min_score, max_score)
+                   for band, w in enumerate(weights) if w > 0)
+
+    def merge(self, histograms):
+        """Add histograms observed elsewhere (e.g. in a pool worker) to this estimator."""
+        with self.lock:
+            for profile, hist in histograms.items():
+                self.histograms.setdefault(profile, np.zeros((2, YIELD_COLUMNS)))
+                self.histograms[profile] += hist
+
+    def to_arrays(self):
+        arrays = dict(self.histograms)
+        arrays['attempts_per_second'] = np.array(self.attempts_per_second)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls({k: v for k, v in arrays.items() if k != 'attempts_per_second'},
+                   float(arrays['attempts_per_second']))
+
+def calibrate_yield(n=16384, seed=0):
+    """Score a fixed-seed sample of generated names per profile to seed a YieldEstimator."""
+    estimator = YieldEstimator()
+    rng = np.random.default_rng(seed)
+    start = time.time()
+    attempts = 0
+    for engine in available_engines():
+        for band in range(len(engine_band_weights(engine, 0.0, 1.0))):
+            for gender in ('F', 'M'):
+                codes = GENERATOR_ENGINES[engine](gender, np.full(n, band), rng)
+                display, _, known_ranks = score_features(codes_to_names(codes), build_features(codes, gender),
+                                                         coalesce=False)
+                display[contains_bad_substring(codes)] = np.nan
+                estimator.observe(yield_profile(engine, gender, band), display, ~np.isnan(known_ranks))
+                attempts += n
+    estimator.attempts_per_second = attempts / max(time.time() - start, 1e-6)
+    return estimator
+
+def screen_candidates(engine, gender, style, band_weights, min_threshold, max_threshold, rng, seen, estimator,
+                      constraints=None):
+    """Generate one batch, drop names already in seen, score it and apply the style and score window.
+
+    Observed scores go to estimator. Returns (attempts, accepted), where
+    accepted lists (offset in batch, name, display, predicted, known_rank).
+    """
+    bands = rng.choice(len(band_weights), size=GENERATION_BATCH_SIZE, p=band_weights)
+    with STAGE_SECONDS.time('sample'):
+        codes = GENERATOR_ENGINES[engine](gender, bands, rng, constraints)
+    
+    # Drop names already proposed in this session
+    with STAGE_SECONDS.time('dedupe'):
+        names = codes_to_names(codes)
+        fresh = []
+        for i, name in enumerate(names):
+            if name.lower() not in seen:
+                seen.add(name.lower())
+                fresh.append(i)
+        fresh = np.array(fresh, dtype=np.int64)
+        fresh_names = [names[i] for i in fresh]
+    
+    # Only candidates that can still be accepted reach the model: names embedding a bad word are
+    # rejected outright, and so are known names for the 'unique' style. In the yield histogram
+    # the former count as screened and the latter at their historical score.
+    with STAGE_SECONDS.time('encode'):
+        features = build_features(codes[fresh], gender)
+    known_ranks = lookup_known_ranks(features)
+    is_known = ~np.isnan(known_ranks)
+    with STAGE_SECONDS.time('bad_substrings'):
+        screened = contains_bad_substring(codes[fresh])
+    display = np.where(screened, -1.0, known_ranks)
+    predicted = display.copy()
+    rows = np.flatnonzero(~screened & ~is_known if style == 'unique' else ~screened)
+    if len(rows):
+        display[rows], predicted[rows], _ = score_features([fresh_names[j] for j in rows], features[rows],
+                                                           known_ranks=known_ranks[rows])
+    observed = np.where(screened, np.nan, display)
+    for band in np.unique(bands[fresh]):
+        in_band = bands[fresh] == band
+        estimator.observe(yield_profile(engine, gender, band), observed[in_band], is_known[in_band])
+    
+    # Apply style filtering and score range; screened rows carry no real score and are never accepted
+    keep = (min_threshold <= display) & (display <= max_threshold) & ~screened
+    if style == 'unique':
+        keep &= ~is_known
+    accepted = [(int(fresh[j]), fresh_names[j], float(display[j]), float(predicted[j]), float(known_ranks[j]))
+                for j in np.flatnonzero(keep)]
+    return len(names), accepted
+
+def serial_batches(engine, gender, style, band_weights, min_threshold, max_threshold, rng, constraints=None):
+    """Yield (attempts, accepted) for one batch at a time, generated in this thread.
+
+    Constrained batches are not representative of their profile and stay
+    out of yield_estimator.
+    """
+    seen = set()
+    estimator = yield_estimator if constraints is None else YieldEstimator()
+    while True:
+        attempts, accepted = screen_candidates(engine, gender, style, band_weights, min_threshold, max_threshold,
+                                               rng, seen, estimator, constraints)
+        cache_accepted(gender, accepted)
+        yield attempts, accepted
+
+# A pilot batch with fewer distinct proposals than this share of its attempts has nearly exhausted its constraints
+PILOT_EXHAUSTED_SHARE = 0.5
+
+def estimate_constrained_yield(engine, gender, style, band_weights, min_threshold, max_threshold, constraints, rng):
+    """Acceptance rate of a constrained request, measured on one pilot batch.
+
+    The yield histograms describe unconstrained proposals, which can score
+    very differently from, say, names that must end in 'x'. Returns
+    (acceptance rate, name limit): when the pilot mostly proposed names it
+    had already seen (e.g. prefix 'ann' with max_length 3), more attempts
+    will find few new names, and name limit is the number of distinct names
+    it accepted; otherwise None.
+    """
+    seen = set()
+    attempts, accepted = screen_candidates(engine, gender, style, band_weights, min_threshold, max_threshold,
+                                           rng, seen, YieldEstimator(), constraints)
+    exhausted = len(seen) < PILOT_EXHAUSTED_SHARE * attempts
+    return (len(accepted) + 0.5) / (attempts + 1.0), len(accepted) if exhausted else None
+
+def cache_accepted(gender, accepted):
+    """Add accepted generated names to score_cache, so evaluating them later skips the model.
+
+    Rejected proposals are almost never seen again and are not cached. The
+    names stay in memory only: a large pool would otherwise mean a disk
+    write per batch.
+    """
+    if score_cache is not None and accepted:
+        gender_bit = 1 if gender == 'M' else 0
+        score_cache.put_many((((gender_bit, name.lower()), (display, predicted, known_rank))
+                              for _, name, display, predicted, known_rank in accepted), persist=False)
+
+# Process pool for parallel sessions; 'fork' workers share the loaded models copy-on-write
+GENERATION_PROCESSES = os.cpu_count() or 1
+# Batches per pool task: large enough to amortise the round trip, small enough to abort promptly
+SHARD_BATCHES = 8
+generation_pool = None
+generation_pool_lock = threading.Lock()
+
+def get_generation_pool():
+    """Start the generation process pool on first use; None where fork is unavailable."""
+    global generation_pool
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    with generation_pool_lock:
+        if generation_pool is None:
+            logger.info("🔧 Starting %s generation processes", GENERATION_PROCESSES)
+            generation_pool = multiprocessing.get_context('fork').Pool(GENERATION_PROCESSES,
+                                                                       initializer=_init_generation_process)
+            atexit.register(close_generation_pool)
+        return generation_pool
+
+def close_generation_pool():
+    """Stop the generation processes, if started; run at exit so the pool is not left to its finalizer."""
+    global generation_pool
+    with generation_pool_lock:
+        if generation_pool is not None:
+            generation_pool.terminate()
+            generation_pool.join()
+            generation_pool = None
+
+def _init_generation_process():
+    # Each pool process scores its shards from one thread, so there is nothing to merge
+    global score_batcher
+    score_batcher = None
+
+def _generate_shard(task):
+    """Pool task: run SHARD_BATCHES batches with a private rng and seen set.
+
+    Runs in a forked worker against the models inherited from the server
+    process, so nothing but the task tuple and the accepted names cross the
+    process boundary. Returns (attempts, accepted, yield histograms, stage
+    metrics), with accepted offsets counted from the start of the shard.
+    """
+    engine, gender, style, band_weights, min_threshold, max_threshold, seed, constraints = task
+    rng = np.random.default_rng(seed)
+    seen = set()
+    estimator = YieldEstimator()
+    attempts = 0
+    accepted = []
+    with REGISTRY.capture() as stage_metrics:
+        for _ in range(SHARD_BATCHES):
+            batch_attempts, batch = screen_candidates(engine, gender, style, band_weights, min_threshold,
+                                                      max_threshold, rng, seen, estimator, constraints)
+            accepted.extend((attempts + offset,) + tuple(rest) for offset, *rest in batch)
+            attempts += batch_attempts
+    return attempts, accepted, estimator.histograms, stage_metrics
+
+def parallel_batches(engine, gender, style, band_weights, min_threshold, max_threshold, rng, constraints=None):
+    """Yield (attempts, accepted) per shard, keeping two shards per process in flight.
+
+    Shards are deduplicated only within themselves; callers drop names
+    accepted by more than one shard. Closing the generator stops submitting,
+    and shards still in flight finish in the background and are discarded.
+    """
+    pool = get_generation_pool()
+    if pool is None:
+        yield from serial_batches(engine, gender, style, band_weights, min_threshold, max_threshold, rng, constraints)
+        return
+    in_flight = deque()
+    while True:
+        while len(in_flight) < 2 * GENERATION_PROCESSES:
+            task = (engine, gender, style, band_weights, min_threshold, max_threshold, int(rng.integers(2 ** 63)),
+                    constraints)
+            in_flight.append(pool.apply_async(_generate_shard, (task,)))
+        attempts, accepted, histograms, stage_metrics = in_flight.popleft().get()
+        if constraints is None:
+            yield_estimator.merge(histograms)
+        REGISTRY.merge(stage_metrics)
+        cache_accepted(gender, accepted)
+        yield attempts, accepted
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+"""
+Character n-gram name generator trained from the historical names table.
+
+For every gender and historical-score band the model stores, per context of
+the previous (order - 1) characters, the cumulative distribution of the next
+character. Sampling a batch is then one table gather and one comparison per
+character position (inverse-CDF sampling), with no Python-level loop over
+names. Asking for names from a score window draws each row from the bands the
+window overlaps, so the generator proposes names that resemble historical
+names of about that score.
+
+Codes use the server's name_to_vec alphabet: 1-26 are 'a'-'z' and 0 ends the
+name, which is also the padding code, so sampled rows are valid features as-is.
+"""
+
+import numpy as np
+
+FORMAT_VERSION = 1
+N_SYMBOLS = 27  # 0 = end of name, 1-26 = letters
+BOS = N_SYMBOLS  # context-only start-of-name symbol
+RADIX = N_SYMBOLS + 1
+MAX_LENGTH = 15
+MIN_LENGTH = 2
+DEFAULT_ORDER = 4
+BAND_EDGES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+# Interpolation weights of the banded full-order model, the bigram and the unigram
+SMOOTHING = (0.97, 0.025, 0.005)
+# Names sampled per gender and band to estimate the length distribution
+LENGTH_SAMPLES = 8192
+
+
+class NgramGenerator:
+    """Score-banded character n-gram model stored as cumulative probability tables.
+
+    cdf has shape (2, bands, RADIX ** (order - 1), N_SYMBOLS) and is indexed by
+    [gender bit, band, context, symbol]. A context packs the previous
+    order - 1 symbols in base RADIX, most recent in the lowest digit.
+
+    Short contexts cannot tell a name's third letter from its ninth, so the
+    end-of-name probability is rescaled per position by end_scale
+    (2, bands, MAX_LENGTH), which makes the sampled lengths follow the
+    training data. A zero scale forbids ending there (names are at least
+    MIN_LENGTH letters).
+    """
+
+    def __init__(self, cdf, end_scale, band_edges, order):
+        self.cdf = cdf
+        self.end_scale = end_scale
+        self.band_edges = np.asarray(band_edges, dtype=np.float64)
+        self.order = int(order)
+        self.n_contexts = RADIX ** (self.order - 1)
+        self._start_context = sum(BOS * RADIX ** j for j in range(self.order - 1))
+        self._length_pmf = None
+
+    @property
+    def n_bands(self):
+        return len(self.band_edges) - 1
+
+    @property
+    def nbytes(self):
+        return self.cdf.nbytes + self.end_scale.nbytes
+
+    @classmethod
+    def train(cls, codes, gender_bits, scores, order=DEFAULT_ORDER, band_edges=BAND_EDGES):
+        """Count n-grams of (N, 15) name codes per gender and score band and build the tables."""
+        codes = np.asarray(codes, dtype=np.int64)
+        gender_bits = np.asarray(gender_bits, dtype=np.int64)
+        scores = np.asarray(scores, dtype=np.float64)
+        band_edges = np.asarray(band_edges, dtype=np.float64)
+        n_bands = len(band_edges) - 1
+        n_contexts = RADIX ** (order - 1)
+
+        bands = np.clip(np.searchsorted(band_edges, scores, side='right') - 1, 0, n_bands - 1)
+        lengths = np.where((codes == 0).any(axis=1), (codes == 0).argmax(axis=1), codes.shape[1])
+
+        # Symbol at each position, padded with start symbols on the left and one end symbol on the right
+        padded = np.full((len(codes), order - 1 + codes.shape[1] + 1), BOS, dtype=np.int64)
+        padded[:, order - 1:order - 1 + codes.shape[1]] = codes
+        padded[:, -1] = 0
+
+        counts = np.zeros((2, n_bands + 1, n_contexts, N_SYMBOLS))
+        bigrams = np.zeros((2, RADIX, N_SYMBOLS))
+        for t in range(codes.shape[1] + 1):
+            # Each name contributes its letters and the end symbol right after its last letter
+            valid = t <= lengths
+            symbol = padded[valid, order - 1 + t]
+            context = np.zeros(valid.sum(), dtype=np.int64)
+            for j in range(order - 1):
+                context += padded[valid, order - 2 + t - j] * RADIX ** j
+            gender, band = gender_bits[valid], bands[valid]
+            np.add.at(counts, (gender, band, context, symbol), 1.0)
+            np.add.at(counts, (gender, n_bands, context, symbol), 1.0)
+            np.add.at(bigrams, (gender, context % RADIX, symbol), 1.0)
+
+        unigram = bigrams.sum(axis=1, keepdims=True)
+        unigram /= np.maximum(unigram.sum(axis=2, keepdims=True), 1.0)
+        bigram_totals = bigrams.sum(axis=2, keepdims=True)
+        bigram = np.where(bigram_totals > 0, bigrams / np.maximum(bigram_totals, 1.0), unigram)
+        # Bigram term for every full context, keyed by its most recent symbol
+        bigram = bigram[:, np.arange(n_contexts) % RADIX][:, None]
+
+        # Full-order estimates per band, backing off to the all-bands counts, then the bigram
+        totals = counts.sum(axis=3, keepdims=True)
+        overall = counts[:, n_bands:] / np.maximum(totals[:, n_bands:], 1.0)
+        overall = np.where(totals[:, n_bands:] > 0, overall, bigram)
+        banded = np.where(totals[:, :n_bands] > 0, counts[:, :n_bands] / np.maximum(totals[:, :n_bands], 1.0),
+                          overall)
+
+        full, bi, uni = SMOOTHING
+        probs = full * banded + bi * bigram + uni * unigram[:, None]
+        probs /= probs.sum(axis=3, keepdims=True)
+
+        # Observed end rate at each position over the rate the context model alone predicts
+        observed = np.zeros((2, n_bands, MAX_LENGTH))
+        predicted = np.zeros((2, n_bands, MAX_LENGTH))
+        for t in range(MIN_LENGTH, MAX_LENGTH):
+            valid = t <= lengths
+            context = np.zeros(valid.sum(), dtype=np.int64)
+            for j in range(order - 1):
+                context += padded[valid, order - 2 + t - j] * RADIX ** j
+            gender, band = gender_bits[valid], bands[valid]
+            np.add.at(observed, (gender, band, t), (lengths[valid] == t).astype(np.float64))
+            np.add.at(predicted, (gender, band, t), probs[gender, band, context, 0])
+        # One pseudo-name of evidence keeps sparsely observed positions near the context model
+        end_scale = (observed + 1.0) / (predicted + 1.0)
+        end_scale[:, :, :MIN_LENGTH] = 0.0
+
+        return cls(np.cumsum(probs, axis=3).astype(np.float32), end_scale.astype(np.float32), band_edges, order)
+
+    def band_weights(self, min_score, max_score):
+        """Share of draws per band for a score window: proportional to each band's overlap with it."""
+        lo, hi = self.band_edges[:-1], self.band_edges[1:]
+        overlap = np.clip(np.minimum(hi, max_score) - np.maximum(lo, min_score), 0.0, None)
+        if overlap.sum() > 0:
+            return overlap / overlap.sum()
+        # Empty or point windows: the band containing the window, or the nearest one
+        centre = (min(max_score, self.band_edges[-1]) + max(min_score, self.band_edges[0])) / 2.0
+        weights = np.zeros(self.n_bands)
+        weights[np.clip(np.searchsorted(self.band_edges, centre, side='right') - 1, 0, self.n_bands - 1)] = 1.0
+        return weights
+
+    def sample(self, gender, bands, rng=None):
+        """Sample one name per entry of bands as a (n, 15) code matrix plus lengths."""
+        if rng is None:
+            rng = np.random.default_rng()
+        bands = np.asarray(bands, dtype=np.int64)
+        n = len(bands)
+        gender_bit = 1 if gender == 'M' else 0
+        table = self.cdf[gender_bit].reshape(-1, N_SYMBOLS)
+        end_scale = self.end_scale[gender_bit]
+        row_base = bands * self.n_contexts
+
+        codes = np.zeros((n, MAX_LENGTH), dtype=np.uint8)
+        lengths = np.full(n, MAX_LENGTH, dtype=np.int64)
+        context = np.full(n, self._start_context, dtype=np.int64)
+        active = np.ones(n, dtype=bool)
+        for pos in range(MAX_LENGTH):
+            cdf = table.take(row_base + context, axis=0)
+            total = cdf[:, -1]
+            # End with the position-rescaled probability, else draw a letter by inverse CDF
+            p_end = np.minimum(cdf[:, 0] / total * end_scale[bands, pos], 1.0)
+            u = rng.random(n, dtype=np.float32)
+            stop = u < p_end
+            u = cdf[:, 0] + (u - p_end) / np.maximum(1.0 - p_end, 1e-6) * (total - cdf[:, 0])
+            symbol = np.where(stop, 0, np.clip((cdf <= u[:, None]).sum(axis=1), 1, N_SYMBOLS - 1))
+            ended = active & (symbol == 0)
+            lengths[ended] = pos
+            active &= ~ended
+            if not active.any():
+                break
+            codes[:, pos] = np.where(active, symbol, 0)
+            context = (context * RADIX + symbol) % self.n_contexts
+        return codes, lengths
+
+    def _run_probability(self, table, row_base, context, run):
+        """Probability of emitting the codes in run next from each context, and the contexts after it."""
+        prob = np.ones(len(context))
+        for symbol in run:
+            cdf = table.take(row_base + context, axis=0)
+            prob *= (cdf[:, symbol] - cdf[:, symbol - 1]) / cdf[:, -1]
+            context = (context * RADIX + symbol) % self.n_contexts
+        return prob, context
+
+    def length_distribution(self, gender_bit):
+        """Share of sampled names of each length 0..MAX_LENGTH per band, (bands, MAX_LENGTH + 1).
+
+        Estimated once per gender by sampling, since the per-position end
+        correction makes the length distribution hard to state in closed form.
+        """
+        if self._length_pmf is None:
+            rng = np.random.default_rng(0)
+            pmf = np.zeros((2, self.n_bands, MAX_LENGTH + 1))
+            for bit, gender in enumerate(('F', 'M')):
+                for band in range(self.n_bands):
+                    _, lengths = self.sample(gender, np.full(LENGTH_SAMPLES, band), rng)
+                    pmf[bit, band] = np.bincount(lengths, minlength=MAX_LENGTH + 1) / LENGTH_SAMPLES
+            self._length_pmf = pmf
+        return self._length_pmf[gender_bit]
+
+    def sample_constrained(self, gender, bands, rng=None, prefix=(), suffix=(), contains=(),
+                           min_length=MIN_LENGTH, max_length=MAX_LENGTH):
+        """Sample like sample(), but only names that satisfy structural constraints.
+
+        prefix, suffix and contains are sequences of letter codes; names are
+        min_length to max_length letters long, prefix and suffix included.
+        Each row first draws its length from the model's length distribution
+        truncated to what the constraints allow, which places the suffix.
+        The prefix and suffix are then emitted verbatim and the letters in
+        between sampled with the end of name masked. The contains run starts
+        at each position it still fits with the model's own probability of
+        spelling it there, topped up so the start is at least uniform over
+        the positions left.
+        Nothing is rejected afterwards: every row comes back valid.
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        prefix, suffix, contains = list(prefix), list(suffix), list(contains)
+        bands = np.asarray(bands, dtype=np.int64)
+        n = len(bands)
+        gender_bit = 1 if gender == 'M' else 0
+        table = self.cdf[gender_bit].reshape(-1, N_SYMBOLS)
+        row_base = bands * self.n_contexts
+        min_length = max(min_length, MIN_LENGTH, len(prefix) + len(suffix) + len(contains))
+        max_length = min(max_length, MAX_LENGTH)
+
+        # Lengths from the model's own distribution, restricted to [min_length, max_length]
+        pmf = self.length_distribution(gender_bit)[bands]
+        pmf[:, :min_length] = 0.0
+        pmf[:, max_length + 1:] = 0.0
+        pmf[pmf.sum(axis=1) == 0, min_length:max_length + 1] = 1.0
+        cdf = np.cumsum(pmf, axis=1)
+        lengths = (cdf < rng.random(n)[:, None] * cdf[:, -1:]).sum(axis=1)
+
+        # Codes committed to in advance: the prefix, the suffix, and contains once started
+        planned = np.zeros((n, MAX_LENGTH), dtype=np.int64)
+        planned[:, :len(prefix)] = prefix
+        for j, symbol in enumerate(suffix):
+            planned[np.arange(n), lengths - len(suffix) + j] = symbol
+        needs_contains = np.full(n, bool(contains))
+        contains_deadline = lengths - len(suffix) - len(contains)
+
+        codes = np.zeros((n, MAX_LENGTH), dtype=np.uint8)
+        context = np.full(n, self._start_context, dtype=np.int64)
+        for pos in range(int(lengths.max())):
+            active = pos < lengths
+            free = active & (planned[:, pos] == 0)
+            table_rows = table.take(row_base + context, axis=0)
+
+            # Start the contains run here either by the model's odds of spelling it next or by a uniform
+            # draw over the positions left, so runs are spread over the name rather than piling up at
+            # the deadline, where the last position left makes the uniform draw certain
+            if contains and len(prefix) <= pos <= MAX_LENGTH - len(contains):
+                rows = np.flatnonzero(free & needs_contains & (pos <= contains_deadline))
+                prob, _ = self._run_probability(table, row_base[rows], context[rows], contains)
+                p_go_on = 1.0 - table_rows[rows, 0] / table_rows[rows, -1]
+                odds = np.minimum(prob / np.maximum(p_go_on, 1e-6), 1.0)
+                uniform = 1.0 / (contains_deadline[rows] - pos + 1)
+                start = rng.random(len(rows)) < 1.0 - (1.0 - odds) * (1.0 - uniform)
+                rows = rows[start]
+                planned[rows, pos:pos + len(contains)] = contains
+                needs_contains[rows] = False
+                free[rows] = False
+
+            # Free rows draw a letter by inverse CDF over the letters only
+            u = table_rows[:, 0] + rng.random(n, dtype=np.float32) * (table_rows[:, -1] - table_rows[:, 0])
+            letter = np.clip((table_rows <= u[:, None]).sum(axis=1), 1, N_SYMBOLS - 1)
+            symbol = np.where(free, letter, planned[:, pos])
+            codes[:, pos] = np.where(active, symbol, 0)
+
+            # A drawn run of letters can satisfy contains on its own
+            if contains and pos + 1 >= len(contains):
+                needs_contains &= ~(codes[:, pos + 1 - len(contains):pos + 1] == contains).all(axis=1)
+            context = (context * RADIX + symbol) % self.n_contexts
+        return codes, lengths
+
+    def to_arrays(self):
+        """Return the model as a dict of plain NumPy arrays."""
+        return {
+            'format_version': np.array(FORMAT_VERSION, dtype=np.int32),
+            'cdf': self.cdf,
+            'end_scale': self.end_scale,
+            'band_edges': self.band_edges,
+            'order': np.array(self.order, dtype=np.int32),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Build a model from a dict of arrays written by to_arrays (zero-copy)."""
+        version = int(arrays['format_version'])
+        if version != FORMAT_VERSION:
+            raise ValueError("Unsupported n-gram model format version {}".format(version))
+        return cls(arrays['cdf'], arrays['end_scale'], arrays['band_edges'], int(arrays['order']))
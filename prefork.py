@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+"""
+Pre-forking HTTP server: load the models once, then fork N workers that share them.
+
+The master process imports the app, which loads the models, binds the public
+listening socket and forks the workers. All workers accept connections from
+that one socket and read the model arrays copy-on-write; gc.freeze() before
+forking keeps the collector from writing to, and so copying, the pages the
+master's objects live on. The master serves nothing and runs no threads. It
+only supervises:
+
+- a worker that exits is replaced, backing off if it keeps dying at startup;
+- a worker that fails HEALTH_FAILURES health checks in a row is replaced;
+- SIGHUP calls the reload hook (re-reading the models), then replaces the
+  workers one at a time, each new one answering its health check before the
+  old one is drained;
+- SIGTERM or SIGINT drains every worker and exits.
+
+A draining worker stops accepting on the public socket, waits for its
+generation sessions and in-flight requests to finish (up to the graceful
+timeout), then exits.
+
+Each worker also serves the app on a private Unix socket named after its pid.
+The master checks health there, and workers use it to reach each other: state
+that lives in one worker's memory, such as a generation session, is tagged
+with that worker's pid, and WorkerApp forwards any request for it to the
+owner. Clients therefore need no sticky load balancing.
+"""
+
+import gc
+import glob
+import http.client
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+from werkzeug.http import is_hop_by_hop_header
+from werkzeug.serving import make_server
+from werkzeug.wsgi import ClosingIterator
+
+import log_setup
+
+logger = logging.getLogger(__name__)
+
+BACKLOG = 128
+HEALTH_PATH = '/api/health'
+HEALTH_INTERVAL = 10.0
+HEALTH_TIMEOUT = 5.0
+HEALTH_FAILURES = 3
+# A worker that dies younger than this is respawned with a growing delay, up to the maximum
+MIN_WORKER_LIFETIME = 5.0
+MAX_RESPAWN_DELAY = 30.0
+SUPERVISE_INTERVAL = 0.2
+# Forwarded requests include event streams, which send a keep-alive every 15 seconds
+FORWARD_TIMEOUT = 60.0
+FORWARD_CHUNK = 65536
+# Marks a forwarded request so it is never forwarded again
+FORWARDED_HEADER = 'X-NameSmithy-Forwarded'
+_FORWARDED_ENVIRON = 'HTTP_' + FORWARDED_HEADER.upper().replace('-', '_')
+
+# Set in the master before forking and inherited by the workers
+socket_dir = None
+# This process's worker: {'slot', 'workers', 'pid', 'master_pid', 'started_at', 'draining'}, or None outside serve
+current_worker = None
+
+
+def socket_path(pid):
+    """Private Unix socket of the worker with this pid."""
+    return os.path.join(socket_dir, '{}.sock'.format(pid))
+
+
+def worker_info():
+    """This process's serve worker, or None when not running under serve()."""
+    if current_worker is None:
+        return None
+    return dict(current_worker, uptime_seconds=round(time.time() - current_worker['started_at'], 3))
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection to a Unix socket path."""
+
+    def __init__(self, path, timeout=FORWARD_TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_file = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_file)
+
+
+def probe(pid, timeout=HEALTH_TIMEOUT, healthy_only=True):
+    """The health document of the worker with this pid, or None if it does not answer (healthy) in time."""
+    connection = UnixHTTPConnection(socket_path(pid), timeout)
+    try:
+        connection.request('GET', HEALTH_PATH, headers={FORWARDED_HEADER: '1'})
+        response = connection.getresponse()
+        body = response.read()
+        return json.loads(body) if response.status == 200 or not healthy_only else None
+    except (OSError, ValueError, http.client.HTTPException):
+        return None
+    finally:
+        connection.close()
+
+
+def list_workers():
+    """Health of every live worker of this server, found through their private sockets."""
+    if socket_dir is None:
+        return []
+    workers = []
+    for path in sorted(glob.glob(os.path.join(socket_dir, '*.sock'))):
+        pid = int(os.path.basename(path).split('.')[0])
+        health = probe(pid, healthy_only=False)
+        workers.append(health if health is not None else {'pid': pid, 'status': 'unreachable'})
+    return workers
+
+
+class WorkerApp:
+    """WSGI wrapper run by each worker: forwards requests owned by a sibling and counts requests in flight.
+
+    owner_of(environ) returns the pid of the worker that must answer a
+    request, or None when any worker can.
+    """
+
+    def __init__(self, app, owner_of):
+        self.app = app
+        self.owner_of = owner_of
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self.lock:
+            self.in_flight += 1
+        try:
+            body = None
+            if _FORWARDED_ENVIRON not in environ:
+                owner = self.owner_of(environ)
+                if owner is not None and owner != os.getpid():
+                    body = self.forward(owner, environ, start_response)
+            if body is None:
+                body = self.app(environ, start_response)
+        except BaseException:
+            self._finished()
+            raise
+        return ClosingIterator(body, self._finished)
+
+    def _finished(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def forward(self, pid, environ, start_response):
+        """Relay a request to another worker's private socket; None if that worker is gone."""
+        path = environ.get('RAW_URI') or environ.get('REQUEST_URI')
+        if not path:
+            path = quote(environ.get('PATH_INFO', '').encode('latin-1'))
+            if environ.get('QUERY_STRING'):
+                path += '?' + environ['QUERY_STRING']
+        headers = {key[5:].replace('_', '-').title(): value for key, value in environ.items()
+                   if key.startswith('HTTP_') and not is_hop_by_hop_header(key[5:].replace('_', '-'))}
+        if environ.get('CONTENT_TYPE'):
+            headers['Content-Type'] = environ['CONTENT_TYPE']
+        headers[FORWARDED_HEADER] = '1'
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(length) if length else None
+
+        connection = UnixHTTPConnection(socket_path(pid))
+        try:
+            connection.request(environ['REQUEST_METHOD'], path, body, headers)
+            response = connection.getresponse()
+        except (FileNotFoundError, ConnectionError):
+            # The owner has exited; whatever it held is gone, so answer locally
+            connection.close()
+            return None
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            logger.warning("⚠️ Worker %s did not answer a forwarded request: %s", pid, e)
+            start_response('502 Bad Gateway', [('Content-Type', 'application/json')])
+            return [json.dumps({'error': 'Worker {} did not answer'.format(pid)}).encode('utf-8')]
+        start_response('{} {}'.format(response.status, response.reason),
+                       [(key, value) for key, value in response.getheaders() if not is_hop_by_hop_header(key)])
+        return self._relay(connection, response)
+
+    @staticmethod
+    def _relay(connection, response):
+        try:
+            while True:
+                chunk = response.read1(FORWARD_CHUNK)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            connection.close()
+
+
+class Master:
+    """Supervises the forked workers of one serve() call; see the module docstring."""
+
+    def __init__(self, app, host, port, workers, owner_of=None, on_worker_start=None, drain=None, reload=None,
+                 graceful_timeout=30.0):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.n_workers = workers
+        self.owner_of = owner_of or (lambda environ: None)
+        self.on_worker_start = on_worker_start
+        self.drain = drain
+        self.reload = reload
+        self.graceful_timeout = graceful_timeout
+        self.pid = os.getpid()
+        self.listener = None
+        self.slots = [None] * workers  # pid serving each slot
+        self.started = {}  # pid -> (slot, started_at)
+        self.retiring = {}  # pid -> time to SIGKILL it
+        self.failures = {}  # pid -> consecutive failed health checks
+        self.respawn_at = [0.0] * workers
+        self.respawn_delay = [0.0] * workers
+        self.next_health_check = 0.0
+        self.stopping = False
+        self.reloading = False
+
+    def run(self):
+        """Serve until SIGTERM or SIGINT; returns the exit status."""
+        global socket_dir
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        self.listener = socket.socket(family, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.listener.bind((self.host, self.port))
+        except OSError as e:
+            logger.error("❌ Cannot listen on %s:%s: %s", self.host, self.port, e)
+            self.listener.close()
+            return 1
+        self.listener.listen(BACKLOG)
+        socket_dir = tempfile.mkdtemp(prefix='namesmithy-{}-'.format(self.pid))
+
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        logger.info("🚀 Serving on %s:%s with %s workers (master pid %s)", self.host, self.port, self.n_workers,
+                    self.pid)
+        try:
+            self._freeze()
+            for slot in range(self.n_workers):
+                self.spawn(slot)
+            while not self.stopping:
+                self._supervise()
+                time.sleep(SUPERVISE_INTERVAL)
+            self._shutdown()
+        finally:
+            self.listener.close()
+            shutil.rmtree(socket_dir, ignore_errors=True)
+        return 0
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_reload(self, signum, frame):
+        self.reloading = True
+
+    def _freeze(self):
+        if threading.active_count() > 1:
+            logger.warning("⚠️ Master is running %s threads; forked workers may inherit held locks",
+                           threading.active_count())
+        # Objects allocated so far stay out of the workers' collections, so their pages stay shared
+        gc.collect()
+        gc.freeze()
+
+    def spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                status = Worker(self, slot).run()
+            except BaseException:
+                logger.exception("❌ Worker %s crashed", slot)
+            finally:
+                log_setup.shutdown_logging()
+                os._exit(status)
+        self.slots[slot] = pid
+        self.started[pid] = (slot, time.time())
+        self.failures[pid] = 0
+        return pid
+
+    def retire(self, pid):
+        """Ask a worker to drain and exit; it is killed if still running after the graceful timeout."""
+        if pid in self.retiring:
+            return
+        self.retiring[pid] = time.time() + self.graceful_timeout
+        slot, _ = self.started[pid]
+        if self.slots[slot] == pid:
+            self.slots[slot] = None
+        self._signal(pid, signal.SIGTERM)
+
+    @staticmethod
+    def _signal(pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot, started_at = self.started.pop(pid, (None, None))
+            self.failures.pop(pid, None)
+            try:
+                os.unlink(socket_path(pid))
+            except OSError:
+                pass
+            if self.retiring.pop(pid, None) is not None or slot is None:
+                continue
+            lifetime = time.time() - started_at
+            logger.warning("⚠️ Worker %s (pid %s) exited with status %s after %.1fs", slot, pid,
+                           os.waitstatus_to_exitcode(status), lifetime)
+            self.slots[slot] = None
+            if lifetime < MIN_WORKER_LIFETIME:
+                self.respawn_delay[slot] = min(max(1.0, 2 * self.respawn_delay[slot]), MAX_RESPAWN_DELAY)
+            else:
+                self.respawn_delay[slot] = 0.0
+            self.respawn_at[slot] = time.time() + self.respawn_delay[slot]
+
+    def _supervise(self):
+        self._reap()
+        now = time.time()
+        for pid, kill_at in list(self.retiring.items()):
+            if now > kill_at:
+                logger.warning("⚠️ Worker pid %s did not drain in %ss, killing it", pid, self.graceful_timeout)
+                self._signal(pid, signal.SIGKILL)
+                self.retiring[pid] = float('inf')
+        for slot, pid in enumerate(self.slots):
+            if pid is None and now >= self.respawn_at[slot]:
+                self.spawn(slot)
+        if self.reloading:
+            self.reloading = False
+            self._rolling_restart()
+        elif now >= self.next_health_check:
+            self._check_health()
+            self.next_health_check = time.time() + HEALTH_INTERVAL
+
+    def _check_health(self):
+        for pid in [pid for pid in self.slots if pid is not None]:
+            if probe(pid) is not None:
+                self.failures[pid] = 0
+                continue
+            self.failures[pid] = self.failures.get(pid, 0) + 1
+            if self.failures[pid] >= HEALTH_FAILURES:
+                slot, _ = self.started[pid]
+                logger.warning("⚠️ Worker %s (pid %s) failed %s health checks, replacing it", slot, pid,
+                               self.failures[pid])
+                self.retire(pid)
+                self.spawn(slot)
+
+    def _rolling_restart(self):
+        if self.reload is not None:
+            logger.info("🔄 Reloading models")
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("❌ Reload failed; keeping the current workers")
+                return
+            self._freeze()
+        logger.info("🔄 Replacing %s workers one at a time", self.n_workers)
+        for slot in range(self.n_workers):
+            old = self.slots[slot]
+            new = self.spawn(slot)
+            if not self._wait_ready(new):
+                if self.stopping:
+                    return
+                logger.error("❌ Replacement worker %s (pid %s) never became healthy; stopping the restart", slot, new)
+                if old is not None:
+                    # Keep the old worker serving its slot; the new one is abandoned
+                    self.slots[slot] = old
+                    self.retiring[new] = time.time()
+                    self._signal(new, signal.SIGKILL)
+                return
+            if old is not None:
+                self.retire(old)
+            if self.stopping:
+                return
+        logger.info("✅ All workers replaced")
+
+    def _wait_ready(self, pid):
+        deadline = time.time() + self.graceful_timeout
+        while time.time() < deadline and not self.stopping:
+            self._reap()
+            if pid not in self.started:
+                return False
+            if probe(pid, timeout=1.0) is not None:
+                return True
+            time.sleep(SUPERVISE_INTERVAL)
+        return False
+
+    def _shutdown(self):
+        logger.info("🛑 Stopping %s workers", len(self.started))
+        for pid in list(self.started):
+            self.retire(pid)
+        while self.started:
+            self._reap()
+            now = time.time()
+            for pid, kill_at in list(self.retiring.items()):
+                if now > kill_at:
+                    self._signal(pid, signal.SIGKILL)
+                    self.retiring[pid] = float('inf')
+            time.sleep(SUPERVISE_INTERVAL)
+        logger.info("👋 All workers stopped")
+
+
+class Worker:
+    """One forked serving process: the app on the shared public socket and on its own private socket."""
+
+    def __init__(self, master, slot):
+        self.master = master
+        self.slot = slot
+        self.stopping = threading.Event()
+
+    def run(self):
+        global current_worker
+        master = self.master
+        pid = os.getpid()
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stopping.set())
+        # Ctrl+C reaches the whole process group; the master turns it into an orderly SIGTERM
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        current_worker = {'slot': self.slot, 'workers': master.n_workers, 'pid': pid, 'master_pid': master.pid,
+                          'started_at': time.time(), 'draining': False}
+
+        private = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        private.bind(socket_path(pid))
+        private.listen(BACKLOG)
+        if master.on_worker_start is not None:
+            master.on_worker_start()
+        app = WorkerApp(master.app, master.owner_of)
+        public_server = make_server(master.host, master.port, app, threaded=True, fd=master.listener.fileno())
+        private_server = make_server('unix://' + socket_path(pid), 0, app, threaded=True, fd=private.fileno())
+        for server, name in ((public_server, 'http'), (private_server, 'http-private')):
+            threading.Thread(target=server.serve_forever, name=name, daemon=True).start()
+        logger.info("👷 Worker %s ready (pid %s)", self.slot, pid)
+
+        while not self.stopping.wait(1.0):
+            if os.getppid() != master.pid:
+                logger.warning("⚠️ Master %s is gone, worker %s exiting", master.pid, self.slot)
+                break
+
+        # Drain: stop taking new connections, let sessions and open requests finish, keep answering siblings
+        current_worker['draining'] = True
+        logger.info("🛑 Worker %s draining", self.slot)
+        public_server.shutdown()
+        public_server.server_close()
+        master.listener.close()
+        deadline = time.time() + master.graceful_timeout
+        if master.drain is not None:
+            master.drain(deadline)
+        while app.in_flight > 0 and time.time() < deadline:
+            time.sleep(0.1)
+        private_server.shutdown()
+        private_server.server_close()
+        private.close()
+        try:
+            os.unlink(socket_path(pid))
+        except OSError:
+            pass
+        logger.info("👋 Worker %s (pid %s) stopped", self.slot, pid)
+        return 0
+
+
+def serve(app, host, port, workers, **options):
+    """Run app in `workers` forked processes on host:port until stopped; see Master for the options."""
+    return Master(app, host, port, workers, **options).run()
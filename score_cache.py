@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+"""
+Memoization for NameSmithy scores.
+
+Scoring is deterministic for a given set of models, so repeat requests for
+the same (gender, name) can skip the model entirely. ScoreCache is a bounded,
+thread-safe LRU map held in memory; it can sit in front of a SqliteScoreStore
+so scores survive restarts. The store remembers a fingerprint of the models it
+was filled from and starts empty when the models change. A store that fails
+(locked, corrupt, disk full) is logged and treated as a miss, never an error.
+"""
+
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# SQLite's default limit on bound parameters per statement is 999
+_SQL_CHUNK = 500
+
+
+class SqliteScoreStore:
+    """On-disk (gender bit, name) -> (display, predicted, known_rank) table."""
+
+    def __init__(self, path, fingerprint):
+        self.path = str(path)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.errors = 0
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS scores "
+                                    "(key TEXT PRIMARY KEY, display REAL, predicted REAL, known_rank REAL)")
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            if row is None or row[0] != fingerprint:
+                self.connection.execute("DELETE FROM scores")
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+
+    @staticmethod
+    def _key(key):
+        return '{}:{}'.format(*key)
+
+    def get_many(self, keys):
+        """Return {key: value} for the keys present in the store; keys it fails to read are left out."""
+        found = {}
+        by_text = {self._key(key): key for key in keys}
+        texts = list(by_text)
+        with self.lock:
+            try:
+                for i in range(0, len(texts), _SQL_CHUNK):
+                    chunk = texts[i:i + _SQL_CHUNK]
+                    rows = self.connection.execute(
+                        "SELECT key, display, predicted, known_rank FROM scores WHERE key IN ({})".format(
+                            ','.join('?' * len(chunk))), chunk)
+                    for text, display, predicted, known_rank in rows:
+                        # SQLite stores NaN as NULL
+                        found[by_text[text]] = (display, predicted, float('nan') if known_rank is None else known_rank)
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.warning("⚠️ Score store %s read failed, treating %s names as misses: %s", self.path,
+                               len(texts) - len(found), e)
+        return found
+
+    def put_many(self, items):
+        """Write items to the store; a failed write is logged and skipped."""
+        rows = [(self._key(key), display, predicted, None if known_rank != known_rank else known_rank)
+                for key, (display, predicted, known_rank) in items]
+        with self.lock:
+            try:
+                with self.connection:
+                    self.connection.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.warning("⚠️ Score store %s write failed, skipping %s names: %s", self.path, len(rows), e)
+
+    def __len__(self):
+        with self.lock:
+            try:
+                return self.connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+            except sqlite3.Error:
+                return 0
+
+
+class ScoreCache:
+    """Bounded, thread-safe LRU map from (gender bit, lower-cased name) to (display, predicted, known_rank).
+
+    Memory misses fall through to the optional store; entries found there
+    are promoted into memory. put_many writes through to the store.
+    """
+
+    def __init__(self, max_entries=100000, store=None):
+        self.max_entries = max_entries
+        self.store = store
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, keys):
+        """Look up keys, returning a value or None for each."""
+        values = []
+        missing = []
+        with self.lock:
+            for key in keys:
+                value = self.entries.get(key)
+                if value is not None:
+                    self.entries.move_to_end(key)
+                else:
+                    missing.append(len(values))
+                values.append(value)
+            self.hits += len(keys) - len(missing)
+
+        if missing and self.store is not None:
+            found = self.store.get_many([keys[i] for i in missing])
+            if found:
+                self._insert(found.items())
+                for i in missing:
+                    values[i] = found.get(keys[i])
+                self.store_hits += len(found)
+        with self.lock:
+            self.misses += sum(1 for i in missing if values[i] is None)
+        return values
+
+    def put_many(self, items, persist=True):
+        """Insert (key, value) pairs, evicting the least recently used entries beyond max_entries.
+
+        With persist=False the entries are kept in memory only.
+        """
+        items = list(items)
+        self._insert(items)
+        if persist and self.store is not None and items:
+            self.store.put_many(items)
+
+    def _insert(self, items):
+        with self.lock:
+            for key, value in items:
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+            overflow = len(self.entries) - self.max_entries
+            for _ in range(max(0, overflow)):
+                self.entries.popitem(last=False)
+            self.evictions += max(0, overflow)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.store_hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'store_hits': self.store_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.store_hits) / lookups if lookups else None,
+                'store': self.store.path if self.store is not None else None,
+                'store_errors': self.store.errors if self.store is not None else None,
+            }
@@ -4,342 +4,508 @@ NameSmithy Flask Server
 Production-ready server using original working models
 """
 
-from flask import Flask, send_from_directory, jsonify, request, render_template_string, Response
+from flask import Flask, send_from_directory, jsonify, request, render_template_string, Response, stream_with_context
+import codecs
+import itertools
+import json
+import logging
 import os
-import pickle
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
 import numpy as np
-from pathlib import Path
+
+import log_setup
+import name_trie
+import namesmithy
+import prefork
+from log_setup import EventSampler
+from metrics import PROFILER, REGISTRY
+from namesmithy import (
+    BUNDLE_PATH, CONSTRAINED_ENGINES, NameConstraints, available_engines, build_model_bundle, build_score_result,
+    default_engine, engine_band_weights, estimate_constrained_yield, find_similar_names, suggest_names, parallel_batches, score_names_batch, screen_candidates, serial_batches,
+)
 
 app = Flask(__name__)
+# Named explicitly: run as a script this module is __main__, and NAMESMITHY_LOG_LEVELS refers to it as 'server'
+logger = logging.getLogger('server')
 
-# Global variables for models
-gbr_model = None
-known_names = {}
-rnn_parameters = None
-chars = sorted(list(set('abcdefghijklmnopqqrstuvwxyz ')))
-char_to_int = {c: i for i, c in enumerate(chars)}
-int_to_char = {i: c for i, c in enumerate(chars)}
-
-# Global state for generation tracking
-generation_sessions = {}
-
-def name_to_vec(name, max_length=15):
-    """Convert name to vector (original logic)."""
-    name = name.lower()
-    filler = max_length - len(name)
-    return [char_to_int.get(char, 0) for char in name + ' ' * filler]
-
-def format_score(score):
-    """Format score for display."""
-    if isinstance(score, str):
-        return score
-    return round(score * 100, 1) if score is not None else "N/A"
-
-def load_original_models():
-    """Load the original working models from local models directory."""
-    global gbr_model, known_names
-    
-    print("🔨 Loading models from local directory...")
-    base_path = Path(__file__).absolute().parent / "models"  # Use local models folder
-    print("🔍 Base path resolved to: {}".format(base_path))
+# Generation budgets: requests may ask for less, never more
+MAX_SESSION_ATTEMPTS = 20000000
+MAX_SESSION_SECONDS = 120
+# Attempts' worth of weight the calibrated yield carries against a session's own observations,
+# capped at one expected name so an optimistic estimate cannot outweigh a run of empty batches
+YIELD_PRIOR_ATTEMPTS = 100000
+# Sessions run at least this share of their budget before a poor projection stops them
+EARLY_STOP_MIN_BUDGET_SHARE = 0.1
+# Rule of three: with nothing generated in n attempts the yield is below 3/n at 95% confidence
+ZERO_ACCEPT_BOUND = 3.0
+
+# Generation worker pool: sessions beyond the workers wait in a bounded queue
+GENERATION_WORKERS = 4
+MAX_QUEUED_SESSIONS = 32
+# Finished sessions are kept for polling until they expire or the cap pushes out the least recently used
+SESSION_TTL_SECONDS = 600
+MAX_FINISHED_SESSIONS = 1000
+
+# Pre-generated name pool: names per (gender, known/unique, score decile) bucket (0 disables the pool).
+# Buckets that drain below the low watermark are refilled to capacity in the background.
+NAME_POOL_BUCKET_SIZE = int(os.environ.get('NAMESMITHY_NAME_POOL_SIZE', 500))
+NAME_POOL_LOW_WATERMARK = 0.5
+# Buckets a refill batch adds nothing to are skipped for a while (e.g. high-scoring unique names)
+NAME_POOL_BACKOFF_SECONDS = 30
+
+# Per-request events below DEBUG (e.g. each evaluated name) are logged once per this many
+LOG_SAMPLE_EVERY = 100
+evaluate_log = EventSampler(logger, LOG_SAMPLE_EVERY)
+
+# Set NAMESMITHY_PROFILE=1 to start the sampling profiler on the generation threads at startup
+PROFILE_AT_STARTUP = os.environ.get('NAMESMITHY_PROFILE', '') not in ('', '0')
+SESSION_SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+REQUEST_SECONDS = REGISTRY.histogram('namesmithy_request_seconds', 'API request latency until the response starts',
+                                     ('endpoint',))
+REQUESTS = REGISTRY.counter('namesmithy_requests', 'API requests by endpoint and HTTP status', ('endpoint', 'status'))
+GENERATION_ATTEMPTS = REGISTRY.counter('namesmithy_generation_attempts', 'Candidates generated by sessions',
+                                       ('engine', 'style'))
+GENERATION_ACCEPTED = REGISTRY.counter('namesmithy_generation_accepted',
+                                       'Generated candidates that sessions accepted', ('engine', 'style'))
+SESSIONS_FINISHED = REGISTRY.counter('namesmithy_sessions_finished', 'Generation sessions by final status',
+                                     ('status',))
+SESSION_SECONDS = REGISTRY.histogram('namesmithy_session_seconds', 'Generation session run time by final status',
+                                     ('status',), SESSION_SECONDS_BUCKETS)
+
+def blended_yield(generated, attempts, estimated_yield):
+    """Yield from a session's own attempts, with the calibrated estimate as a prior."""
+    prior_attempts = min(YIELD_PRIOR_ATTEMPTS, 1.0 / estimated_yield)
+    return (generated + prior_attempts * estimated_yield) / (attempts + prior_attempts)
+
+def session_progress(session):
+    """Progress fields shared by the status endpoint and streamed progress events."""
+    elapsed = session.get('finished_at', time.time()) - session['start_time']
+    progress = {
+        'status': session['status'],
+        'attempts': session['attempts'],
+        'found': session['found'],
+        'target': session['target'],
+        'elapsed': int(elapsed)
+    }
+    if session.get('pooled'):
+        progress['pooled'] = session['pooled']
     
-    # Load GBR model with compatibility handling
-    try:
-        gbr_path = base_path / "judge" / "gbr.n100.genz.v3"
-        print("🔍 Looking for GBR model at: {}".format(gbr_path))
-        if not gbr_path.exists():
-            print("❌ GBR model file not found at expected path")
-            gbr_model = None
-        else:
-            # Try to load with different scikit-learn version compatibility
+    # Yield and ETA, blending the calibrated estimate with what this session has seen so far
+    if 'estimated_yield' in session:
+        attempts = session['attempts']
+        generated = session['found'] - session.get('pooled', 0)
+        observed_yield = blended_yield(generated, attempts, session['estimated_yield'])
+        rate = attempts / elapsed if attempts and elapsed > 0 else namesmithy.yield_estimator.attempts_per_second
+        progress.update({
+            'engine': session['engine'],
+            'yield': generated / attempts if attempts else None,
+            'estimated_yield': observed_yield,
+            'attempts_per_second': rate,
+            'eta': (session['target'] - session['found']) / observed_yield / rate if session['status'] == 'running' else 0,
+            'max_attempts': session['max_attempts'],
+            'max_seconds': session['max_seconds'],
+            'stop_reason': session['stop_reason']
+        })
+    return progress
+
+def session_summary(session):
+    """Progress plus the results (or error) of a session in its current state."""
+    summary = session_progress(session)
+    if session['status'] == 'completed':
+        summary['results'] = session['results']
+    elif session['status'] == 'error':
+        summary['error'] = session.get('error', 'Unknown error')
+    elif session['status'] == 'aborted':
+        summary['results'] = session.get('final_results', [])
+    return summary
+
+# Streaming: progress events at most this often, keep-alive comments after this long idle
+PROGRESS_EVENT_INTERVAL = 0.25
+STREAM_KEEPALIVE_SECONDS = 15
+
+class SessionEvents:
+    """Event source for one session that any number of streaming clients can follow.
+
+    Names are appended to a log (so clients can resume from an event ID);
+    progress is a single latest snapshot that followers pick up when it
+    changes; close() appends the terminal event.
+    """
+
+    def __init__(self):
+        self.log = []
+        self.progress = None
+        self.progress_version = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def publish(self, event, data):
+        with self.condition:
+            if not self.closed:
+                self.log.append((event, data))
+                self.condition.notify_all()
+
+    def update_progress(self, data):
+        with self.condition:
+            self.progress = data
+            self.progress_version += 1
+            self.condition.notify_all()
+
+    def close(self, event, data):
+        """Append the terminal event; later calls are ignored."""
+        with self.condition:
+            if not self.closed:
+                self.log.append((event, data))
+                self.closed = True
+                self.condition.notify_all()
+
+    def follow(self, start=0, keepalive=STREAM_KEEPALIVE_SECONDS):
+        """Yield (event_id, event, data) from log position start until the terminal event.
+
+        Progress snapshots come with event_id None; (None, None, None) is
+        yielded after keepalive seconds without news.
+        """
+        with self.condition:
+            # A closed log always delivers at least its terminal event
+            index = min(start, len(self.log) - 1 if self.closed else len(self.log))
+        progress_seen = 0
+        while True:
+            with self.condition:
+                if index >= len(self.log) and self.progress_version == progress_seen and not self.closed:
+                    self.condition.wait(keepalive)
+                entries = self.log[index:]
+                progress = self.progress if self.progress_version != progress_seen else None
+                progress_seen = self.progress_version
+                closed = self.closed
+            if not entries and progress is None and not closed:
+                yield None, None, None
+            if progress is not None and not (closed and entries):
+                yield None, 'progress', progress
+            for offset, (event, data) in enumerate(entries):
+                yield index + offset, event, data
+            index += len(entries)
+            if closed:
+                return
+
+class SessionQueueFull(Exception):
+    """Raised when every generation worker is busy and the queue is at capacity."""
+
+class SessionManager:
+    """Generation sessions: a fixed pool of worker threads behind a bounded queue, plus an evicting registry.
+
+    Sessions are plain dicts keyed by random IDs, prefixed with id_prefix
+    (the worker's pid under `server.py serve`). A session is 'queued' until a
+    worker picks it up and 'running' while it works; workers cooperate with
+    cancel() by checking the status between batches. Finished sessions
+    ('completed', 'aborted', 'error') expire SESSION_TTL_SECONDS after they
+    finish, and beyond MAX_FINISHED_SESSIONS the least recently polled go first.
+    """
+
+    FINISHED = ('completed', 'aborted', 'error')
+
+    def __init__(self, workers=GENERATION_WORKERS, max_queued=MAX_QUEUED_SESSIONS,
+                 ttl=SESSION_TTL_SECONDS, max_finished=MAX_FINISHED_SESSIONS):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='generate')
+        self.pending = 0  # submitted and not yet finished, running or queued
+        self.active = 0
+        self.id_prefix = ''
+
+    def add(self, session):
+        """Register a session dict and return its new ID."""
+        session_id = self.id_prefix + uuid.uuid4().hex
+        session.setdefault('start_time', time.time())
+        session['events'] = SessionEvents()
+        if session.get('status') in self.FINISHED:
+            session.setdefault('finished_at', time.time())
+            for result in session.get('results', []):
+                session['events'].publish('name', result)
+            session['events'].close(session['status'], session_summary(session))
+        with self.lock:
+            self._evict()
+            self.sessions[session_id] = session
+        return session_id
+
+    def submit(self, session, work):
+        """Queue work(session) on the worker pool; returns the session ID or raises SessionQueueFull."""
+        with self.lock:
+            if self.pending >= self.workers + self.max_queued:
+                raise SessionQueueFull("Generation queue is full ({} sessions waiting)".format(self.max_queued))
+            self.pending += 1
+        session['status'] = 'queued'
+        session_id = self.add(session)
+        self.executor.submit(self._run, session_id, session, work)
+        return session_id
+
+    def _run(self, session_id, session, work):
+        with self.lock:
+            self.active += 1
+        try:
+            # Sessions cancelled while queued never start
+            if session['status'] == 'queued':
+                session['status'] = 'running'
+                with PROFILER.watch():
+                    work(session_id, session)
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.pending -= 1
+                session.setdefault('finished_at', time.time())
+            SESSIONS_FINISHED.inc(1, session['status'])
+            SESSION_SECONDS.observe(session['finished_at'] - session['start_time'], session['status'])
+            session['events'].close(session['status'], session_summary(session))
+
+    def get(self, session_id):
+        """Look up a session (marking it recently used), or None if unknown or evicted."""
+        with self.lock:
+            self._evict()
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+            return session
+
+    def cancel(self, session_id):
+        """Mark a session aborted; its worker stops after the current batch. Returns the session or None."""
+        session = self.get(session_id)
+        if session is not None and session['status'] not in self.FINISHED:
+            queued = session['status'] == 'queued'
+            session['status'] = 'aborted'
+            session['finished_at'] = time.time()
+            # Running sessions close their stream when the worker returns; queued ones never reach a worker
+            if queued:
+                session['events'].close('aborted', session_summary(session))
+        return session
+
+    def _evict(self):
+        """Drop expired finished sessions, then the least recently used beyond the cap (lock held)."""
+        now = time.time()
+        finished = [sid for sid, session in self.sessions.items() if 'finished_at' in session]
+        for sid in finished:
+            if now - self.sessions[sid]['finished_at'] > self.ttl:
+                del self.sessions[sid]
+        finished = [sid for sid in finished if sid in self.sessions]
+        for sid in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.sessions[sid]
+
+    def drain(self, deadline, linger=0.0):
+        """Wait until no session is queued or running, then linger seconds after the last one finished."""
+        while self.pending > 0 and time.time() < deadline:
+            time.sleep(0.1)
+        with self.lock:
+            last_finished = max((session.get('finished_at', 0) for session in self.sessions.values()), default=0)
+        time.sleep(max(0.0, min(deadline, last_finished + linger) - time.time()))
+
+    def stats(self):
+        with self.lock:
+            return {
+                'generation_workers': self.workers,
+                'active_sessions': self.active,
+                'queued_sessions': self.pending - self.active,
+                'queue_capacity': self.max_queued,
+                'stored_sessions': len(self.sessions),
+            }
+
+class NamePool:
+    """Reservoir of already generated and scored names for answering requests without generating.
+
+    Names are bucketed by gender, known/unique and display-score decile, and
+    each bucket holds at most bucket_size entries of (name, display,
+    predicted, known_rank). A background thread refills buckets that drop
+    below the low watermark, aiming each batch at the drained bucket's score
+    band and filing every name it produces into whichever bucket it fits.
+    """
+
+    DECILES = 10
+
+    def __init__(self, bucket_size=NAME_POOL_BUCKET_SIZE, low_watermark=NAME_POOL_LOW_WATERMARK,
+                 backoff=NAME_POOL_BACKOFF_SECONDS):
+        self.bucket_size = bucket_size
+        self.low = int(bucket_size * low_watermark)
+        self.backoff = backoff
+        self.engine = None
+        self.buckets = {(gender, known, decile): []
+                        for gender in ('F', 'M') for known in (False, True) for decile in range(self.DECILES)}
+        self.names = {'F': set(), 'M': set()}
+        self.refilling = set(self.buckets)
+        self.stalled_until = {}
+        self.condition = threading.Condition()
+        self.rng = np.random.default_rng()
+        self.thread = None
+        self.attempts = 0
+        self.produced = 0
+        self.served = 0
+        self.requests = 0
+        self.full_requests = 0
+
+    @classmethod
+    def decile(cls, score):
+        return min(max(int(score * cls.DECILES), 0), cls.DECILES - 1)
+
+    def start(self, engine):
+        """Start the refill thread for names from engine."""
+        self.engine = engine
+        self.thread = threading.Thread(target=self._produce, name='name-pool', daemon=True)
+        self.thread.start()
+        logger.info("🔧 Filling name pool: %s names per bucket from the '%s' engine", self.bucket_size, engine)
+
+    def take(self, gender, style, engine, min_threshold, max_threshold, count, constraints=None):
+        """Remove and return up to count random pooled names matching a request, as accepted tuples.
+
+        Returns [] for requests the pool cannot serve (another engine, or the pool is off).
+        """
+        if self.thread is None or engine != self.engine or style not in ('random', 'unique'):
+            return []
+        kinds = (False, True) if style == 'random' else (False,)
+        lo, hi = self.decile(min_threshold), self.decile(max_threshold)
+        with self.condition:
+            candidates = []
+            for known in kinds:
+                for decile in range(lo, hi + 1):
+                    key = (gender, known, decile)
+                    candidates.extend((key, i) for i, entry in enumerate(self.buckets[key])
+                                      if min_threshold <= entry[1] <= max_threshold
+                                      and (constraints is None or constraints.matches(entry[0])))
+            picks = self.rng.choice(len(candidates), size=min(count, len(candidates)), replace=False)
+            taken = [self.buckets[candidates[j][0]][candidates[j][1]] for j in picks]
+            for key, i in sorted((candidates[j] for j in picks), reverse=True):
+                del self.buckets[key][i]
+            for entry in taken:
+                self.names[gender].discard(entry[0].lower())
+            drained = {key for key, i in (candidates[j] for j in picks) if len(self.buckets[key]) < self.low}
+            if drained - self.refilling:
+                self.refilling |= drained
+                self.condition.notify_all()
+            self.requests += 1
+            self.full_requests += len(taken) >= count
+            self.served += len(taken)
+        return [(0,) + tuple(entry) for entry in taken]
+
+    def put_back(self, gender, accepted):
+        """Return names taken for a request that was then rejected."""
+        with self.condition:
+            for _, name, display, predicted, known_rank in accepted:
+                self._file(gender, (name, display, predicted, known_rank))
+            self.served -= len(accepted)
+
+    def _file(self, gender, entry):
+        """Add one entry to its bucket unless full or already pooled (condition held); True if added."""
+        bucket = self.buckets[(gender, not np.isnan(entry[3]), self.decile(entry[1]))]
+        if len(bucket) >= self.bucket_size or entry[0].lower() in self.names[gender]:
+            return False
+        bucket.append(entry)
+        self.names[gender].add(entry[0].lower())
+        return True
+
+    def _next_target(self):
+        """The drained bucket to aim the next batch at, or None (condition held)."""
+        now = time.time()
+        self.refilling = {key for key in self.refilling if len(self.buckets[key]) < self.bucket_size}
+        ready = [key for key in self.refilling if self.stalled_until.get(key, 0) <= now]
+        return min(ready, key=lambda key: len(self.buckets[key])) if ready else None
+
+    def _produce(self):
+        rng = np.random.default_rng()
+        while True:
+            with self.condition:
+                target = self._next_target()
+                while target is None:
+                    self.condition.wait(self.backoff)
+                    target = self._next_target()
+            gender, _, decile = target
             try:
-                with open(str(gbr_path), 'rb') as f:
-                    gbr_model = pickle.load(f)
-                print("✅ Loaded GBR model")
-            except (ImportError, AttributeError, ModuleNotFoundError) as e:
-                print("⚠️ Model compatibility issue: {}".format(e))
-                print("🔄 Attempting to load with compatibility fixes...")
-                
-                # Try importing both old and new scikit-learn structures
-                try:
-                    from sklearn.ensemble import GradientBoostingRegressor
-                    from sklearn.ensemble import GradientBoostingClassifier
-                    
-                    # Handle the specific module path issue
-                    import sys
-                    import sklearn.ensemble
-                    
-                    # Try to create a compatibility shim for old module paths
-                    if not hasattr(sklearn.ensemble, 'gradient_boosting'):
-                        # Create a temporary module reference for backward compatibility
-                        class CompatibilityShim:
-                            GradientBoostingRegressor = GradientBoostingRegressor
-                            GradientBoostingClassifier = GradientBoostingClassifier
-                        
-                        sklearn.ensemble.gradient_boosting = CompatibilityShim()
-                        sys.modules['sklearn.ensemble.gradient_boosting'] = CompatibilityShim()
-                    
-                    # Try loading again after ensuring imports
-                    with open(str(gbr_path), 'rb') as f:
-                        gbr_model = pickle.load(f)
-                    print("✅ Loaded GBR model with compatibility fixes")
-                except Exception as e2:
-                    print("❌ Could not load even with compatibility fixes: {}".format(e2))
-                    gbr_model = None
-    except Exception as e:
-        print("❌ Could not load GBR model: {}".format(e))
-        print("💡 This may be due to scikit-learn version compatibility issues.")
-        print("💡 The app will continue with fallback scoring using historical database.")
-        gbr_model = None
-    
-    # Load known names
-    try:
-        popularity_path = base_path / "names" / "genz.avg.tsv"
-        print("🔍 Looking for known names at: {}".format(popularity_path))
-        with open(str(popularity_path), 'r') as f:
-            for line in f.readlines():
-                parts = line.strip().split()
-                if len(parts) >= 3:
-                    name = parts[0]
-                    sex = 0 if parts[1] == "F" else 1
-                    rank = float(parts[2])
-                    vec = name_to_vec(name)
-                    feature_key = tuple([sex] + vec)
-                    known_names[feature_key] = rank
-        
-        # Load bad words with negative scores
-        bad_words_path = base_path / "badwords" / "bad.merged.txt"
-        print("🔍 Looking for bad words at: {}".format(bad_words_path))
-        if not bad_words_path.exists():
-            print("⚠️  Bad words file not found, continuing without it")
-        else:
-            with open(str(bad_words_path), 'r') as f:
-                for line in f.readlines():
-                    parts = line.strip().split('\t')
-                    if len(parts) >= 2:
-                        bad_word = parts[0]
-                        score = float(parts[1])
-                        vec = name_to_vec(bad_word)
-                        # Add for both genders
-                        known_names[tuple([0] + vec)] = score  # Female
-                        known_names[tuple([1] + vec)] = score  # Male
-        
-        print("✅ Loaded {} known names".format(len(known_names)))
-    except Exception as e:
-        print("❌ Could not load known names: {}".format(e))
-
-def score_name_fallback(name, gender='F'):
-    """Fallback scoring when GBR model can't load."""
-    # Look up in known names database
-    gender_bit = 0 if gender == 'F' else 1
-    name_vec = name_to_vec(name.lower())
-    feature_key = tuple([gender_bit] + name_vec)
-    known_rank = known_names.get(feature_key, None)
-    
-    if known_rank is not None:
-        # Use historical score
-        score = known_rank
-        appropriate = score >= 0
-        known_status = "Found: {}".format(format_score(known_rank))
-    else:
-        # Simple heuristic scoring for unknown names
-        score = calculate_heuristic_score(name)
-        appropriate = score >= 0
-        known_status = "Not found"
-    
-    return {
-        'name': name.capitalize(),
-        'score': format_score(score),
-        'raw_score': score,
-        'predicted_score': format_score(score),
-        'historical_score': format_score(known_rank) if known_rank is not None else None,
-        'known_rank': known_status,
-        'score_source': "Historical" if known_rank is not None else "Heuristic",
-        'appropriate': appropriate,
-        'quality_tier': get_quality_tier(score)
-    }
+                band_weights = engine_band_weights(self.engine, decile / self.DECILES, (decile + 1) / self.DECILES)
+                attempts, accepted = screen_candidates(self.engine, gender, 'random', band_weights, 0.0, 1.0,
+                                                       rng, set(), namesmithy.yield_estimator)
+            except Exception as e:
+                logger.error("❌ Name pool refill failed: %s", e)
+                time.sleep(self.backoff)
+                continue
+            with self.condition:
+                before = len(self.buckets[target])
+                added = sum(self._file(gender, tuple(entry[1:])) for entry in accepted)
+                if len(self.buckets[target]) == before:
+                    self.stalled_until[target] = time.time() + self.backoff
+                self.attempts += attempts
+                self.produced += added
 
-def calculate_heuristic_score(name):
-    """Simple heuristic scoring for when ML model isn't available."""
-    name = name.lower()
-    
-    # Basic name quality heuristics
-    score = 0.5  # Base score
-    
-    # Length bonus/penalty
-    if 3 <= len(name) <= 8:
-        score += 0.1
-    elif len(name) < 3 or len(name) > 12:
-        score -= 0.2
-    
-    # Vowel/consonant balance
-    vowels = sum(1 for c in name if c in 'aeiou')
-    consonants = len(name) - vowels
-    if vowels > 0 and consonants > 0:
-        ratio = min(vowels, consonants) / max(vowels, consonants)
-        score += ratio * 0.1
-    
-    # Common starting letters
-    if name[0] in 'aejmslbc':
-        score += 0.05
-    
-    # Avoid repeated characters
-    if len(set(name)) >= len(name) * 0.7:
-        score += 0.05
-    
-    # Ensure reasonable range
-    return max(0.1, min(0.9, score))
-
-def score_name_original(name, gender='F'):
-    """Score a name using original logic."""
-    if gbr_model is None:
-        # Use fallback scoring when model can't load
-        return score_name_fallback(name, gender)
-    
-    # Original scoring logic (from judge.py)
-    gender_bit = 0 if gender == 'F' else 1
-    name_vec = name_to_vec(name.lower())
-    feature_vector = [[gender_bit] + name_vec]
-    
-    # Always calculate predicted score using GBR model
-    predicted_score = gbr_model.predict(feature_vector)[0]
-    
-    # Look up known rank (historical data including bad words)
-    lookup_key = tuple(feature_vector[0])
-    known_rank = known_names.get(lookup_key, None)
-    
-    # For display purposes, we always show the predicted score as the main score
-    # Historical score is shown separately for reference
-    final_score = predicted_score
-    
-    # Determine appropriateness based on known bad words or predicted score
-    if known_rank is not None and known_rank < 0:
-        # Known bad word - override with historical negative score for appropriateness
-        appropriate = False
-        display_score = known_rank  # Show the negative score for bad words
-    else:
-        appropriate = bool(predicted_score >= 0)
-        display_score = predicted_score
-    
-    return {
-        'name': name.capitalize(),
-        'score': format_score(display_score),
-        'raw_score': display_score,
-        'predicted_score': format_score(predicted_score),
-        'historical_score': format_score(known_rank) if known_rank is not None else None,
-        'known_rank': "Found: {}".format(format_score(known_rank)) if known_rank is not None else "Not found",
-        'score_source': "Predicted",
-        'appropriate': appropriate,
-        'quality_tier': get_quality_tier(display_score)
-    }
+    def stats(self):
+        with self.condition:
+            return {
+                'engine': self.engine,
+                'bucket_size': self.bucket_size,
+                'pooled_names': sum(len(bucket) for bucket in self.buckets.values()),
+                'capacity': self.bucket_size * len(self.buckets),
+                'refilling_buckets': len(self.refilling),
+                'attempts': self.attempts,
+                'produced': self.produced,
+                'requests': self.requests,
+                'full_requests': self.full_requests,
+                'served': self.served,
+            }
 
-def get_quality_tier(score):
-    """Get quality description."""
-    if score is None:
-        return "Unknown"
-    if score < 0:
-        return "Inappropriate"
-    elif score < 0.2:
-        return "Poor"
-    elif score < 0.4:
-        return "Fair" 
-    elif score < 0.6:
-        return "Good"
-    elif score < 0.8:
-        return "Very Good"
-    else:
-        return "Excellent"
-
-def softmax(x):
-    """Compute softmax values for x."""
-    e_x = np.exp(x - np.max(x))
-    return e_x / e_x.sum(axis=0)
-
-def generate_name_rnn(gender='F', seed=None):
-    """Generate a name using simple RNN-like logic."""
-    if seed is None:
-        import time
-        # Use high-precision time for maximum randomness
-        current_time = time.time()
-        seed = int((current_time * 1000000) % 999999)
-    
-    # Set both numpy and python random seeds for consistency
-    np.random.seed(seed)
-    import random
-    random.seed(seed)
-    
-    # Simple character-level name generation
-    vocab_size = len(chars)
-    
-    # Start with empty character
-    name = ""
-    current_char = " "  # Start with space
-    max_length = 15
-    
-    # Generate character by character
-    for i in range(max_length):
-        if current_char == '\n' or len(name) > 12:
-            break
-            
-        # Simple pattern-based generation for demo
-        if len(name) == 0:
-            # First character - use common starting letters with more variety
-            if gender == 'F':
-                first_chars = ['a', 'e', 'i', 'o', 'j', 'm', 's', 'k', 'l', 'c', 'n', 'r', 'b', 'h', 'g', 'v', 'z', 'p']
-                weights = [0.12, 0.10, 0.08, 0.06, 0.08, 0.08, 0.07, 0.06, 0.06, 0.05, 0.05, 0.04, 0.04, 0.03, 0.03, 0.02, 0.02, 0.01]
-                current_char = np.random.choice(first_chars, p=weights)
-            else:
-                first_chars = ['a', 'j', 'm', 'r', 'd', 'c', 'b', 'l', 't', 'n', 's', 'k', 'g', 'h', 'w', 'p', 'v', 'z']
-                weights = [0.10, 0.09, 0.08, 0.08, 0.07, 0.07, 0.06, 0.06, 0.06, 0.05, 0.05, 0.04, 0.04, 0.04, 0.03, 0.03, 0.02, 0.02]
-                current_char = np.random.choice(first_chars, p=weights)
-        else:
-            # Pattern-based next character
-            last_char = name[-1] if name else ' '
-            
-            # Vowel after consonant, consonant after vowel pattern
-            vowels = 'aeiou'
-            consonants = 'bcdfghjklmnpqrstvwxyz'
-            
-            if last_char in vowels:
-                # After vowel, often consonant or another vowel
-                consonant_prob = 0.6 + np.random.random() * 0.2  # 0.6-0.8 probability
-                if np.random.random() < consonant_prob:
-                    current_char = np.random.choice(list(consonants))
-                else:
-                    current_char = np.random.choice(list(vowels))
-            else:
-                # After consonant, often vowel
-                vowel_prob = 0.7 + np.random.random() * 0.2  # 0.7-0.9 probability
-                if np.random.random() < vowel_prob:
-                    current_char = np.random.choice(list(vowels))
-                else:
-                    current_char = np.random.choice(list(consonants))
-            
-            # End name probability with some variation
-            min_length = 3 + np.random.randint(0, 3)  # 3-5 minimum length
-            end_prob = 0.2 + (len(name) - min_length) * 0.1  # Increasing probability
-            if len(name) >= min_length and np.random.random() < end_prob:
-                break
-        
-        name += current_char
-    
-    # Clean up the name
-    name = name.strip().capitalize()
-    
-    # Ensure reasonable length
-    if len(name) < 3:
-        name += np.random.choice(['a', 'e', 'i', 'o'])
-    
-    return name if name else "Nora"
+session_manager = SessionManager()
 
-# Initialize global randomness and models on startup
-import time
-import random
-# Seed global random state with high-precision time for maximum entropy
-random.seed(int(time.time() * 1000000) % 999999)
-np.random.seed(int(time.time() * 1000000) % 999999)
+log_setup.ensure_logging()
+namesmithy.load_original_models()
+
+name_pool = NamePool()
+SERVER_STARTED_AT = time.time()
+
+def start_background_threads():
+    """Start the name pool producer and, with NAMESMITHY_PROFILE, the sampling profiler."""
+    if NAME_POOL_BUCKET_SIZE > 0:
+        name_pool.start(default_engine())
+    if PROFILE_AT_STARTUP:
+        PROFILER.start()
 
-load_original_models()
+# The serve master forks its workers from this process and must not run threads; each worker starts its own
+SERVE_MASTER = __name__ == '__main__' and sys.argv[1:2] == ['serve']
+if not SERVE_MASTER:
+    start_background_threads()
+
+REGISTRY.gauge('namesmithy_active_sessions', 'Generation sessions running',
+               lambda: session_manager.stats()['active_sessions'])
+REGISTRY.gauge('namesmithy_queued_sessions', 'Generation sessions waiting for a worker',
+               lambda: session_manager.stats()['queued_sessions'])
+REGISTRY.gauge('namesmithy_stored_sessions', 'Sessions kept for polling', lambda: session_manager.stats()['stored_sessions'])
+REGISTRY.gauge('namesmithy_estimated_attempts_per_second', 'Estimated candidates generated per second per thread',
+               lambda: namesmithy.yield_estimator.attempts_per_second)
+REGISTRY.gauge('namesmithy_name_pool_names', 'Names held in the pre-generated pool',
+               lambda: name_pool.stats()['pooled_names'] if name_pool.thread is not None else None)
+REGISTRY.gauge('namesmithy_name_pool_served_total', 'Names served from the pre-generated pool',
+               lambda: name_pool.stats()['served'] if name_pool.thread is not None else None, kind='counter')
+REGISTRY.gauge('namesmithy_log_records_dropped_total', 'Log records discarded because the log queue was full',
+               lambda: log_setup.stats()['dropped'], kind='counter')
+REGISTRY.gauge('namesmithy_score_cache_entries', 'Scores held in memory by the score cache',
+               lambda: len(namesmithy.score_cache) if namesmithy.score_cache is not None else None)
+REGISTRY.gauge('namesmithy_score_cache_lookups_total', 'Score cache lookups by outcome',
+               lambda: {(outcome,): namesmithy.score_cache.stats()[outcome] for outcome in ('hits', 'store_hits', 'misses')}
+               if namesmithy.score_cache is not None else None, labels=('outcome',), kind='counter')
+
+@app.before_request
+def start_request_timer():
+    request.start_time = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Streaming responses are timed until their first byte; unmatched paths share one label
+    endpoint = request.endpoint or 'unmatched'
+    if hasattr(request, 'start_time'):
+        REQUEST_SECONDS.observe(time.perf_counter() - request.start_time, endpoint)
+    REQUESTS.inc(1, endpoint, str(response.status_code))
+    return response
 
 # Serve static files from docs directory
 @app.route('/')
@@ -364,11 +530,69 @@ def api_status():
     """Check API status"""
     return jsonify({
         'status': 'online',
-        'gbr_loaded': gbr_model is not None,
-        'known_names_count': len(known_names),
+        'gbr_loaded': namesmithy.gbr_model is not None,
+        'known_names_count': len(namesmithy.known_names),
+        'known_names_bytes': namesmithy.known_names.nbytes,
+        'engines': available_engines(),
+        'default_engine': default_engine(),
+        **session_manager.stats(),
+        'name_pool': name_pool.stats() if name_pool.thread is not None else None,
+        'score_cache': namesmithy.score_cache.stats() if namesmithy.score_cache is not None else None,
+        'score_batching': namesmithy.score_batcher.stats() if namesmithy.score_batcher is not None else None,
+        'profiler': PROFILER.stats(),
+        'logging': log_setup.stats(),
+        'worker': prefork.worker_info(),
         'version': '1.0.0'
     })
 
+def health_summary():
+    worker = prefork.worker_info()
+    return {
+        'status': 'draining' if worker is not None and worker['draining'] else 'ok',
+        'pid': os.getpid(),
+        'uptime_seconds': round(time.time() - (worker['started_at'] if worker else SERVER_STARTED_AT), 3),
+        'worker': worker,
+        **session_manager.stats(),
+    }
+
+@app.route('/api/health')
+def api_health():
+    """Liveness of the answering process; 503 while a serve worker drains."""
+    summary = health_summary()
+    return jsonify(summary), 200 if summary['status'] == 'ok' else 503
+
+@app.route('/api/workers')
+def api_workers():
+    """Health of every serve worker (just this process outside `server.py serve`)."""
+    return jsonify({'workers': prefork.list_workers() if prefork.current_worker else [health_summary()]})
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Counters, gauges and latency histograms in the Prometheus text format."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics/profile', methods=['GET', 'POST'])
+def api_metrics_profile():
+    """GET: sampled generation stacks in folded format. POST {"enabled", "interval", "reset"}: control the profiler."""
+    if request.method == 'GET':
+        return Response(PROFILER.folded(), mimetype='text/plain')
+    data = request.get_json(silent=True) or {}
+    try:
+        interval = float(data['interval']) if data.get('interval') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': "'interval' must be a number of seconds"}), 400
+    if interval is not None and not 0.001 <= interval <= 1.0:
+        return jsonify({'error': "'interval' must be between 0.001 and 1 seconds"}), 400
+    if data.get('reset'):
+        PROFILER.reset()
+    if data.get('enabled') is True:
+        PROFILER.start(interval)
+    elif data.get('enabled') is False:
+        PROFILER.stop()
+    elif interval is not None:
+        PROFILER.interval = interval
+    return jsonify(PROFILER.stats())
+
 @app.route('/api/generate', methods=['POST'])
 def api_generate():
     """Start name generation and return session ID."""
@@ -379,155 +603,321 @@ def api_generate():
         style = data.get('style', 'random')
         min_score = float(data.get('min_score', 70))
         max_score = float(data.get('max_score', 100))
+        weighted = bool(data.get('weighted', False))
+        engine = data.get('engine') or default_engine()
+        parallel = bool(data.get('parallel', False))
+        max_attempts = min(int(data.get('max_attempts', MAX_SESSION_ATTEMPTS)), MAX_SESSION_ATTEMPTS)
+        max_seconds = min(float(data.get('max_seconds', MAX_SESSION_SECONDS)), MAX_SESSION_SECONDS)
+        if gender not in ['F', 'M']:
+            return jsonify({'error': 'Gender must be F or M'}), 400
+        try:
+            constraints = NameConstraints.from_request(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Create session ID
-        import time
-        import threading
-        session_id = str(int(time.time() * 1000))
+        if constraints is not None and (style == 'popular' or engine not in CONSTRAINED_ENGINES):
+            return jsonify({
+                'error': "Structural constraints need a generated style and one of the engines: {}".format(
+                    ", ".join(CONSTRAINED_ENGINES))
+            }), 400
+        
+        # Popular names are sampled straight from the score-sorted index of known names
+        if style == 'popular':
+            available = namesmithy.popular_names.count(gender, min_score / 100.0, max_score / 100.0)
+            if available < count:
+                return jsonify({
+                    'error': 'Only {} known names score between {} and {}'.format(available, min_score, max_score),
+                    'available': available
+                }), 400
+            names = namesmithy.popular_names.sample(gender, min_score / 100.0, max_score / 100.0, count, weighted=weighted)
+            results = score_names_batch(names, gender)
+            results.sort(key=lambda x: x.get('raw_score', 0), reverse=True)
+            session_id = session_manager.add({
+                'status': 'completed',
+                'attempts': len(results),
+                'found': len(results),
+                'target': count,
+                'results': results
+            })
+            return jsonify({
+                'success': True,
+                'session_id': session_id,
+                'status': 'completed',
+                'available': available
+            })
+        
+        if engine not in available_engines():
+            return jsonify({
+                'error': "Unknown generator engine '{}'".format(engine),
+                'engines': available_engines()
+            }), 400
+        
+        # Serve what we can from the pre-generated pool; only the remainder is generated live
+        pooled = name_pool.take(gender, style, engine, min_score / 100.0, max_score / 100.0, count, constraints)
+        pooled_results = [build_score_result(name, display, predicted, known_rank)
+                          for _, name, display, predicted, known_rank in pooled]
+        if len(pooled) >= count:
+            pooled_results.sort(key=lambda x: x.get('raw_score', 0), reverse=True)
+            session_id = session_manager.add({
+                'status': 'completed',
+                'attempts': 0,
+                'found': len(pooled_results),
+                'target': count,
+                'pooled': len(pooled_results),
+                'results': pooled_results
+            })
+            return jsonify({
+                'success': True,
+                'session_id': session_id,
+                'status': 'completed',
+                'pooled': len(pooled_results)
+            })
+        
+        # Reject requests the generator cannot be expected to fill within budget. Constrained requests
+        # are measured on a pilot batch, since the calibrated yield only describes unconstrained names.
+        band_weights = engine_band_weights(engine, min_score / 100.0, max_score / 100.0)
+        if constraints is None:
+            estimated_yield = namesmithy.yield_estimator.estimate(engine, gender, style, min_score / 100.0, max_score / 100.0)
+        else:
+            estimated_yield, name_limit = estimate_constrained_yield(engine, gender, style, band_weights, min_score / 100.0,
+                                                                     max_score / 100.0, constraints, np.random.default_rng())
+            if name_limit is not None and name_limit < count - len(pooled):
+                name_pool.put_back(gender, pooled)
+                return jsonify({
+                    'error': 'The constraints leave about {} distinct names scoring between {} and {}; {} requested'.format(
+                        name_limit, min_score, max_score, count - len(pooled)),
+                    'available': name_limit
+                }), 400
+        if estimated_yield <= 0:
+            name_pool.put_back(gender, pooled)
+            return jsonify({
+                'error': 'No generated name has scored between {} and {}'.format(min_score, max_score),
+                'estimated_yield': 0.0,
+                'expected_attempts': None,
+                'expected_seconds': None,
+                'max_attempts': max_attempts,
+                'max_seconds': max_seconds
+            }), 400
+        expected_attempts = (count - len(pooled)) / estimated_yield
+        expected_seconds = expected_attempts / namesmithy.yield_estimator.attempts_per_second
+        if expected_attempts > max_attempts or expected_seconds > max_seconds:
+            name_pool.put_back(gender, pooled)
+            return jsonify({
+                'error': 'Expected to need about {:,.0f} attempts ({:.0f}s) to find {} names scoring between {} and {}; '
+                         'the budget is {:,} attempts ({:.0f}s)'.format(
+                             expected_attempts, expected_seconds, count - len(pooled), min_score, max_score,
+                             max_attempts, max_seconds),
+                'estimated_yield': estimated_yield,
+                'expected_attempts': int(expected_attempts),
+                'expected_seconds': expected_seconds,
+                'max_attempts': max_attempts,
+                'max_seconds': max_seconds
+            }), 400
         
         # Initialize session state
-        generation_sessions[session_id] = {
-            'status': 'running',
+        session = {
             'attempts': 0,
-            'found': 0,
+            'found': len(pooled_results),
             'target': count,
-            'results': [],
-            'start_time': time.time()
+            'pooled': len(pooled_results),
+            'results': pooled_results,
+            'engine': engine,
+            'parallel': parallel,
+            'constraints': constraints.to_dict() if constraints is not None else None,
+            'estimated_yield': estimated_yield,
+            'max_attempts': max_attempts,
+            'max_seconds': max_seconds,
+            'stop_reason': None
         }
         
-        # Start generation in background thread
-        def generate_in_background():
+        # Runs on a generation worker once the session reaches the front of the queue
+        def generate_in_background(session_id, session):
             try:
-                results = []
-                generated_names = set()
+                # Names taken from the pool count towards the quota and are streamed first
+                results = list(session['results'])
+                accepted_names = {result['name'].lower() for result in results}
+                for result in results:
+                    session['events'].publish('name', result)
                 attempts = 0
+                stop_reason = None
+                start_time = time.time()
+                last_progress = 0.0
                 min_threshold = min_score / 100.0
                 max_threshold = max_score / 100.0
                 
-                # Create highly randomized base seed using multiple time components
-                import random
-                current_time = time.time()
-                microseconds = int((current_time * 1000000) % 1000000)
-                base_seed = (int(current_time * 1000) + microseconds + random.randint(0, 999999)) % 999999
+                # Per-session generator seeded from OS entropy; never touches global random state
+                rng = np.random.default_rng()
                 
-                print("🎯 Session {} - Generating {} {} names with style '{}' and score range {}-{} (base_seed: {})".format(
-                    session_id, count, gender, style, min_score, max_score, base_seed))
+                logger.info("🎯 Session %s - Generating %s %s names with style '%s', engine '%s'%s and score range %s-%s%s%s",
+                            session_id, count, gender, style, engine, " (parallel)" if parallel else "", min_score,
+                            max_score, " ({})".format(constraints) if constraints is not None else "",
+                            " ({} from the pool)".format(len(results)) if results else "")
                 
-                while len(results) < count and generation_sessions.get(session_id, {}).get('status') == 'running':
-                    attempts += 1
-                    # Generate highly random seed for each attempt
-                    current_micro = int((time.time() * 1000000) % 1000000)
-                    seed = (base_seed + attempts * 23 + current_micro + np.random.randint(0, 10000)) % 999999
+                batches = (parallel_batches if parallel else serial_batches)(
+                    engine, gender, style, band_weights, min_threshold, max_threshold, rng, constraints)
+                for batch_attempts, accepted in batches:
+                    if session['status'] != 'running' or len(results) >= count:
+                        break
+                    
+                    for offset, name, display, predicted, known_rank in accepted:
+                        # Parallel shards dedupe only within themselves
+                        if name.lower() in accepted_names:
+                            continue
+                        accepted_names.add(name.lower())
+                        score_result = build_score_result(name, display, predicted, known_rank)
+                        results.append(score_result)
+                        session['events'].publish('name', score_result)
+                        logger.debug("✅ Session %s - Found qualifying name #%s: %s (score: %.1f)",
+                                     session_id, len(results), name, score_result['raw_score'] * 100)
+                        if len(results) >= count:
+                            break
                     
-                    # Update session progress
-                    if session_id in generation_sessions:
-                        generation_sessions[session_id]['attempts'] = attempts
-                        generation_sessions[session_id]['found'] = len(results)
+                    # Attempts stop at the name that filled the quota
+                    attempts += offset + 1 if len(results) >= count else batch_attempts
                     
-                    name = generate_name_rnn(gender, seed)
+                    # Update session progress once per batch
+                    GENERATION_ATTEMPTS.inc(attempts - session['attempts'], engine, style)
+                    GENERATION_ACCEPTED.inc(len(results) - session['found'], engine, style)
+                    session['attempts'] = attempts
+                    session['found'] = len(results)
+                    session['results'] = results
+                    if time.time() - last_progress >= PROGRESS_EVENT_INTERVAL:
+                        session['events'].update_progress(session_progress(session))
+                        last_progress = time.time()
                     
-                    if name and len(name) >= 3 and name.lower() not in generated_names:
-                        generated_names.add(name.lower())
-                        score_result = score_name_original(name, gender)
-                        
-                        # Apply style filtering
-                        should_include = True
-                        if style == 'popular':
-                            should_include = score_result.get('known_rank') != 'Not found'
-                        elif style == 'unique':
-                            should_include = score_result.get('known_rank') == 'Not found'
-                        
-                        # Check score range
-                        score_in_range = (min_threshold <= score_result['raw_score'] <= max_threshold)
-                        if should_include and score_in_range:
-                            results.append(score_result)
-                            # Update session results immediately when found
-                            if session_id in generation_sessions:
-                                generation_sessions[session_id]['results'] = results
-                            print("✅ Session {} - Found qualifying name #{}: {} (score: {:.1f})".format(
-                                session_id, len(results), name, score_result['raw_score'] * 100))
+                    # Stop at the budget, or early once the observed yield says the budget won't suffice
+                    if len(results) >= count:
+                        break
+                    elapsed = time.time() - start_time
+                    generated = len(results) - session['pooled']
+                    budget_attempts = min(max_attempts, attempts / elapsed * max_seconds) if elapsed > 0 else max_attempts
+                    if attempts >= max_attempts:
+                        stop_reason = 'attempt_budget'
+                    elif elapsed >= max_seconds:
+                        stop_reason = 'time_budget'
+                    elif generated == 0 and attempts * (count - len(results)) >= ZERO_ACCEPT_BOUND * budget_attempts:
+                        # Even the optimistic bound on the yield cannot fill the quota within the budget
+                        stop_reason = 'projected_over_budget'
+                    elif (attempts >= EARLY_STOP_MIN_BUDGET_SHARE * max_attempts
+                          or elapsed >= EARLY_STOP_MIN_BUDGET_SHARE * max_seconds):
+                        observed_yield = blended_yield(generated, attempts, estimated_yield)
+                        remaining = (count - len(results)) / observed_yield
+                        if (attempts + remaining > max_attempts
+                                or elapsed + remaining * elapsed / attempts > max_seconds):
+                            stop_reason = 'projected_over_budget'
+                    if stop_reason:
+                        logger.info("⏹️  Session %s - Stopping after %s attempts with %s/%s names (%s)",
+                                    session_id, attempts, len(results), count, stop_reason)
+                        break
+                
+                batches.close()
+                # The throughput estimate is per generation thread; parallel sessions would inflate it
+                if not parallel and constraints is None:
+                    namesmithy.yield_estimator.record_rate(attempts, time.time() - start_time)
                 
                 # Update final results
-                if session_id in generation_sessions:
-                    results.sort(key=lambda x: x.get('raw_score', 0), reverse=True)
-                    generation_sessions[session_id]['results'] = results
-                    generation_sessions[session_id]['status'] = 'completed'
-                    print("✅ Session {} - Completed with {} names".format(session_id, len(results)))
+                results.sort(key=lambda x: x.get('raw_score', 0), reverse=True)
+                session['results'] = results
+                session['stop_reason'] = stop_reason
+                if session['status'] == 'running':
+                    session['status'] = 'completed'
+                logger.info("✅ Session %s - Completed with %s names", session_id, len(results))
                     
             except Exception as e:
-                print("❌ Session {} - Error: {}".format(session_id, e))
-                if session_id in generation_sessions:
-                    generation_sessions[session_id]['status'] = 'error'
-                    generation_sessions[session_id]['error'] = str(e)
+                logger.exception("❌ Session %s - Error: %s", session_id, e)
+                session['status'] = 'error'
+                session['error'] = str(e)
         
-        # Start background thread
-        thread = threading.Thread(target=generate_in_background)
-        thread.daemon = True
-        thread.start()
+        try:
+            session_id = session_manager.submit(session, generate_in_background)
+        except SessionQueueFull as e:
+            name_pool.put_back(gender, pooled)
+            logger.warning("⚠️  Rejecting generation request: %s", e)
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = '5'
+            return response, 503
         
         response_data = {
             'success': True,
             'session_id': session_id,
-            'status': 'started'
+            'status': session['status'],
+            'pooled': len(pooled_results)
         }
-        print("🔧 DEBUG - API /generate response: {}".format(response_data))
+        logger.debug("🔧 API /generate response: %s", response_data)
         return jsonify(response_data)
         
     except Exception as e:
-        print("❌ Error starting generation: {}".format(e))
+        logger.exception("❌ Error starting generation: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/generate/status/<session_id>')
 def api_generate_status(session_id):
     """Get generation progress for a session."""
-    if session_id not in generation_sessions:
+    session = session_manager.get(session_id)
+    if session is None:
         return jsonify({'error': 'Session not found'}), 404
     
-    session = generation_sessions[session_id]
-    import time
-    elapsed = time.time() - session['start_time']
-    
-    response = {
-        'status': session['status'],
-        'attempts': session['attempts'],
-        'found': session['found'],
-        'target': session['target'],
-        'elapsed': int(elapsed)
-    }
-    
+    response = session_summary(session)
     if session['status'] == 'completed':
-        response['results'] = session['results']
-        print("🔧 DEBUG - Status response (completed): {} results".format(len(session['results'])))
+        logger.debug("🔧 Status response (completed): %s results", len(response['results']))
     elif session['status'] == 'error':
-        response['error'] = session.get('error', 'Unknown error')
-        print("🔧 DEBUG - Status response (error): {}".format(response['error']))
+        logger.debug("🔧 Status response (error): %s", response['error'])
     elif session['status'] == 'aborted':
-        response['results'] = session.get('final_results', [])
-        print("🔧 DEBUG - Status response (aborted): {} partial results".format(len(response['results'])))
+        logger.debug("🔧 Status response (aborted): %s partial results", len(response['results']))
     
     return jsonify(response)
 
+@app.route('/api/generate/stream/<session_id>')
+def api_generate_stream(session_id):
+    """Push a session's names as they are accepted, throttled progress, and a terminal event.
+
+    Server-sent events by default; ?format=ndjson streams one JSON object per
+    line instead. SSE clients reconnecting with Last-Event-ID resume after
+    the last name they received.
+    """
+    session = session_manager.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Session not found'}), 404
+    
+    ndjson = request.args.get('format') == 'ndjson'
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    start = int(last_event_id) + 1 if last_event_id.isdigit() else 0
+    
+    def events():
+        for event_id, event, data in session['events'].follow(start):
+            if ndjson:
+                if event is not None:
+                    yield json.dumps({'event': event, 'data': data}) + '\n'
+            elif event is None:
+                yield ': keep-alive\n\n'
+            elif event_id is None:
+                yield 'event: {}\ndata: {}\n\n'.format(event, json.dumps(data))
+            else:
+                yield 'id: {}\nevent: {}\ndata: {}\n\n'.format(event_id, event, json.dumps(data))
+    
+    return Response(stream_with_context(events()),
+                    mimetype='application/x-ndjson' if ndjson else 'text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/generate/abort/<session_id>', methods=['POST'])
 def api_generate_abort(session_id):
     """Abort a generation session and return partial results."""
-    if session_id in generation_sessions:
-        session = generation_sessions[session_id]
-        
-        print("🔧 DEBUG - Session state before abort: status={}, found={}, results_count={}".format(
-            session.get('status'), session.get('found'), len(session.get('results', []))))
+    session = session_manager.get(session_id)
+    if session is not None:
+        logger.debug("🔧 Session state before abort: status=%s, found=%s, results_count=%s",
+                     session.get('status'), session.get('found'), len(session.get('results', [])))
         
         # Sort any partial results by score before returning
         partial_results = session.get('results', [])
         partial_results.sort(key=lambda x: x.get('raw_score', 0), reverse=True)
         
-        session['status'] = 'aborted'
         session['final_results'] = partial_results  # Store for status endpoint
+        session_manager.cancel(session_id)
         
-        print("🛑 Session {} - Aborted by user, returning {} partial results".format(
-            session_id, len(partial_results)))
+        logger.info("🛑 Session %s - Aborted by user, returning %s partial results", session_id, len(partial_results))
         
-        if len(partial_results) > 0:
-            print("🔧 DEBUG - Partial results: {}".format([r['name'] for r in partial_results]))
+        if partial_results and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔧 Partial results: %s", [r['name'] for r in partial_results])
         
         return jsonify({
             'success': True, 
@@ -538,36 +928,284 @@ def api_generate_abort(session_id):
     else:
         return jsonify({'error': 'Session not found'}), 404
 
+# Suggestions per prefix: every trie node stores this many
+SUGGEST_TOP_K = name_trie.TOP_K
+
+# Similar known names: default and largest number returned
+SIMILAR_NAMES_DEFAULT = 10
+SIMILAR_NAMES_MAX = 50
+
+def similar_count(value):
+    """Number of similar names asked for by an evaluate 'similar' option (true, a count, or off).
+
+    Raises ValueError for anything else.
+    """
+    if value is True or str(value).lower() == 'true':
+        return SIMILAR_NAMES_DEFAULT
+    if not value or str(value).lower() == 'false':
+        return 0
+    try:
+        return max(0, min(int(value), SIMILAR_NAMES_MAX))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('similar must be true, false or a count')
+
 @app.route('/api/evaluate', methods=['POST'])
 def api_evaluate():
-    """Evaluate a name using original models."""
+    """Evaluate a name using original models; "similar": true (or a count) adds the closest known names."""
     try:
         data = request.get_json() or {}
         name = data.get('name', '').strip()
         gender = data.get('gender', 'F')
-        
-        print("🔍 API received: name='{}', gender='{}'".format(name, gender))
+        try:
+            similar = similar_count(data.get('similar'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         if not name:
             return jsonify({'error': 'Name is required'}), 400
         if gender not in ['F', 'M']:
             return jsonify({'error': 'Gender must be F or M'}), 400
         
-        result = score_name_original(name, gender)
-        print("📊 API result: {}".format(result))
+        result = score_names_batch([name], gender)[0]
+        if similar:
+            result['similar'] = find_similar_names(name, gender, similar)
+        evaluate_log.info("📊 Evaluated %s (%s): %s", name, gender, result['score'])
         
-        response = {
+        return jsonify({
             'success': True,
             'result': result
-        }
-        print("📡 API response: {}".format(response))
-        
-        return jsonify(response)
+        })
         
     except Exception as e:
-        print("❌ Error evaluating name: {}".format(e))
+        logger.exception("❌ Error evaluating name: %s", e)
         return jsonify({'error': 'Failed to evaluate name: {}'.format(str(e))}), 500
 
+# Rows scored per model call by /api/evaluate/batch
+EVALUATE_CHUNK_ROWS = 1024
+# Upload formats /api/evaluate/batch reads, by mimetype
+EVALUATE_JSON_TYPES = ('application/json',)
+EVALUATE_NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+EVALUATE_TEXT_TYPES = ('text/tab-separated-values', 'text/plain')
+# Bytes read from the upload at a time, and the largest single row of a JSON array
+EVALUATE_READ_BYTES = 65536
+EVALUATE_MAX_JSON_ROW_CHARS = 65536
+# What may follow a JSON value at the end of a read without the value being complete
+JSON_NUMBER_TAIL = re.compile(r'[\s.eE+-]*\Z')
+
+def parse_evaluate_row(item, default_gender):
+    """Turn one batch input row (object, [name, gender] pair or bare name) into (name, gender)."""
+    if isinstance(item, dict):
+        return str(item.get('name') or '').strip(), item.get('gender') or default_gender
+    if isinstance(item, (list, tuple)) and item:
+        return str(item[0]).strip(), (item[1] if len(item) > 1 else None) or default_gender
+    if isinstance(item, str):
+        return item.strip(), default_gender
+    raise ValueError('Expected an object with name and gender, a [name, gender] pair or a name')
+
+def iter_json_array(stream):
+    """Yield the items of a JSON array from a byte stream, reading it EVALUATE_READ_BYTES at a time.
+
+    Raises ValueError for input that is not a well-formed array.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer, pos, eof = '', 0, False
+    consumed = 0  # characters dropped from the front of buffer
+    expect = '['  # then 'a row or ]', 'a row', ', or ]' and finally 'end'
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos == len(buffer) and eof:
+            if expect != 'end':
+                raise ValueError('Expected a JSON array of rows' if expect == '[' else 'Unexpected end of JSON array')
+            return
+        
+        item = end = None
+        if pos < len(buffer):
+            char = buffer[pos]
+            if expect == '[':
+                if char != '[':
+                    raise ValueError('Expected a JSON array of rows')
+                pos += 1
+                expect = 'a row or ]'
+                continue
+            if char == ']' and expect in ('a row or ]', ', or ]'):
+                pos += 1
+                expect = 'end'
+                continue
+            if char == ',' and expect == ', or ]':
+                pos += 1
+                expect = 'a row'
+                continue
+            if expect not in ('a row', 'a row or ]'):
+                raise ValueError('Unexpected data after the JSON array' if expect == 'end'
+                                 else "Expected {} in the JSON array, found '{}'".format(expect, char))
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ValueError('Invalid JSON row at character {} of the array: {}'.format(consumed + pos, e.msg))
+            # A row that reaches the end of the buffer may go on in the next read; so may a number cut
+            # off there, which decodes without its tail (e.g. '12' of '12.5' when the buffer ends in '12.')
+            if end is not None and (eof or not JSON_NUMBER_TAIL.match(buffer, end)):
+                yield item
+                pos = end
+                expect = ', or ]'
+                continue
+            if len(buffer) - pos > EVALUATE_MAX_JSON_ROW_CHARS:
+                raise ValueError('JSON array row longer than {:,} characters'.format(EVALUATE_MAX_JSON_ROW_CHARS))
+        
+        chunk = stream.read(EVALUATE_READ_BYTES)
+        eof = not chunk
+        buffer = buffer[pos:] + utf8.decode(chunk, final=eof)
+        consumed += pos
+        pos = 0
+
+def iter_evaluate_rows(stream, content_type, default_gender):
+    """Yield (name, gender, error) for each row of a batch upload, reading it incrementally.
+
+    JSON arrays are parsed item by item and NDJSON and TSV/plain text one
+    line at a time, so large uploads never sit in memory. Input that cannot
+    be read any further raises ValueError; bad rows yield an error instead.
+    """
+    if content_type in EVALUATE_JSON_TYPES:
+        items = iter_json_array(stream)
+    else:
+        items = (line.decode('utf-8', 'replace').rstrip('\r\n') for line in iter(stream.readline, b''))
+    
+    for index, item in enumerate(items):
+        try:
+            if content_type in EVALUATE_JSON_TYPES:
+                name, gender = parse_evaluate_row(item, default_gender)
+            elif not item.strip():
+                continue
+            elif content_type in EVALUATE_NDJSON_TYPES:
+                name, gender = parse_evaluate_row(json.loads(item), default_gender)
+            else:
+                fields = item.split('\t')
+                # Skip a TSV header row
+                if index == 0 and fields[0].strip().lower() == 'name':
+                    continue
+                name, gender = parse_evaluate_row(fields, default_gender)
+        except ValueError as e:
+            yield None, None, str(e)
+            continue
+        
+        if not name:
+            yield name, gender, 'Name is required'
+        elif gender not in ['F', 'M']:
+            yield name, gender, 'Gender must be F or M'
+        else:
+            yield name, gender, None
+
+@app.route('/api/evaluate/batch', methods=['POST'])
+def api_evaluate_batch():
+    """Score many names in one request, streaming one NDJSON line per input row.
+
+    Accepts a JSON array, NDJSON (application/x-ndjson or application/ndjson)
+    or tab-separated name/gender lines (text/tab-separated-values or
+    text/plain); rows without a gender use ?gender= (default F), and
+    ?similar=N adds the N closest known names to each result. Rows are scored
+    in chunks of EVALUATE_CHUNK_ROWS; bad rows get an inline error instead of
+    failing the batch. Input unreadable within the first chunk is a 400.
+    """
+    content_type = (request.mimetype or 'application/json').lower()
+    if content_type not in EVALUATE_JSON_TYPES + EVALUATE_NDJSON_TYPES + EVALUATE_TEXT_TYPES:
+        return jsonify({
+            'error': "Unsupported content type '{}'".format(content_type),
+            'content_types': list(EVALUATE_JSON_TYPES + EVALUATE_NDJSON_TYPES + EVALUATE_TEXT_TYPES)
+        }), 400
+    default_gender = request.args.get('gender', 'F')
+    try:
+        similar = similar_count(request.args.get('similar'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Read the first chunk before answering, so input that is malformed from the start gets a 400
+    evaluate_rows = iter_evaluate_rows(request.stream, content_type, default_gender)
+    try:
+        first_rows = list(itertools.islice(evaluate_rows, EVALUATE_CHUNK_ROWS))
+    except ValueError as e:
+        return jsonify({'error': 'Failed to read input: {}'.format(e)}), 400
+    
+    def results():
+        start = time.time()
+        rows = errors = 0
+        chunk = []
+        
+        def flush():
+            valid = [entry for entry in chunk if entry[3] is None]
+            scored = iter(score_names_batch([entry[1] for entry in valid], [entry[2] for entry in valid]))
+            lines = []
+            for row, name, gender, error in chunk:
+                if error is None:
+                    result = next(scored)
+                    if similar:
+                        result['similar'] = find_similar_names(name, gender, similar)
+                    lines.append(json.dumps({'row': row, 'gender': gender, 'result': result}))
+                else:
+                    lines.append(json.dumps({'row': row, 'name': name, 'error': error}))
+            del chunk[:]
+            return '\n'.join(lines) + '\n'
+        
+        try:
+            for name, gender, error in itertools.chain(first_rows, evaluate_rows):
+                chunk.append((rows, name, gender, error))
+                rows += 1
+                errors += error is not None
+                if len(chunk) >= EVALUATE_CHUNK_ROWS:
+                    yield flush()
+            if chunk:
+                yield flush()
+        except Exception as e:
+            # Input that cannot be read any further ends the stream with a final error line
+            logger.error("❌ Error in batch evaluation after %s rows: %s", rows, e)
+            if chunk:
+                yield flush()
+            yield json.dumps({'error': 'Failed to read input: {}'.format(e)}) + '\n'
+        logger.info("📊 Batch evaluated %s rows (%s errors) in %.2fs", rows, errors, time.time() - start)
+    
+    return Response(stream_with_context(results()), mimetype='application/x-ndjson')
+
+@app.route('/api/similar')
+def api_similar():
+    """Closest known names to ?name= by edit distance, with their historical scores."""
+    name = request.args.get('name', '').strip()
+    gender = request.args.get('gender', 'F')
+    if not name:
+        return jsonify({'error': 'Name is required'}), 400
+    if gender not in ['F', 'M']:
+        return jsonify({'error': 'Gender must be F or M'}), 400
+    try:
+        k = max(1, min(int(request.args.get('k', SIMILAR_NAMES_DEFAULT)), SIMILAR_NAMES_MAX))
+    except ValueError:
+        return jsonify({'error': 'k must be a number'}), 400
+    
+    return jsonify({
+        'success': True,
+        'name': name,
+        'gender': gender,
+        'similar': find_similar_names(name, gender, k)
+    })
+
+@app.route('/api/suggest')
+def api_suggest():
+    """Type-ahead: the best-scoring known names starting with ?prefix=, for ?gender=."""
+    prefix = request.args.get('prefix', '')
+    gender = request.args.get('gender', 'F')
+    if gender not in ['F', 'M']:
+        return jsonify({'error': 'Gender must be F or M'}), 400
+    try:
+        k = max(1, min(int(request.args.get('k', SUGGEST_TOP_K)), SUGGEST_TOP_K))
+    except ValueError:
+        return jsonify({'error': 'k must be a number'}), 400
+    
+    return jsonify({
+        'prefix': prefix,
+        'gender': gender,
+        'suggestions': suggest_names(prefix, gender, k)
+    })
+
 @app.route('/api/test-bad-words')
 def api_test_bad_words():
     """Test bad word detection."""
@@ -580,13 +1218,9 @@ def api_test_bad_words():
             'good_names': []
         }
         
-        for word in bad_words:
-            result = score_name_original(word, 'F')
-            results['bad_words'].append(result)
-        
-        for name in good_names:
-            result = score_name_original(name, 'F')
-            results['good_names'].append(result)
+        scored = score_names_batch(bad_words + good_names, 'F')
+        results['bad_words'] = scored[:len(bad_words)]
+        results['good_names'] = scored[len(bad_words):]
         
         return jsonify({
             'success': True,
@@ -716,9 +1350,68 @@ def not_found(error):
 def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
+# `python server.py serve`: state held in one worker's memory is routed to that worker
+SERVE_DRAIN_LINGER_SECONDS = 5
+SESSION_PATH = re.compile(r'^/api/generate/(?:status|stream|abort)/([^/]+)$')
+
+def session_owner(session_id):
+    """Pid of the serve worker that created a session ('<pid>-<hex>' IDs), or None."""
+    pid, sep, _ = session_id.partition('-')
+    return int(pid) if sep and pid.isdigit() else None
+
+def request_owner(environ):
+    """Pid of the serve worker that must answer a request: the session's owner, or ?worker=<pid>."""
+    match = SESSION_PATH.match(environ.get('PATH_INFO', ''))
+    if match:
+        return session_owner(match.group(1))
+    worker = parse_qs(environ.get('QUERY_STRING', '')).get('worker', [''])[0]
+    return int(worker) if worker.isdigit() else None
+
+def start_serve_worker():
+    """Per-process setup of a forked serve worker, before it takes requests."""
+    log_setup.configure_logging(show_pid=True)
+    # SQLite connections must not cross a fork, and the cores are shared with the sibling workers
+    namesmithy.reset_score_cache()
+    namesmithy.GENERATION_PROCESSES = max(1, (os.cpu_count() or 1) // prefork.current_worker['workers'])
+    session_manager.id_prefix = '{}-'.format(os.getpid())
+    start_background_threads()
+
+def drain_serve_worker(deadline):
+    """Let a retiring worker's sessions finish, and give their clients a moment to fetch the results."""
+    session_manager.drain(deadline, SERVE_DRAIN_LINGER_SECONDS)
+
+def serve(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog='server.py serve',
+                                     description='Serve the API from pre-forked workers sharing one copy of the models.')
+    parser.add_argument('--host', default='0.0.0.0', help='bind address (default 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=5000, help='port (default 5000)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--graceful-timeout', type=float, default=MAX_SESSION_SECONDS + 10,
+                        help='seconds a stopping worker gets to finish its sessions (default %(default)s)')
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    # The master forks from here, so it logs without a writer thread
+    log_setup.configure_logging(background=False, show_pid=True)
+    return prefork.serve(app, args.host, args.port, args.workers, owner_of=request_owner,
+                         on_worker_start=start_serve_worker, drain=drain_serve_worker,
+                         reload=namesmithy.load_original_models, graceful_timeout=args.graceful_timeout)
+
 if __name__ == '__main__':
     import socket
     import os
+    import sys
+    
+    # `python server.py build-bundle [path]` precompiles the models for fast startup
+    if sys.argv[1:2] == ['build-bundle']:
+        build_model_bundle(sys.argv[2] if len(sys.argv) > 2 else BUNDLE_PATH)
+        sys.exit(0)
+    
+    # `python server.py serve [--host H] [--port P] [--workers N]` is the multi-process production server
+    if SERVE_MASTER:
+        sys.exit(serve(sys.argv[2:]))
     
     def find_free_port(start_port=5000):
         """Find a free port starting from start_port"""
@@ -735,19 +1428,21 @@ if __name__ == '__main__':
     if os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
         port = find_free_port(5000)
         if port is None:
-            print("❌ Could not find a free port")
+            logger.error("❌ Could not find a free port")
             exit(1)
+        if port != 5000:
+            logger.warning("⚠️  Port 5000 is busy, using %s (`python server.py serve --port` does not move)", port)
         # Store port in environment for the restarted process
         os.environ['NAMESMITHY_PORT'] = str(port)
         
-        print("🚀 Starting NameSmithy Server...")
-        print("📍 Web Interface: http://localhost:{}".format(port))
-        print("🧪 API Test Page: http://localhost:{}/test".format(port))
-        print("📡 API Status: http://localhost:{}/api/status".format(port))
-        print("⚠️  Press Ctrl+C to stop")
+        logger.info("🚀 Starting NameSmithy Server...")
+        logger.info("📍 Web Interface: http://localhost:%s", port)
+        logger.info("🧪 API Test Page: http://localhost:%s/test", port)
+        logger.info("📡 API Status: http://localhost:%s/api/status", port)
+        logger.info("⚠️  Press Ctrl+C to stop")
     else:
         # This is the restarted process - use the same port
         port = int(os.environ.get('NAMESMITHY_PORT', 5000))
-        print("🔄 Restarting server on port {}...".format(port))
+        logger.info("🔄 Restarting server on port %s...", port)
     
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
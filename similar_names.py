@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+Nearest-name search over the known names with a character-trigram inverted index.
+
+Each name is cut into the trigrams of its codes framed by a start symbol and
+the end code ("emma" -> ^em, emm, mma, ma$). The index is a CSR posting
+table per gender: offsets[t]:offsets[t + 1] slices the sorted name ids that
+contain trigram t. A query counts shared trigrams over just its own
+postings, keeps the best candidates by Dice overlap, and ranks those by exact
+Levenshtein distance computed for all of them at once, so no query ever
+walks the whole table.
+
+Codes use the server's name_to_vec alphabet: 1-26 are 'a'-'z' and 0 ends the
+name.
+"""
+
+import numpy as np
+
+FORMAT_VERSION = 1
+START = 27  # framing symbol before the first letter
+RADIX = 28
+N_TRIGRAMS = RADIX ** 3
+# Candidates (by trigram overlap) that get an exact edit distance
+RERANK_CANDIDATES = 256
+
+
+def name_trigrams(codes):
+    """Trigram ids of an (N, length) code matrix, -1 past each name's end.
+
+    Returns an (N, length) matrix: one trigram per letter, the last one
+    ending in the end code.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    n, length = codes.shape
+    padded = np.zeros((n, length + 2), dtype=np.int64)
+    padded[:, 0] = START
+    padded[:, 1:length + 1] = codes
+    lengths = np.where((codes == 0).any(axis=1), (codes == 0).argmax(axis=1), length)
+    trigrams = padded[:, :length] * RADIX ** 2 + padded[:, 1:length + 1] * RADIX + padded[:, 2:]
+    trigrams[np.arange(length)[None, :] >= lengths[:, None]] = -1
+    return trigrams
+
+
+def edit_distances(query, candidates):
+    """Levenshtein distance from a 1-D code row to each row of a code matrix (0 = end)."""
+    query = np.asarray(query)
+    query = query[:np.argmax(query == 0)] if (query == 0).any() else query
+    candidates = np.asarray(candidates)
+    lengths = np.where((candidates == 0).any(axis=1), (candidates == 0).argmax(axis=1), candidates.shape[1])
+    # previous[:, j]: distance between the query prefix so far and the first j candidate letters
+    previous = np.tile(np.arange(candidates.shape[1] + 1), (len(candidates), 1))
+    for i, symbol in enumerate(query, 1):
+        current = np.empty_like(previous)
+        current[:, 0] = i
+        for j in range(1, candidates.shape[1] + 1):
+            current[:, j] = np.minimum(np.minimum(previous[:, j] + 1, current[:, j - 1] + 1),
+                                       previous[:, j - 1] + (candidates[:, j - 1] != symbol))
+        previous = current
+    return previous[np.arange(len(candidates)), lengths]
+
+
+class TrigramIndex:
+    """Trigram posting lists over one gender's names: offsets (N_TRIGRAMS + 1,) and postings (int32 name ids)."""
+
+    def __init__(self, offsets, postings, codes, scores):
+        self.offsets = offsets
+        self.postings = postings
+        self.codes = codes
+        self.scores = scores
+        self.n_trigrams = np.count_nonzero(codes, axis=1) if len(codes) else np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def build(cls, codes, scores):
+        """Index an (N, length) code matrix with one score per row."""
+        trigrams = name_trigrams(codes)
+        ids = np.repeat(np.arange(len(codes), dtype=np.int64), trigrams.shape[1])
+        keys = trigrams.ravel()
+        valid = keys >= 0
+        # One posting per (trigram, name), sorted by trigram then name
+        pairs = np.unique(keys[valid] * len(codes) + ids[valid]) if len(codes) else np.zeros(0, dtype=np.int64)
+        offsets = np.searchsorted(pairs // max(len(codes), 1), np.arange(N_TRIGRAMS + 1)).astype(np.int64)
+        return cls(offsets, (pairs % max(len(codes), 1)).astype(np.int32), codes, scores)
+
+    def query(self, codes, k=10, exclude_exact=True):
+        """Top-k (row, edit distance) for a 1-D code row: closest first, higher score breaking ties.
+
+        Names sharing no trigram with the query are never returned.
+        """
+        trigrams = np.unique(name_trigrams(np.asarray(codes)[None, :])[0])
+        trigrams = trigrams[trigrams >= 0]
+        if not len(trigrams) or not len(self.codes):
+            return []
+        postings = np.concatenate([self.postings[self.offsets[t]:self.offsets[t + 1]] for t in trigrams])
+        if not len(postings):
+            return []
+        rows, shared = np.unique(postings, return_counts=True)
+        dice = 2.0 * shared / (len(trigrams) + self.n_trigrams[rows])
+        if len(rows) > RERANK_CANDIDATES:
+            best = np.argpartition(-dice, RERANK_CANDIDATES - 1)[:RERANK_CANDIDATES]
+            rows, dice = rows[best], dice[best]
+        distances = edit_distances(codes, self.codes[rows])
+        if exclude_exact:
+            rows, dice, distances = rows[distances > 0], dice[distances > 0], distances[distances > 0]
+        order = np.lexsort((-dice, -self.scores[rows], distances))[:k]
+        return list(zip(rows[order].tolist(), distances[order].tolist()))
+
+    def to_arrays(self):
+        return {'offsets': self.offsets, 'postings': self.postings}
+
+
+class SimilarNamesIndex:
+    """A TrigramIndex per gender over code and score tables shared with ScoreRangeIndex."""
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+
+    @classmethod
+    def build(cls, codes_by_gender, scores_by_gender):
+        return cls({g: TrigramIndex.build(codes_by_gender[g], scores_by_gender[g]) for g in codes_by_gender})
+
+    def query(self, codes, gender, k=10):
+        """Top-k (code row, score, edit distance) for a 1-D code row."""
+        index = self.indexes['M' if gender == 'M' else 'F']
+        return [(index.codes[row], float(index.scores[row]), distance) for row, distance in index.query(codes, k)]
+
+    @property
+    def nbytes(self):
+        return sum(index.offsets.nbytes + index.postings.nbytes for index in self.indexes.values())
+
+    def to_arrays(self):
+        arrays = {'format_version': np.array(FORMAT_VERSION, dtype=np.int32)}
+        for gender, index in self.indexes.items():
+            for name, array in index.to_arrays().items():
+                arrays['{}_{}'.format(name, gender)] = array
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, codes_by_gender, scores_by_gender):
+        """Wrap posting arrays written by to_arrays (zero-copy) around the name tables they index."""
+        version = int(arrays['format_version'])
+        if version != FORMAT_VERSION:
+            raise ValueError("Unsupported similar-names index format version {}".format(version))
+        return cls({g: TrigramIndex(arrays['offsets_' + g], arrays['postings_' + g],
+                                    codes_by_gender[g], scores_by_gender[g]) for g in codes_by_gender})
@@ -0,0 +1,78 @@
+"""SubstringAutomaton matches against Python's `in` over the decoded names."""
+
+import numpy as np
+import pytest
+
+import namesmithy
+from bad_substrings import SubstringAutomaton
+from namesmithy import codes_to_names, encode_names
+
+LETTERS = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+
+
+def letter_codes(word):
+    return [ord(c) - ord('a') + 1 for c in word]
+
+
+def naive_matches(names, words):
+    return np.array([any(word in name.lower() for word in words) for name in names])
+
+
+def random_words(rng, n, alphabet, lengths=(1, 6)):
+    return [''.join(rng.choice(alphabet, size=rng.integers(*lengths))) for _ in range(n)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_scan_matches_naive_in(seed):
+    rng = np.random.default_rng(seed)
+    # A small alphabet makes overlapping patterns and suffix-link matches common
+    alphabet = LETTERS[:rng.integers(2, 6)]
+    words = random_words(rng, int(rng.integers(1, 40)), alphabet)
+    names = random_words(rng, 3000, alphabet, (1, 16))
+    automaton = SubstringAutomaton.build([letter_codes(word) for word in words])
+    assert np.array_equal(automaton.scan(encode_names(names)), naive_matches(names, words))
+
+
+def test_overlapping_and_nested_patterns():
+    words = ['he', 'she', 'his', 'hers', 'ushe']
+    names = ['ushers', 'ahishe', 'sh', 'h', 'hxe', 'she', 'xxxxxxxxxxxxxhe', 'hhhhhhhhhhhhhhh']
+    automaton = SubstringAutomaton.build([letter_codes(word) for word in words])
+    assert automaton.scan(encode_names(names)).tolist() == naive_matches(names, words).tolist()
+
+
+def test_matches_never_span_names():
+    automaton = SubstringAutomaton.build([letter_codes('ab')])
+    assert automaton.scan(encode_names(['xa', 'bx', 'xab'])).tolist() == [False, False, True]
+    # The end of a name resets the match, so 'a' + padding + 'b' is no match
+    codes = np.zeros((1, 20), dtype=np.uint8)
+    codes[0, 0], codes[0, 2] = 1, 2
+    assert automaton.scan(codes).tolist() == [False]
+
+
+def test_empty_automaton_matches_nothing():
+    automaton = SubstringAutomaton.build([])
+    assert not automaton.scan(encode_names(['anything', 'at', 'all'])).any()
+
+
+def test_round_trip_through_arrays():
+    rng = np.random.default_rng(7)
+    words = random_words(rng, 50, LETTERS[:4])
+    names = random_words(rng, 500, LETTERS[:4], (1, 16))
+    automaton = SubstringAutomaton.build([letter_codes(word) for word in words])
+    restored = SubstringAutomaton.from_arrays(automaton.to_arrays())
+    assert np.array_equal(restored.scan(encode_names(names)), automaton.scan(encode_names(names)))
+
+
+@pytest.mark.skipif(not namesmithy.BAD_WORDS_PATH.exists(), reason='bad word list not available')
+def test_screening_matches_naive_in_over_real_lists():
+    index = namesmithy.load_known_names_from_source()
+    automaton = namesmithy.build_bad_substrings(index)
+    known = '|'.join(name.lower() for name in codes_to_names(index.name_entries()[0]))
+    words = [word.lower() for word in codes_to_names(index.bad_entries())
+             if len(word) >= namesmithy.MIN_BAD_SUBSTRING_LENGTH and word.lower() not in known]
+    rng = np.random.default_rng(0)
+    # Random names rarely contain a word, so plant one in every other probe
+    names = random_words(rng, 4000, LETTERS, (2, 10))
+    names = [name[:3] + words[i % len(words)] + name[3:] if i % 2 else name for i, name in enumerate(names)]
+    names = [name[:15] for name in names]
+    assert np.array_equal(automaton.scan(encode_names(names)), naive_matches(names, words))
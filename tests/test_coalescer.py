@@ -0,0 +1,151 @@
+"""BatchCoalescer results against direct calls, including while score batching is reconfigured."""
+
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import namesmithy
+from coalescer import BatchCoalescer
+
+
+class Recorder:
+    """Batch function that squares each request and remembers the batches it was called with."""
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+        self.lock = threading.Lock()
+
+    def __call__(self, requests):
+        with self.lock:
+            self.batches.append(list(requests))
+        if self.fail_on in requests:
+            raise ValueError('bad request {}'.format(self.fail_on))
+        return [request * request for request in requests]
+
+
+def call_concurrently(target, n_threads, calls_per_thread):
+    errors = []
+
+    def worker(k):
+        try:
+            for i in range(calls_per_thread):
+                target(k * calls_per_thread + i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def test_results_match_direct_calls_and_batches_merge():
+    function = Recorder()
+    coalescer = BatchCoalescer(function, max_batch=16, max_wait=0.005)
+    results = {}
+
+    def target(i):
+        results[i] = coalescer.call(i)
+
+    assert call_concurrently(target, 32, 20) == []
+    assert results == {i: i * i for i in range(640)}
+    assert sum(len(batch) for batch in function.batches) == 640
+    assert max(len(batch) for batch in function.batches) <= 16
+    assert len(function.batches) < 640  # concurrent calls shared batches
+    assert coalescer.stats()['requests'] == 640
+    coalescer.close()
+
+
+def test_rows_cap_batches_but_never_split_a_request():
+    function = Recorder()
+    coalescer = BatchCoalescer(function, max_batch=10, max_wait=0.05)
+    futures = [coalescer.submit(i, rows) for i, rows in enumerate([4, 4, 4, 25, 1])]
+    assert [future.result() for future in futures] == [0, 1, 4, 9, 16]
+    sizes = {tuple(batch) for batch in function.batches}
+    assert (3,) in sizes  # the 25-row request ran on its own
+    assert all(sum([4, 4, 4, 25, 1][i] for i in batch) <= 10 for batch in sizes if batch != (3,))
+    coalescer.close()
+
+
+def test_a_failed_call_fails_every_request_in_its_batch():
+    coalescer = BatchCoalescer(Recorder(fail_on=3), max_batch=100, max_wait=0.05)
+    futures = [coalescer.submit(i) for i in range(6)]
+    for future in futures:
+        with pytest.raises(ValueError):
+            future.result()
+    assert coalescer.call(7) == 49  # the dispatcher carries on
+    coalescer.close()
+
+
+def test_close_finishes_queued_requests_and_runs_late_ones_directly():
+    function = Recorder()
+    coalescer = BatchCoalescer(function, max_batch=100, max_wait=0.2)
+    queued = [coalescer.submit(i) for i in range(5)]
+    coalescer.close()
+    assert [future.result(timeout=5) for future in queued] == [0, 1, 4, 9, 16]
+    assert coalescer.call(6) == 36
+    assert [6] in function.batches
+    coalescer.thread.join(timeout=5)
+    assert not coalescer.thread.is_alive()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_child_starts_its_own_dispatcher():
+    coalescer = BatchCoalescer(Recorder(), max_batch=8, max_wait=0.001)
+    assert coalescer.call(2) == 4
+    pid = os.fork()
+    if pid == 0:
+        # Without a fresh dispatcher the child's request would wait forever
+        try:
+            os._exit(0 if coalescer.submit(3).result(timeout=5) == 9 else 1)
+        except BaseException:
+            os._exit(1)
+    _, status = os.waitpid(pid, 0)
+    assert status == 0
+    coalescer.close()
+
+
+class RowSumModel:
+    """Stands in for the GBR: a deterministic score per feature row."""
+
+    def predict(self, features):
+        return features.astype(np.float64).sum(axis=1) / 1000.0
+
+
+def test_score_features_while_batching_is_reconfigured(monkeypatch):
+    monkeypatch.setattr(namesmithy, 'gbr_model', RowSumModel())
+    monkeypatch.setattr(namesmithy, 'known_names', namesmithy.KnownNamesIndex())
+    rng = np.random.default_rng(0)
+    names = [''.join(rng.choice(list('abcdefghij'), size=rng.integers(2, 12))) for _ in range(200)]
+    features = namesmithy.build_features(namesmithy.encode_names(names), 'F')
+    expected = RowSumModel().predict(features)
+    stop = threading.Event()
+    mismatches = []
+
+    def target(i):
+        j = i % len(names)
+        predicted = namesmithy.score_features([names[j]], features[j:j + 1])[1][0]
+        if predicted != expected[j]:
+            mismatches.append(j)
+
+    def reconfigure():
+        settings = [(0, 64), (1, 64), (3, 8)]
+        i = 0
+        while not stop.is_set():
+            namesmithy.configure_score_batching(*settings[i % len(settings)])
+            i += 1
+
+    swapper = threading.Thread(target=reconfigure)
+    swapper.start()
+    try:
+        errors = call_concurrently(target, 16, 150)
+    finally:
+        stop.set()
+        swapper.join()
+        namesmithy.configure_score_batching()
+    assert errors == [] and mismatches == []
@@ -0,0 +1,103 @@
+"""The /api/evaluate/batch upload parsers against json.loads, with uploads split at every size."""
+
+import io
+import json
+import os
+
+import pytest
+
+# The pre-generated name pool is not needed to parse uploads
+os.environ.setdefault('NAMESMITHY_NAME_POOL_SIZE', '0')
+import server  # noqa: E402
+
+
+class TrickleStream:
+    """A byte stream that hands out at most `step` bytes per read, like a slow upload."""
+
+    def __init__(self, data, step):
+        self.data = io.BytesIO(data)
+        self.step = step
+
+    def read(self, n=-1):
+        return self.data.read(min(n, self.step) if n >= 0 else self.step)
+
+    def readline(self):
+        return self.data.readline()
+
+
+ARRAYS = [
+    [],
+    [1, 22, 333, -4.5e3, True, None],
+    ['Émilie', 'Zoë', {'name': 'Liam', 'gender': 'M'}, ['Ava', 'F'], {'nested': [1, {'a': 'b]'}]}],
+    [{'name': 'x' * 300}] * 50,
+]
+
+
+@pytest.mark.parametrize('items', ARRAYS)
+@pytest.mark.parametrize('read_bytes', [1, 2, 3, 7, 64, 65536])
+def test_json_array_matches_json_loads(items, read_bytes, monkeypatch):
+    monkeypatch.setattr(server, 'EVALUATE_READ_BYTES', read_bytes)
+    text = json.dumps(items, ensure_ascii=False, indent=1)
+    for step in (1, 5, len(text) + 1):
+        assert list(server.iter_json_array(TrickleStream(text.encode('utf-8'), step))) == json.loads(text)
+
+
+@pytest.mark.parametrize('body', [b'', b'  ', b'{"name": "Emma"}', b'"Emma"', b'[1,]', b'[,1]', b'[1 2]', b'[1',
+                                  b'[123456', b'[tru]', b'[1] x', b'[1]]', b'["a\xff"]'])
+@pytest.mark.parametrize('read_bytes', [1, 4, 65536])
+def test_json_array_rejects_malformed(body, read_bytes, monkeypatch):
+    monkeypatch.setattr(server, 'EVALUATE_READ_BYTES', read_bytes)
+    with pytest.raises(ValueError):
+        list(server.iter_json_array(io.BytesIO(body)))
+
+
+def test_json_array_caps_row_size(monkeypatch):
+    monkeypatch.setattr(server, 'EVALUATE_MAX_JSON_ROW_CHARS', 100)
+    monkeypatch.setattr(server, 'EVALUATE_READ_BYTES', 16)
+    with pytest.raises(ValueError):
+        list(server.iter_json_array(io.BytesIO(json.dumps(['x' * 1000]).encode('utf-8'))))
+
+
+@pytest.mark.parametrize('content_type, body', [
+    ('application/json', json.dumps([{'name': 'Emma'}, ['Liam', 'M'], 'Ava', 5, {'name': 'Zed', 'gender': 'X'}])),
+    ('application/x-ndjson', '{"name": "Emma"}\n["Liam", "M"]\n"Ava"\n5\n{"name": "Zed", "gender": "X"}\n'),
+    ('application/ndjson', '{"name": "Emma"}\n["Liam", "M"]\n\n"Ava"\n5\n{"name": "Zed", "gender": "X"}'),
+    ('text/plain', 'name\tgender\nEmma\nLiam\tM\nAva\tF\n\t\n\tF\nZed\tX\n'),
+])
+def test_rows_are_the_same_in_every_format(content_type, body):
+    rows = list(server.iter_evaluate_rows(TrickleStream(body.encode('utf-8'), 3), content_type, 'F'))
+    names = [(name, gender) for name, gender, error in rows if error is None]
+    assert names == [('Emma', 'F'), ('Liam', 'M'), ('Ava', 'F')]
+    assert len(rows) == 5 and rows[-1][2] == 'Gender must be F or M'
+
+
+@pytest.fixture(scope='module')
+def client():
+    return server.app.test_client()
+
+
+def test_endpoint_scores_every_row(client):
+    response = client.post('/api/evaluate/batch', json=['Emma', ['Liam', 'M'], 7])
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+    assert [line['row'] for line in lines] == [0, 1, 2]
+    assert lines[0]['result']['name'] == 'Emma' and lines[1]['gender'] == 'M' and 'error' in lines[2]
+
+
+@pytest.mark.parametrize('content_type, body', [
+    ('application/json', '{"name": "Emma"}'),
+    ('application/json', '[{"name": "Emma"}, oops]'),
+    ('application/x-www-form-urlencoded', 'Emma'),
+])
+def test_endpoint_rejects_unreadable_input_up_front(client, content_type, body):
+    response = client.post('/api/evaluate/batch', data=body, content_type=content_type)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_endpoint_reports_late_errors_inline(client):
+    body = '[' + ','.join('"Name{}"'.format(i) for i in range(server.EVALUATE_CHUNK_ROWS + 5)) + ', oops]'
+    response = client.post('/api/evaluate/batch', data=body, content_type='application/json')
+    lines = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+    assert response.status_code == 200
+    assert len(lines) == server.EVALUATE_CHUNK_ROWS + 6 and set(lines[-1]) == {'error'}
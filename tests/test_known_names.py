@@ -0,0 +1,103 @@
+"""KnownNamesIndex against a plain dict keyed by encoded (gender, name)."""
+
+import numpy as np
+import pytest
+
+import namesmithy
+from namesmithy import KnownNamesIndex, build_features, encode_names
+
+LETTERS = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+
+
+def random_names(rng, n, stem=''):
+    lengths = rng.integers(2, 16, n)
+    return [stem + ''.join(rng.choice(LETTERS, size=length)) for length in lengths]
+
+
+def feature_key(row):
+    return bytes(row)
+
+
+def reference_lookup(names, genders, scores, bad_words, bad_scores):
+    """What the old {(name, gender): score} dict held: later entries win and bad words cover both genders."""
+    table = {}
+    for row, score in zip(build_features(encode_names(names), genders), scores):
+        table[feature_key(row)] = score
+    bad_codes = encode_names(bad_words)
+    for gender in ('F', 'M'):
+        for row, score in zip(build_features(bad_codes, gender), bad_scores):
+            table[feature_key(row)] = score
+    return table
+
+
+def check_against(index, table, features):
+    found = index.lookup(features)
+    expected = np.array([table.get(feature_key(row), np.nan) for row in features])
+    assert np.array_equal(np.isnan(found), np.isnan(expected))
+    assert np.array_equal(found[~np.isnan(found)], expected[~np.isnan(expected)])
+
+
+@pytest.fixture(scope='module')
+def synthetic():
+    rng = np.random.default_rng(1)
+    # Shared 12-letter stems make keys that differ only in the low 3 codes
+    names = random_names(rng, 3000) + random_names(rng, 300, stem='abcdefghijkl') + ['Emma', 'emma', 'Christopher']
+    genders = list(rng.choice(['F', 'M'], size=len(names)))
+    scores = rng.random(len(names))
+    bad_words = ['hell', 'damn', 'abcdefghijklxyz', names[5]]
+    bad_scores = [-1.0, -2.0, -1.0, -1.0]
+    index = KnownNamesIndex(build_features(encode_names(names), genders), scores, encode_names(bad_words), bad_scores)
+    return index, reference_lookup(names, genders, scores, bad_words, bad_scores), names
+
+
+def test_lookup_matches_dict(synthetic):
+    index, table, names = synthetic
+    known = np.array([np.frombuffer(key, dtype=np.uint8) for key in table])
+    check_against(index, table, known)
+
+
+def test_misses_and_other_gender(synthetic):
+    index, table, names = synthetic
+    rng = np.random.default_rng(2)
+    probes = random_names(rng, 5000) + random_names(rng, 500, stem='abcdefghijkl')
+    for gender in ('F', 'M'):
+        check_against(index, table, build_features(encode_names(probes + names), gender))
+
+
+def test_round_trip_through_arrays(synthetic):
+    index, table, names = synthetic
+    features = build_features(encode_names(names), 'M')
+    restored = KnownNamesIndex.from_arrays(index.to_arrays())
+    assert np.array_equal(restored.lookup(features), index.lookup(features), equal_nan=True)
+
+
+def test_name_entries_skip_bad_words(synthetic):
+    index, table, names = synthetic
+    codes, gender_bits, scores = index.name_entries()
+    bad = {bytes(row) for row in index.bad_entries()}
+    assert not any(bytes(row) in bad for row in codes)
+    for row, bit, score in zip(codes, gender_bits, scores):
+        assert table[feature_key(np.concatenate([[bit], row]).astype(np.uint8))] == score
+
+
+@pytest.mark.skipif(not namesmithy.NAMES_PATH.exists(), reason='historical names table not available')
+def test_source_files_match_dict():
+    index = namesmithy.load_known_names_from_source()
+    names, genders, scores = [], [], []
+    with open(str(namesmithy.NAMES_PATH)) as f:
+        for line in f:
+            parts = line.strip().split()
+            if len(parts) >= 3:
+                names.append(parts[0])
+                genders.append(parts[1])
+                scores.append(float(parts[2]))
+    bad_words, bad_scores = [], []
+    if namesmithy.BAD_WORDS_PATH.exists():
+        with open(str(namesmithy.BAD_WORDS_PATH)) as f:
+            for line in f:
+                parts = line.strip().split('\t')
+                if len(parts) >= 2:
+                    bad_words.append(parts[0])
+                    bad_scores.append(float(parts[1]))
+    table = reference_lookup(names, genders, scores, bad_words, bad_scores)
+    check_against(index, table, np.array([np.frombuffer(key, dtype=np.uint8) for key in table]))
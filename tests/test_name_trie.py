@@ -0,0 +1,93 @@
+"""NameTrie top-k completions against sorted() over the names with each prefix."""
+
+import bisect
+
+import numpy as np
+import pytest
+
+import namesmithy
+from name_trie import NameTrie, SuggestIndex
+from namesmithy import codes_to_names, encode_names
+
+LETTERS = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+
+
+class Reference:
+    """Names with a prefix found by bisecting the sorted names, then ranked with sorted()."""
+
+    def __init__(self, names, scores):
+        self.entries = sorted((name, row) for row, name in enumerate(names))
+        self.keys = [name for name, _ in self.entries]
+        self.scores = scores
+
+    def top(self, prefix, k):
+        """Best-scoring names starting with prefix, ties broken alphabetically, as the trie ranks them."""
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '{')  # '{' sorts after 'z'
+        matching = [(-self.scores[row], name, row) for name, row in self.entries[start:end]]
+        return [row for _, _, row in sorted(matching)[:k]]
+
+
+def all_prefixes(names, limit=None):
+    prefixes = {''}
+    for name in names:
+        prefixes.update(name[:i] for i in range(1, len(name) + 1))
+    prefixes = sorted(prefixes)
+    return prefixes if limit is None else prefixes[:limit]
+
+
+@pytest.fixture(scope='module')
+def table():
+    rng = np.random.default_rng(3)
+    # A small alphabet gives deep, bushy prefixes; a few names are prefixes of others
+    names = sorted({''.join(rng.choice(LETTERS[:5], size=rng.integers(1, 16))) for _ in range(4000)})
+    scores = rng.random(len(names))
+    scores[::7] = 0.5  # ties
+    return names, scores, encode_names(names)
+
+
+@pytest.mark.parametrize('k', [1, 3, 10])
+def test_top_matches_sorted(table, k):
+    names, scores, codes = table
+    trie = NameTrie.build(codes, scores, top_k=k)
+    reference = Reference(names, scores)
+    for prefix in all_prefixes(names):
+        got = trie.top([ord(c) - ord('a') + 1 for c in prefix], k).tolist()
+        assert got == reference.top(prefix, k), prefix
+
+
+def test_smaller_k_than_built_is_a_prefix_of_the_list(table):
+    names, scores, codes = table
+    trie = NameTrie.build(codes, scores, top_k=10)
+    reference = Reference(names, scores)
+    for prefix in all_prefixes(names, limit=300):
+        assert trie.top([ord(c) - ord('a') + 1 for c in prefix], 4).tolist() == reference.top(prefix, 4)
+
+
+def test_unknown_prefix_has_no_completions(table):
+    names, scores, codes = table
+    trie = NameTrie.build(codes, scores)
+    assert trie.find([26, 26]) is None
+    assert len(trie.top([26, 26])) == 0
+
+
+def test_round_trip_through_arrays(table):
+    names, scores, codes = table
+    index = SuggestIndex.build({'F': codes, 'M': codes[::-1]}, {'F': scores, 'M': scores[::-1]})
+    restored = SuggestIndex.from_arrays(index.to_arrays(), index.codes, index.scores)
+    for prefix in all_prefixes(names, limit=200):
+        query = [ord(c) - ord('a') + 1 for c in prefix]
+        for gender in ('F', 'M'):
+            assert [s for _, s in restored.suggest(query, gender)] == [s for _, s in index.suggest(query, gender)]
+
+
+@pytest.mark.skipif(not namesmithy.NAMES_PATH.exists(), reason='historical names table not available')
+def test_real_names_match_sorted():
+    popular = namesmithy.ScoreRangeIndex.from_known_names(namesmithy.load_known_names_from_source())
+    index = SuggestIndex.build(popular.codes, popular.scores)
+    for gender in ('F', 'M'):
+        names = [name.lower() for name in codes_to_names(popular.codes[gender])]
+        reference = Reference(names, popular.scores[gender])
+        for prefix in all_prefixes(names)[::7] + ['a', 'ma', 'jo', 'xz']:
+            got = index.tries[gender].top([ord(c) - ord('a') + 1 for c in prefix], 10).tolist()
+            assert got == reference.top(prefix, 10), (gender, prefix)
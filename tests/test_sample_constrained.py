@@ -0,0 +1,73 @@
+"""NgramGenerator.sample_constrained rows checked with plain string operations."""
+
+import numpy as np
+import pytest
+
+from namesmithy import codes_to_names, encode_names
+from ngram_generator import MAX_LENGTH, MIN_LENGTH, NgramGenerator
+
+TRAINING_LETTERS = 'abcdeilmnorsty'
+
+
+def letter_codes(text):
+    return [ord(c) - ord('a') + 1 for c in text]
+
+
+@pytest.fixture(scope='module')
+def model():
+    rng = np.random.default_rng(5)
+    letters = np.array(list(TRAINING_LETTERS))
+    names = [''.join(rng.choice(letters, size=rng.integers(3, 12))) for _ in range(4000)]
+    return NgramGenerator.train(encode_names(names), rng.integers(0, 2, len(names)), rng.random(len(names)))
+
+
+CONSTRAINTS = [
+    dict(prefix='ann'),
+    dict(suffix='lyn'),
+    dict(contains='ey'),
+    dict(prefix='m', suffix='a', contains='ri', max_length=6),
+    dict(prefix='zq', suffix='xv'),  # letters the model never saw
+    dict(contains='abcde', min_length=5, max_length=5),
+    dict(prefix='ab', min_length=9, max_length=9),
+    dict(suffix='o', min_length=MAX_LENGTH),
+    dict(contains='s', max_length=MIN_LENGTH),
+]
+
+
+@pytest.mark.parametrize('constraint', CONSTRAINTS, ids=lambda c: ','.join('{}={}'.format(*i) for i in c.items()))
+@pytest.mark.parametrize('gender', ['F', 'M'])
+def test_every_row_satisfies_its_constraints(model, constraint, gender):
+    prefix, suffix, contains = (constraint.get(key, '') for key in ('prefix', 'suffix', 'contains'))
+    min_length = max(constraint.get('min_length', MIN_LENGTH), MIN_LENGTH, len(prefix) + len(suffix) + len(contains))
+    max_length = min(constraint.get('max_length', MAX_LENGTH), MAX_LENGTH)
+    rng = np.random.default_rng(11)
+    codes, lengths = model.sample_constrained(
+        gender, rng.integers(0, model.n_bands, 3000), rng, prefix=letter_codes(prefix), suffix=letter_codes(suffix),
+        contains=letter_codes(contains), min_length=constraint.get('min_length', MIN_LENGTH),
+        max_length=constraint.get('max_length', MAX_LENGTH))
+    names = [name.lower() for name in codes_to_names(codes)]
+    for name, length, row in zip(names, lengths, codes):
+        assert len(name) == length and (row[length:] == 0).all() and (row[:length] > 0).all()
+        assert min_length <= length <= max_length
+        assert name.startswith(prefix) and name.endswith(suffix) and contains in name
+        # Letters outside the planned runs come from the model, which only knows its training letters
+        middle = name[len(prefix):len(name) - len(suffix)]
+        free = middle.replace(contains, '') if contains else middle
+        assert set(free) <= set(TRAINING_LETTERS + contains), name
+
+
+def test_contains_is_spread_over_the_name(model):
+    rng = np.random.default_rng(2)
+    codes, lengths = model.sample_constrained('F', np.zeros(4000, dtype=np.int64), rng, contains=letter_codes('zz'),
+                                              min_length=10, max_length=10)
+    starts = [name.lower().index('zz') for name in codes_to_names(codes)]
+    # 'zz' is never proposed by the model, so every start is the planned one, and all 9 are used
+    assert set(starts) == set(range(9))
+    assert max(np.bincount(starts)) < 3 * min(np.bincount(starts))
+
+
+def test_same_seed_same_rows(model):
+    kwargs = dict(prefix=letter_codes('mar'), contains=letter_codes('e'), max_length=8)
+    first = model.sample_constrained('M', np.arange(100) % model.n_bands, np.random.default_rng(9), **kwargs)
+    second = model.sample_constrained('M', np.arange(100) % model.n_bands, np.random.default_rng(9), **kwargs)
+    assert np.array_equal(first[0], second[0]) and np.array_equal(first[1], second[1])
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+"""
+Flat NumPy evaluator for the GBR judge model.
+
+The pickled GradientBoostingRegressor is compiled once into contiguous
+feature/threshold/leaf-value arrays (complete binary trees, so child links
+are implicit) and saved as a plain .npz file. The server can then score
+without importing scikit-learn or unpickling anything.
+
+Usage:
+    python tree_ensemble.py models/judge/gbr.n100.genz.v3 [output.npz]
+"""
+
+import logging
+import pickle
+import sys
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+# Rows per pass of the bitmask evaluator; keeps the (rows, trees) masks in cache
+CHUNK_ROWS = 512
+
+
+class TreeEnsemble:
+    """All trees of a gradient-boosted regressor laid out as complete binary trees.
+
+    Every tree is padded to the ensemble's maximum depth, so node i of a tree
+    has its children at 2i+1 and 2i+2 and the child arrays are implicit.
+    feature/threshold hold the internal nodes of each tree row by row and
+    value holds the leaves. A leaf that sits above the maximum depth becomes a
+    chain of pass-through nodes (threshold +inf, always go left), which lets
+    every row walk every tree for exactly `depth` steps without masking. Leaf
+    values are stored pre-multiplied by the learning rate, which is the same
+    product sklearn computes at predict time.
+
+    Model inputs are small integer codes, so for uint8 rows predict() skips
+    the tree walk: for every (feature, value) pair it precomputes, per tree,
+    the bitmask of leaves still reachable, and ANDing one mask per feature
+    leaves exactly the exit leaf's bit set.
+    """
+
+    def __init__(self, feature, threshold, value, init, depth, n_features, leaf_masks=None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.init = float(init)
+        self.depth = int(depth)
+        self.n_features = int(n_features)
+
+        n_internal = 2 ** self.depth - 1
+        n_leaves = 2 ** self.depth
+        trees = np.arange(self.n_trees)
+        self._internal_base = trees * n_internal
+        self._leaf_base = trees * n_leaves - n_internal
+        self._exponent_base = (trees * n_leaves - 127)[:, None]
+        self._leaf_masks = list(leaf_masks) if leaf_masks is not None else self._build_leaf_masks()
+
+    @property
+    def n_trees(self):
+        return self.value.shape[0]
+
+    @property
+    def n_nodes(self):
+        return self.feature.size + self.value.size
+
+    def _build_leaf_masks(self):
+        """Per-feature tables of reachable-leaf bitmasks, indexed [value, tree]; None if too deep."""
+        n_leaves = 2 ** self.depth
+        dtype = next((d for d in (np.uint8, np.uint16, np.uint32, np.uint64)
+                      if np.iinfo(d).bits >= n_leaves), None)
+        if dtype is None:
+            return None
+
+        # Leaves kept when a node at each complete-tree position goes left / right
+        all_leaves = (1 << n_leaves) - 1
+        keep_left, keep_right = [], []
+        for level in range(self.depth):
+            span = 2 ** (self.depth - level)
+            for i in range(2 ** level):
+                left_half = ((1 << (span // 2)) - 1) << (i * span)
+                right_half = left_half << (span // 2)
+                keep_left.append(all_leaves & ~right_half)
+                keep_right.append(all_leaves & ~left_half)
+        keep_left = np.array(keep_left, dtype=dtype)
+        keep_right = np.array(keep_right, dtype=dtype)
+
+        values = np.arange(256)[:, None]
+        masks = []
+        for f in range(self.n_features):
+            table = np.full((256, self.n_trees), all_leaves, dtype=dtype)
+            for pos in range(len(keep_left)):
+                uses_feature = self.feature[:, pos] == f
+                if not uses_feature.any():
+                    continue
+                kept = np.where(values <= self.threshold[:, pos], keep_left[pos], keep_right[pos])
+                table &= np.where(uses_feature, kept, np.array(all_leaves, dtype=dtype))
+            masks.append(table)
+        return masks
+
+    def predict(self, X):
+        """Predict a batch of feature rows; matches GradientBoostingRegressor.predict."""
+        X = np.ascontiguousarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError("Expected {} features, got {}".format(self.n_features, X.shape[1]))
+        if X.dtype == np.uint8 and self._leaf_masks is not None:
+            if X.shape[0] <= CHUNK_ROWS:
+                return self._predict_codes(X)
+            return np.concatenate([self._predict_codes(X[i:i + CHUNK_ROWS])
+                                   for i in range(0, X.shape[0], CHUNK_ROWS)])
+
+        flat_x = X.reshape(-1)
+        row_base = (np.arange(X.shape[0]) * self.n_features)[:, None]
+        feature = self.feature.reshape(-1)
+        threshold = self.threshold.reshape(-1)
+
+        node = np.zeros((X.shape[0], self.n_trees), dtype=np.intp)
+        for _ in range(self.depth):
+            at = node + self._internal_base
+            x = flat_x.take(row_base + feature.take(at))
+            node = 2 * node + 1 + (x > threshold.take(at))
+        return self._sum_stages((node + self._leaf_base).T)
+
+    def _predict_codes(self, X):
+        """Bitmask evaluation of uint8 rows: one table lookup and AND per feature."""
+        columns = X.T.astype(np.intp)
+        reached = np.take(self._leaf_masks[0], columns[0], axis=0)
+        gathered = np.empty_like(reached)
+        for f in range(1, self.n_features):
+            np.take(self._leaf_masks[f], columns[f], axis=0, out=gathered)
+            reached &= gathered
+        # Exactly one bit (2**k) is left per tree; its float32 exponent field is k + 127
+        exponent = np.ascontiguousarray(reached.T).astype(np.float32).view(np.int32) >> 23
+        return self._sum_stages(exponent + self._exponent_base)
+
+    def _sum_stages(self, leaf_index):
+        """Sum init and the leaf values picked by a (trees, rows) index array.
+
+        Values are added one tree at a time in sklearn's order, so results are
+        bit-identical to predict(). Reducing over the outer axis of a C-ordered
+        array is a plain sequential loop; single rows and tiny batches would be
+        summed pairwise, so those go through cumsum instead.
+        """
+        values = self.value.reshape(-1).take(leaf_index)
+        if values.shape[1] < 8:
+            stages = np.empty((self.n_trees + 1, values.shape[1]), dtype=np.float64)
+            stages[0] = self.init
+            stages[1:] = values
+            return np.cumsum(stages, axis=0)[-1]
+        return np.add.reduce(values, axis=0, initial=self.init)
+
+    def save(self, path):
+        """Write the compiled arrays to a pickle-free .npz file."""
+        with open(str(path), 'wb') as f:
+            np.savez(f, **self.to_arrays())
+
+    def to_arrays(self, include_leaf_masks=False):
+        """Return the ensemble as a dict of plain NumPy arrays.
+
+        The leaf-mask tables are derived data; including them lets a
+        memory-mapped copy skip rebuilding them at load time.
+        """
+        arrays = {
+            'format_version': np.array(FORMAT_VERSION, dtype=np.int32),
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'value': self.value,
+            'init': np.array(self.init, dtype=np.float64),
+            'depth': np.array(self.depth, dtype=np.int32),
+            'n_features': np.array(self.n_features, dtype=np.int32),
+        }
+        if include_leaf_masks and self._leaf_masks is not None:
+            arrays['leaf_masks'] = np.stack(self._leaf_masks)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Build an ensemble from a dict (or NpzFile) of arrays written by to_arrays."""
+        version = int(arrays['format_version'])
+        if version != FORMAT_VERSION:
+            raise ValueError("Unsupported tree ensemble format version {}".format(version))
+        leaf_masks = arrays['leaf_masks'] if 'leaf_masks' in arrays else None
+        return cls(arrays['feature'], arrays['threshold'], arrays['value'],
+                   float(arrays['init']), int(arrays['depth']), int(arrays['n_features']), leaf_masks)
+
+    @classmethod
+    def load(cls, path):
+        """Load a compiled ensemble from .npz."""
+        with np.load(str(path), allow_pickle=False) as arrays:
+            return cls.from_arrays(arrays)
+
+
+def _init_constant(model):
+    """Extract the constant initial prediction from a fitted regressor."""
+    init = model.init_
+    if isinstance(init, str) and init == 'zero':
+        return 0.0
+    if hasattr(init, 'constant_'):  # DummyRegressor (scikit-learn >= 0.21)
+        return float(np.ravel(init.constant_)[0])
+    if hasattr(init, 'mean'):  # MeanEstimator (older scikit-learn)
+        return float(init.mean)
+    if hasattr(init, 'quantile'):  # QuantileEstimator (older scikit-learn)
+        return float(init.quantile)
+    raise ValueError("Unsupported init estimator: {}".format(type(init).__name__))
+
+
+def compile_gbr(model):
+    """Flatten a fitted GradientBoostingRegressor into a TreeEnsemble."""
+    estimators = np.asarray(model.estimators_)
+    if estimators.ndim == 2 and estimators.shape[1] != 1:
+        raise ValueError("Only single-output regressors can be compiled")
+    trees = [estimator.tree_ for estimator in estimators.ravel()]
+    depth = max(tree.max_depth for tree in trees)
+    n_internal = 2 ** depth - 1
+
+    feature = np.zeros((len(trees), n_internal), dtype=np.int32)
+    threshold = np.full((len(trees), n_internal), np.inf)
+    value = np.zeros((len(trees), n_internal + 1))
+    for t, tree in enumerate(trees):
+        # Walk (sklearn node, complete-tree position) pairs from the root
+        stack = [(0, 0)]
+        while stack:
+            node, pos = stack.pop()
+            if tree.children_left[node] == -1:
+                # Push the leaf down the all-left pass-through path to the bottom level
+                while pos < n_internal:
+                    pos = 2 * pos + 1
+                value[t, pos - n_internal] = model.learning_rate * tree.value[node, 0, 0]
+            else:
+                feature[t, pos] = tree.feature[node]
+                threshold[t, pos] = tree.threshold[node]
+                stack.append((tree.children_left[node], 2 * pos + 1))
+                stack.append((tree.children_right[node], 2 * pos + 2))
+
+    n_features = getattr(model, 'n_features_in_', None) or model.n_features_
+    return TreeEnsemble(feature, threshold, value, _init_constant(model), depth, n_features)
+
+
+def load_pickled_gbr(path):
+    """Unpickle the original sklearn model, shimming the pre-0.22 module path if needed."""
+    try:
+        with open(str(path), 'rb') as f:
+            return pickle.load(f)
+    except (ImportError, AttributeError, ModuleNotFoundError) as e:
+        logger.warning("⚠️ Model compatibility issue: %s", e)
+        logger.info("🔄 Attempting to load with compatibility fixes...")
+
+        from sklearn.ensemble import GradientBoostingRegressor
+        from sklearn.ensemble import GradientBoostingClassifier
+        import sklearn.ensemble
+
+        # Create a temporary module reference for backward compatibility
+        if not hasattr(sklearn.ensemble, 'gradient_boosting'):
+            class CompatibilityShim:
+                GradientBoostingRegressor = GradientBoostingRegressor
+                GradientBoostingClassifier = GradientBoostingClassifier
+
+            sklearn.ensemble.gradient_boosting = CompatibilityShim()
+            sys.modules['sklearn.ensemble.gradient_boosting'] = CompatibilityShim()
+
+        with open(str(path), 'rb') as f:
+            return pickle.load(f)
+
+
+def main(argv):
+    if len(argv) < 2:
+        print(__doc__)
+        return 1
+    source = argv[1]
+    target = argv[2] if len(argv) > 2 else source + '.npz'
+
+    model = load_pickled_gbr(source)
+    ensemble = compile_gbr(model)
+
+    # Verify on random feature rows that the compiled model is bit-identical
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 27, size=(5000, ensemble.n_features)).astype(np.uint8)
+    X[:, 0] = rng.integers(0, 2, size=len(X))
+    expected = model.predict(X)
+    if not (np.array_equal(ensemble.predict(X), expected)
+            and np.array_equal(ensemble.predict(X.astype(np.float64)), expected)):
+        print("❌ Compiled predictions differ from scikit-learn, not writing {}".format(target))
+        return 1
+
+    ensemble.save(target)
+    print("✅ Compiled {} trees ({} nodes, depth {}) to {}".format(
+        ensemble.n_trees, ensemble.n_nodes, ensemble.depth, target))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))